@@ -1,20 +1,31 @@
 # ==============================================================================
 # ALL API ENDPOINTS FILE
 # ==============================================================================
+import asyncio
+import json
 import uuid
 import logging
 import os
 from pydantic import BaseModel
 from typing import List
-from fastapi import APIRouter, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, BackgroundTasks, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 
-from utils.zip_and_queue_handler import start_serial_processing, cleanup_zip_file
+from utils.zip_and_queue_handler import start_batch_processing, cleanup_zip_file
+from utils.translation_memory import get_translation_memory_stats
+from utils import upload_handler
 from core import job_state as job_state
+from core import result_cache
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# An idle progress stream sends a keep-alive comment this often
+SSE_HEARTBEAT_SECONDS = 15
+
+# Minimum time between two progress events of one stream
+SSE_MIN_INTERVAL_SECONDS = 0.2
+
 
 # Defining pydantic base model
 class FilePathRequest(BaseModel):
@@ -33,27 +44,143 @@ async def start_translation(background_tasks: BackgroundTasks, request: FilePath
 
     job_id = str(uuid.uuid4())
 
-    background_tasks.add_task(start_serial_processing, request.paths, job_id)
+    # Registered now so /job-events and /job-status can be opened as soon as the id is returned
+    job_state.create_job(job_id, request.paths)
+    logger.info(f"Job {job_id}: Created.")
+
+    background_tasks.add_task(start_batch_processing, request.paths, job_id)
     
     return {"job_id": job_id}
 
 
 
+# ==============================================================================
+# ENDPOINT TO UPLOAD PDFS AND START A TRANSLATION JOB ON THEM
+# ==============================================================================
+@router.post("/upload-translation/")
+async def upload_translation(background_tasks: BackgroundTasks, request: Request):
+
+    """
+    Endpoint to start a translation job on uploaded PDFs (multipart/form-data,
+    one or more file fields), for clients that don't share a disk with the backend.
+    """
+
+    job_id = str(uuid.uuid4())
+
+    try:
+        uploads = await upload_handler.receive_pdf_uploads(request, job_id)
+    except upload_handler.UploadError as e:
+        logger.warning(f"Job {job_id}: Upload rejected: {e}")
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+
+    paths = [path for path, _ in uploads]
+    job_state.create_job(job_id, paths)
+    logger.info(f"Job {job_id}: Created.")
+
+    background_tasks.add_task(start_batch_processing, paths, job_id, dict(uploads))
+
+    return {"job_id": job_id, "files": [os.path.basename(path) for path in paths]}
+
+
+
 # ==============================================================================
 # ENDPOINT TO GET THE STATUS OF CURRENT RUNNING JOB
 # ==============================================================================
 @router.get("/job-status/{job_id}")
 async def get_job_status(job_id: str):
 
-    """Endpoint to check the status of a job."""
+    """Endpoint to check the status of a job (polling fallback of /job-events)."""
 
-    job = job_state.get_job(job_id)
-    if job is None:
+    progress = job_state.get_job_progress(job_id)
+    if progress is None:
         return JSONResponse(status_code=404, content={"status": "error", "error": "Job not found"})
     
-    logger.info(f"Job {job_id}: Status check requested. Current status: {job['status']}")
+    logger.debug(f"Job {job_id}: Status check requested. Current status: {progress['status']}")
 
-    return {"job_id": job_id, "status": job["status"], "error": job.get("error")}
+    return progress
+
+
+
+# ==============================================================================
+# ENDPOINT TO STREAM THE PROGRESS OF A JOB (SERVER-SENT EVENTS)
+# ==============================================================================
+@router.get("/job-events/{job_id}")
+async def stream_job_events(job_id: str, request: Request):
+
+    """
+    Endpoint that pushes the progress of a job as Server-Sent Events.
+
+    Every change of the job is sent as soon as it happens, with the same payload
+    as /job-status: a "stage" event when the job status changes, a "progress"
+    event for page / line progress, and a final "done" event once the job is
+    complete or failed, after which the stream closes.
+    """
+
+    if job_state.get_job(job_id) is None:
+        return JSONResponse(status_code=404, content={"status": "error", "error": "Job not found"})
+
+    logger.info(f"Job {job_id}: Progress stream opened")
+
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        job_state.subscribe(job_id, loop, changed)
+        last_payload = None
+        last_status = None
+        try:
+            while True:
+                progress = job_state.get_job_progress(job_id)
+                if progress is None:
+                    yield _sse_event("done", {"job_id": job_id, "status": "error", "error": "Job not found"})
+                    return
+
+                if progress["status"] in ("complete", "error"):
+                    yield _sse_event("done", progress)
+                    return
+
+                if progress != last_payload:
+                    yield _sse_event("stage" if progress["status"] != last_status else "progress", progress)
+                    last_payload = progress
+                    last_status = progress["status"]
+
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    # Comment line keeps proxies / idle timeouts from closing the stream
+                    yield ": keep-alive\n\n"
+                    continue
+                changed.clear()
+
+                # Coalesce bursts of page updates into one event
+                await asyncio.sleep(SSE_MIN_INTERVAL_SECONDS)
+                changed.clear()
+        finally:
+            job_state.unsubscribe(job_id, loop, changed)
+            logger.info(f"Job {job_id}: Progress stream closed")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+
+# ==============================================================================
+# ENDPOINT TO INSPECT THE TRANSLATION MEMORY HIT/MISS COUNTERS
+# ==============================================================================
+@router.get("/translation-memory/stats")
+async def translation_memory_stats():
+
+    """Endpoint to see how many lines were answered from the translation memory."""
+
+    return get_translation_memory_stats()
 
 
 
@@ -63,7 +190,7 @@ async def get_job_status(job_id: str):
 @router.get("/download/{job_id}")
 async def download_result(job_id: str):
 
-    """Endpoint to download the final translated PDF."""
+    """Endpoint to download the output of a job: a ZIP of the translated PDFs, or the PDF of a single-file job."""
     try:
         job = job_state.get_job(job_id)
 
@@ -73,18 +200,52 @@ async def download_result(job_id: str):
         file_path = job.get("result_path")
 
         if not os.path.exists(file_path):
-            return JSONResponse(status_code=404, content={"error": "Output zip could not be found. PLease try again."})
+            return JSONResponse(status_code=404, content={"error": "Output file could not be found. PLease try again."})
 
-        filename = os.path.basename(file_path)
+        filename = job.get("result_name") or os.path.basename(file_path)
+        media_type = "application/pdf" if filename.lower().endswith(".pdf") else "application/zip"
         
         logger.info(f"Job {job_id}: Download requested for {file_path}")
 
+        # Streamed from disk in chunks; the output was written while the job ran
         return FileResponse(
             file_path, 
-            media_type='application/zip', 
+            media_type=media_type, 
             filename=filename,
             background=BackgroundTasks([lambda: cleanup_zip_file(file_path)])
             )
     except Exception as e:
-        logger.error(f"Some error occured while downloading the zip file: {e}")
-        return JSONResponse(status_code=404, content={"error": "Some error occured while downloading the zip file."})
+        logger.error(f"Some error occured while downloading the job output: {e}")
+        return JSONResponse(status_code=404, content={"error": "Some error occured while downloading the job output."})
+
+
+
+
+# ==============================================================================
+# ADMIN ENDPOINTS TO INSPECT AND PURGE THE RESULT CACHE
+# ==============================================================================
+@router.get("/admin/result-cache")
+async def inspect_result_cache():
+
+    """Endpoint to list the cached translated PDFs and the cache hit/miss counters."""
+
+    return {**result_cache.stats(), "items": result_cache.entries()}
+
+
+@router.delete("/admin/result-cache")
+async def purge_result_cache():
+
+    """Endpoint to empty the result cache."""
+
+    return {"removed": result_cache.purge()}
+
+
+@router.delete("/admin/result-cache/{key}")
+async def purge_result_cache_entry(key: str):
+
+    """Endpoint to remove one entry from the result cache."""
+
+    removed = result_cache.purge(key)
+    if not removed:
+        return JSONResponse(status_code=404, content={"error": "Cache entry not found"})
+    return {"removed": removed}
@@ -0,0 +1,211 @@
+# ==============================================================================
+# PIPELINE CONFIGURATION FILE
+# ==============================================================================
+'''
+All tunable knobs of the translation pipeline live here. Every value can be
+overridden with an environment variable of the same name, so the packaged app
+and the dev server can be tuned without touching the code.
+'''
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# ==============================================================================
+# JOB SCHEDULING
+# ==============================================================================
+# Number of files of one job processed at the same time
+JOB_FILE_CONCURRENCY = max(1, _env_int("JOB_FILE_CONCURRENCY", 4))
+
+# Number of files in the text extraction (rasterization + OCR) stage at the same time
+OCR_CONCURRENCY = max(1, _env_int("OCR_CONCURRENCY", 2))
+
+# Number of files in the translation stage at the same time. With inference workers,
+# concurrent files are micro-batched together, so this can be raised
+TRANSLATION_CONCURRENCY = max(1, _env_int("TRANSLATION_CONCURRENCY", 2))
+
+
+# Where jobs are kept: "sqlite" (survive a restart) or "memory"
+JOB_STORE = os.environ.get("JOB_STORE", "sqlite")
+
+# SQLite file of the job store
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", "jobs.sqlite3")
+
+# Finished jobs (and their undownloaded results) are removed after this many seconds (0 = never)
+JOB_TTL_SECONDS = _env_int("JOB_TTL_SECONDS", 24 * 60 * 60)
+
+# Jobs interrupted by a restart: "resume" (run them again) or "fail" (mark them as failed)
+JOB_RECOVERY = os.environ.get("JOB_RECOVERY", "resume")
+
+# Folder where uploaded PDFs (POST /translate/upload-translation/) are kept while their job runs
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "upload_spool")
+
+# Largest accepted uploaded PDF, in megabytes
+UPLOAD_MAX_FILE_MB = _env_int("UPLOAD_MAX_FILE_MB", 200)
+
+# Largest accepted upload request (all files of a job), in megabytes
+UPLOAD_MAX_TOTAL_MB = _env_int("UPLOAD_MAX_TOTAL_MB", 1024)
+
+# Most files accepted in one upload
+UPLOAD_MAX_FILES = _env_int("UPLOAD_MAX_FILES", 100)
+
+# Pages buffered between two stages of a file's extract -> translate -> render pipeline
+PIPELINE_QUEUE_SIZE = max(1, _env_int("PIPELINE_QUEUE_SIZE", 2))
+
+
+# ==============================================================================
+# TRANSLATION (MODEL INFERENCE)
+# ==============================================================================
+# When the model is loaded: "background" (right after startup, /health answers meanwhile),
+# "lazy" (on the first translation job) or "startup" (before the server accepts requests)
+MODEL_LOAD_MODE = os.environ.get("MODEL_LOAD_MODE", "background")
+
+# Inference backend: "torch" (fp32), "int8" (PyTorch dynamic int8 quantization) or "onnx" (ONNX Runtime)
+TRANSLATION_BACKEND = os.environ.get("TRANSLATION_BACKEND", "torch")
+
+# Folder of the ONNX Runtime export (made with backend/model/export_onnx.py), relative to the project root
+TRANSLATION_ONNX_DIR = os.environ.get("TRANSLATION_ONNX_DIR", "he-en-model-onnx")
+
+# Number of dedicated inference worker processes, each holding its own copy of the model
+# (0 = run the model inside the server process)
+INFERENCE_WORKERS = max(0, _env_int("INFERENCE_WORKERS", 1))
+
+# How long a worker waits for requests of other jobs to join a micro-batch, in milliseconds
+INFERENCE_MAX_WAIT_MS = max(0, _env_int("INFERENCE_MAX_WAIT_MS", 10))
+
+# A worker stops collecting requests once this many lines are waiting
+INFERENCE_MAX_BATCH_LINES = max(1, _env_int("INFERENCE_MAX_BATCH_LINES", 256))
+
+# Longest wait for the translations of one request to the workers, in seconds, before it fails
+INFERENCE_REQUEST_TIMEOUT = max(1, _env_int("INFERENCE_REQUEST_TIMEOUT", 600))
+
+# Maximum number of lines sent to model.generate in one batch
+TRANSLATION_MAX_BATCH_SIZE = _env_int("TRANSLATION_MAX_BATCH_SIZE", 32)
+
+# Maximum number of padded tokens (batch_size x longest line) in one batch
+TRANSLATION_MAX_BATCH_TOKENS = _env_int("TRANSLATION_MAX_BATCH_TOKENS", 4096)
+
+# Maximum length of a generated translation, in tokens
+TRANSLATION_MAX_LENGTH = _env_int("TRANSLATION_MAX_LENGTH", 512)
+
+
+# ==============================================================================
+# TRANSLATION MEMORY (PERSISTENT TRANSLATION CACHE)
+# ==============================================================================
+# Set to 0 to always send every line to the model
+TRANSLATION_MEMORY_ENABLED = _env_int("TRANSLATION_MEMORY_ENABLED", 1) == 1
+
+# SQLite file that keeps translations across restarts
+TRANSLATION_MEMORY_PATH = os.environ.get("TRANSLATION_MEMORY_PATH", "translation_memory.sqlite3")
+
+# Number of translations kept in the in-process LRU in front of SQLite
+TRANSLATION_MEMORY_LRU_SIZE = _env_int("TRANSLATION_MEMORY_LRU_SIZE", 20000)
+
+
+# ==============================================================================
+# RASTERIZATION & OCR
+# ==============================================================================
+# Resolution at which PDF pages are rendered for OCR
+OCR_DPI = _env_int("OCR_DPI", 300)
+
+# Page renderer used for OCR: "pymupdf" (in-process) or "poppler" (pdftoppm)
+RASTER_BACKEND = os.environ.get("RASTER_BACKEND", "pymupdf")
+
+# Read pages with an embedded Hebrew text layer directly instead of OCR'ing them (0 = always OCR)
+VECTOR_TEXT_ENABLED = _env_int("VECTOR_TEXT_ENABLED", 1) == 1
+
+# Minimum number of Hebrew characters in a page's text layer for it to skip OCR
+VECTOR_MIN_HEBREW_CHARS = _env_int("VECTOR_MIN_HEBREW_CHARS", 3)
+
+# Tesseract options: LSTM engine, sparse text (drawings have no paragraphs), Hebrew + English
+OCR_TESSERACT_CONFIG = os.environ.get("OCR_TESSERACT_CONFIG", "--oem 3 --psm 11 -l heb+eng")
+
+# How Tesseract is run: "pytesseract" (temporary files), "tesserocr" (in-process C API), "pipe" (tesseract
+# executable, image over stdin, TSV over stdout) or "auto" (tesserocr if installed, else "pipe").
+# pytesseract stays the default until the other engines are validated against a real tesseract install
+OCR_ENGINE = os.environ.get("OCR_ENGINE", "pytesseract")
+
+# Number of worker processes that OCR pages concurrently (1 = in-process, one page at a time)
+OCR_WORKERS = max(1, _env_int("OCR_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+
+# OMP_THREAD_LIMIT given to every OCR worker, so N workers don't each spawn one thread per core
+OCR_OMP_THREAD_LIMIT = _env_int("OCR_OMP_THREAD_LIMIT", 1)
+
+# OCR strategy per page: "full" (whole page, tiled when large) or "roi" (only detected text regions)
+OCR_MODE = os.environ.get("OCR_MODE", "full")
+
+# Downscale factor of the page for the ROI text-detection pass
+OCR_ROI_DOWNSCALE = _env_float("OCR_ROI_DOWNSCALE", 0.25)
+
+# Pixels added around every detected text region (at OCR resolution)
+OCR_ROI_PADDING = _env_int("OCR_ROI_PADDING", 16)
+
+# Tiled OCR for large-format sheets: "off", "on", or "auto" (tile pages larger than one tile)
+OCR_TILING = os.environ.get("OCR_TILING", "auto")
+
+# Edge length of one OCR tile, in pixels
+OCR_TILE_SIZE = _env_int("OCR_TILE_SIZE", 4000)
+
+# Overlap between neighbouring tiles, in pixels; must be larger than the tallest/widest word
+OCR_TILE_OVERLAP = _env_int("OCR_TILE_OVERLAP", 300)
+
+# Number of tiles of one page OCR'd concurrently (threads; tesseract runs as a subprocess or releases the GIL).
+# Inside the OCR_WORKERS pool it is capped at cpu_count // OCR_WORKERS per worker, so the cores are not oversubscribed
+OCR_TILE_WORKERS = max(1, _env_int("OCR_TILE_WORKERS", 4))
+
+
+# ==============================================================================
+# OUTPUT PDF
+# ==============================================================================
+# Base-14 font used for the English overlay text
+OUTPUT_FONT_NAME = os.environ.get("OUTPUT_FONT_NAME", "helv")
+
+# Largest font size used for a translated label
+OUTPUT_MAX_FONTSIZE = _env_int("OUTPUT_MAX_FONTSIZE", 12)
+
+# Labels that would need a smaller font than this are replaced by an abbreviation + legend entry
+ABBREVIATION_FONTSIZE_THRESHOLD = _env_int("ABBREVIATION_FONTSIZE_THRESHOLD", 4)
+
+# Legend columns beside a sheet before the legend continues on an extra page
+LEGEND_MAX_COLUMNS = max(1, _env_int("LEGEND_MAX_COLUMNS", 2))
+
+# The output PDF of a file is saved to disk (and dropped from memory) each time this many
+# megabytes of new content have been stamped into it; a smaller output is saved once, at the end
+OUTPUT_FLUSH_MB = max(1, _env_int("OUTPUT_FLUSH_MB", 64))
+
+# Folder holding the finished job outputs until they are downloaded
+JOB_OUTPUT_DIR = os.environ.get("JOB_OUTPUT_DIR", "job_outputs")
+
+# Compression of the job ZIP: "stored" (PDFs are already compressed) or "deflated"
+OUTPUT_ZIP_COMPRESSION = os.environ.get("OUTPUT_ZIP_COMPRESSION", "stored")
+
+# A job of a single file returns the translated PDF itself instead of a ZIP (0 = always ZIP)
+SINGLE_FILE_SKIP_ZIP = _env_int("SINGLE_FILE_SKIP_ZIP", 1) == 1
+
+
+# ==============================================================================
+# RESULT CACHE (RE-SUBMITTED PDFS)
+# ==============================================================================
+# Set to 0 to always run the full pipeline
+RESULT_CACHE_ENABLED = _env_int("RESULT_CACHE_ENABLED", 1) == 1
+
+# Folder holding the cached translated PDFs
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "result_cache")
+
+# Total size of the cache; least recently used entries are evicted beyond it
+RESULT_CACHE_MAX_MB = _env_int("RESULT_CACHE_MAX_MB", 2048)
+
+# Bump when a code change alters the output, so older cached results are not reused
+PIPELINE_VERSION = "4"
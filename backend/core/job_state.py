@@ -1,24 +1,312 @@
 # ==============================================================================
 # JOB STATE MANAGEMENT FILE
 # ==============================================================================
-from typing import Dict, Any
+import copy
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, List
 
-# This acts as our in-memory "database" to track job statuses
-jobs: Dict[str, Dict[str, Any]] = {}
+from core import config
+from core.job_store import MemoryJobStore, SQLiteJobStore, FINISHED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Files of one job run in parallel threads and update the same job entry
+_lock = threading.RLock()
+
+# Order of the per-file stages; the job status is the stage of its least advanced file
+FILE_STAGES = ["queued", "extracting", "translating", "creating_pdf", "done", "error"]
+
+
+def _create_store():
+    """Builds the job store selected by config.JOB_STORE ("sqlite" or "memory")."""
+    if config.JOB_STORE == "sqlite":
+        try:
+            return SQLiteJobStore(_lock, config.JOB_TTL_SECONDS, config.JOB_STORE_PATH)
+        except Exception:
+            logger.error(f"Failed to open the job store at {config.JOB_STORE_PATH}; keeping jobs in memory", exc_info=True)
+    return MemoryJobStore(_lock, config.JOB_TTL_SECONDS)
+
+
+_store = _create_store()
+
+# This acts as our in-memory "database" to track job statuses (persisted by the store)
+jobs: Dict[str, Dict[str, Any]] = _store.jobs
+
+# Progress listeners (the SSE endpoint), woken on every change of their job.
+# Key: job_id -> set of (event loop, asyncio.Event)
+_subscribers: Dict[str, set] = {}
 
 def get_job(job_id: str):
     return jobs.get(job_id)
 
-def create_job(job_id: str):
-    jobs[job_id] = {"status": "starting", "result_path": None, "error": None}
+def create_job(job_id: str, file_paths: List[str] = None):
+    now = time.time()
+    with _lock:
+        # Every new job also sweeps the finished jobs past their TTL
+        _remove_expired_jobs(now)
+        _store.put(job_id, {
+            "status": "starting",
+            "result_path": None,
+            "result_name": None,
+            "error": None,
+            "dedup": None,
+            "timings": None,
+            "created_at": now,
+            "files": {path: {"status": "queued", "error": None, "extraction": None, "pipeline": None, "timings": None} for path in (file_paths or [])},
+        })
+        _changed(job_id)
 
 def update_job_status(job_id: str, status: str, error: str = None):
-    if job_id in jobs:
-        jobs[job_id]["status"] = status
+    with _lock:
+        if job_id in jobs:
+            jobs[job_id]["status"] = status
+            if error:
+                jobs[job_id]["error"] = error
+            _changed(job_id)
+
+def set_job_result(job_id: str, result_path: str, result_name: str = None):
+    """Completes a job. result_name is the file name offered for download (a .zip or, for one file, a .pdf)."""
+    with _lock:
+        if job_id in jobs:
+            jobs[job_id]["status"] = "complete"
+            jobs[job_id]["result_path"] = result_path
+            jobs[job_id]["result_name"] = result_name or os.path.basename(result_path)
+            _changed(job_id)
+
+def update_file_status(job_id: str, file_path: str, status: str, error: str = None):
+    """Sets the stage of one file of a job and rolls it up into the job status."""
+    with _lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return
+        file_entry = job["files"].setdefault(file_path, {"status": "queued", "error": None, "extraction": None, "pipeline": None, "timings": None})
+        file_entry["status"] = status
         if error:
-            jobs[job_id]["error"] = error
+            file_entry["error"] = error
+
+        # While files are still running, the job reports the least advanced one
+        active = [f["status"] for f in job["files"].values() if f["status"] not in ("done", "error")]
+        if active and job["status"] not in FINISHED_STATUSES:
+            job["status"] = min(active, key=FILE_STAGES.index)
+        _changed(job_id)
+
+def add_dedup_stats(job_id: str, lines: int, unique_lines: int):
+    """
+    Adds the lines of one file to the job's deduplication counters.
+    unique_lines is the number of unique strings seen so far in the whole job.
+    """
+    dedup = {"total_lines": lines, "unique_lines": unique_lines, "dedup_ratio": 1.0}
+    with _lock:
+        if job_id in jobs:
+            previous = jobs[job_id].get("dedup") or {}
+            dedup["total_lines"] += previous.get("total_lines", 0)
+            dedup["unique_lines"] = max(unique_lines, previous.get("unique_lines", 0))
+            dedup["dedup_ratio"] = dedup["total_lines"] / dedup["unique_lines"] if dedup["unique_lines"] else 1.0
+            jobs[job_id]["dedup"] = dedup
+            _changed(job_id)
+    return dedup
+
+def set_extraction_paths(job_id: str, file_path: str, page_paths: dict):
+    """Records, for one file, which extraction path ("vector" / "ocr") each page took."""
+    with _lock:
+        if job_id in jobs and file_path in jobs[job_id]["files"]:
+            jobs[job_id]["files"][file_path]["extraction"] = {
+                str(page_num + 1): path for page_num, path in sorted(page_paths.items())
+            }
+            _changed(job_id)
+
+def update_file_pipeline(job_id: str, file_path: str, pipeline: dict):
+    """Publishes the page pipeline progress (pages per stage, queue depths, timings) of one file."""
+    with _lock:
+        if job_id in jobs and file_path in jobs[job_id]["files"]:
+            jobs[job_id]["files"][file_path]["pipeline"] = pipeline
+            _changed(job_id)
+
+def add_stage_timing(job_id: str, file_path: str, stage: str, wall: float, cpu: float,
+                     lines: int = 0, page: int = None, peak_rss_bytes: int = None):
+    """
+    Adds one timed stage run (see core/metrics.py) to a file's "timings", or to
+    the job's own "timings" when file_path is None (e.g. zipping).
+    """
+    with _lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return
+        if file_path is None:
+            owner = job
+        elif file_path in job["files"]:
+            owner = job["files"][file_path]
+        else:
+            return
+
+        timings = owner.get("timings") or {"stages": {}, "pages": {}, "peak_rss_bytes": None}
+        totals = timings["stages"].setdefault(stage, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0, "lines": 0})
+        totals["wall_s"] = round(totals["wall_s"] + wall, 4)
+        totals["cpu_s"] = round(totals["cpu_s"] + cpu, 4)
+        totals["calls"] += 1
+        totals["lines"] += lines
+        if page is not None:
+            page_timings = timings["pages"].setdefault(str(page + 1), {})
+            page_timings[stage] = round(page_timings.get(stage, 0.0) + wall, 4)
+        if peak_rss_bytes is not None:
+            timings["peak_rss_bytes"] = max(peak_rss_bytes, timings["peak_rss_bytes"] or 0)
+        owner["timings"] = timings
+        _changed(job_id)
+
+def count_jobs_by_status():
+    """Number of jobs in the store per status, for /metrics."""
+    with _lock:
+        counts = {}
+        for job in jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+    return counts
+
+def get_job_progress(job_id: str):
+    """
+    Returns the status payload of a job: its status, per-file summary, overall
+    progress (pages rendered out of pages known, lines translated) and an ETA
+    extrapolated from the elapsed time. None if the job does not exist.
+    """
+    with _lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return None
+        summary = get_file_summary(job_id)
+        status = job["status"]
+        error = job.get("error")
+        dedup = job.get("dedup")
+        timings = copy.deepcopy(job.get("timings"))
+        created_at = job.get("created_at")
+        result_name = job.get("result_name")
+
+    # A finished file counts fully, a running one by its rendered pages
+    files_total = summary["files_total"] or 1
+    completed = 0.0
+    pages_done = pages_total = lines_translated = 0
+    for entry in summary["files"].values():
+        pipeline = entry.get("pipeline") or {}
+        pages_done += pipeline.get("pages_rendered", 0)
+        pages_total += pipeline.get("pages_total", 0)
+        # Counted by the translate stage once a page's lines have their translations
+        lines_translated += pipeline.get("hebrew_lines", 0)
+        if entry["status"] in ("done", "error"):
+            completed += 1
+        elif pipeline.get("pages_total"):
+            completed += pipeline["pages_rendered"] / pipeline["pages_total"]
+    fraction = 1.0 if status == "complete" else min(completed / files_total, 1.0)
+
+    eta_seconds = None
+    if created_at and 0 < fraction < 1:
+        elapsed = time.time() - created_at
+        eta_seconds = round(elapsed * (1 - fraction) / fraction, 1)
+
+    return {
+        "job_id": job_id,
+        "status": status,
+        "error": error,
+        "dedup": dedup,
+        "progress": {
+            "fraction": round(fraction, 4),
+            "pages_done": pages_done,
+            "pages_total": pages_total,
+            "lines_translated": lines_translated,
+            "eta_seconds": eta_seconds,
+        },
+        "timings": timings,
+        "result_name": result_name,
+        **summary,
+    }
+
+def subscribe(job_id: str, loop, event):
+    """Registers an asyncio.Event (of `loop`) that is set whenever the job changes."""
+    with _lock:
+        _subscribers.setdefault(job_id, set()).add((loop, event))
+
+def unsubscribe(job_id: str, loop, event):
+    with _lock:
+        listeners = _subscribers.get(job_id)
+        if listeners:
+            listeners.discard((loop, event))
+            if not listeners:
+                del _subscribers[job_id]
+
+def get_file_summary(job_id: str):
+    """Returns {file_path: {status, error, extraction}} and the done/failed/total counts of a job."""
+    with _lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return None
+        # Deep copy: timings keep changing in place while the payload is serialized
+        files = copy.deepcopy(job["files"])
+    return {
+        "files": files,
+        "files_total": len(files),
+        "files_done": sum(1 for f in files.values() if f["status"] == "done"),
+        "files_failed": sum(1 for f in files.values() if f["status"] == "error"),
+    }
+
+
+# ==============================================================================
+# EXPIRY AND CRASH RECOVERY
+# ==============================================================================
+def recover_interrupted_jobs(mode: str = None):
+    """
+    Handles the jobs that were still running when the previous process stopped
+    (config.JOB_RECOVERY):
+    - "resume": returns them as [(job_id, file_paths)] so the caller can run them again
+      (files already translated come back from the result cache)
+    - "fail": marks them as failed
+    A job whose input files are gone is always marked as failed.
+    """
+    mode = mode or config.JOB_RECOVERY
+    to_resume = []
+    with _lock:
+        _remove_expired_jobs(time.time())
+        for job_id in _store.interrupted_jobs():
+            file_paths = list(jobs[job_id]["files"])
+            missing = [path for path in file_paths if not os.path.exists(path)]
+            if mode == "resume" and file_paths and not missing:
+                # Runs again from the start; created_at is kept, so the TTL still counts from submission
+                jobs[job_id]["status"] = "starting"
+                for file_path in file_paths:
+                    jobs[job_id]["files"][file_path] = {"status": "queued", "error": None, "extraction": None, "pipeline": None, "timings": None}
+                _changed(job_id)
+                to_resume.append((job_id, file_paths))
+                continue
+
+            reason = "input files are missing" if missing else "the server restarted while it was running"
+            jobs[job_id]["status"] = "error"
+            jobs[job_id]["error"] = f"Job interrupted: {reason}."
+            _changed(job_id)
+            logger.warning(f"Job {job_id}: marked as failed after restart ({reason})")
+
+    for job_id, file_paths in to_resume:
+        logger.info(f"Job {job_id}: resuming {len(file_paths)} files after restart")
+    return to_resume
+
+def _changed(job_id):
+    """Persists a changed job and wakes its progress listeners. Caller holds _lock."""
+    _store.mark_dirty(job_id)
+    for loop, event in _subscribers.get(job_id, ()):
+        # Job changes come from worker threads; asyncio.Event must be set on its own loop
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass  # Loop already closed
+
+def close_store():
+    """Writes pending job changes; called on server shutdown."""
+    _store.close()
 
-def set_job_result(job_id: str, result_path: str):
-    if job_id in jobs:
-        jobs[job_id]["status"] = "complete"
-        jobs[job_id]["result_path"] = result_path
\ No newline at end of file
+def _remove_expired_jobs(now):
+    """Caller holds _lock."""
+    for job in _store.expire(now):
+        result_path = job.get("result_path")
+        if result_path and os.path.exists(result_path):
+            try:
+                os.remove(result_path)
+            except OSError:
+                logger.warning(f"Failed to remove expired job result {result_path}", exc_info=True)
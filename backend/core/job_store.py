@@ -0,0 +1,165 @@
+# ==============================================================================
+# JOB STORES (IN-MEMORY / SQLITE)
+# ==============================================================================
+'''
+Storage behind core/job_state.py. Every store keeps the live job dicts in
+memory, so status lookups are a dict access and never touch the disk or block
+the event loop.
+
+- MemoryJobStore: jobs only live as long as the process.
+- SQLiteJobStore: additionally writes changed jobs to SQLite from a background
+  thread (write-behind, every FLUSH_INTERVAL seconds), and loads them back on
+  startup, so jobs survive a restart and interrupted jobs can be recovered.
+
+Finished jobs (complete / error) are removed once they are older than the TTL.
+'''
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a job no longer changes
+FINISHED_STATUSES = ("complete", "error")
+
+# Seconds between two write-behind flushes of the SQLite store
+FLUSH_INTERVAL = 0.5
+
+
+class MemoryJobStore:
+    """
+    Jobs in a dict. The caller (job_state) passes its lock, and holds it
+    while it reads or changes a job.
+    """
+
+    def __init__(self, lock, ttl_seconds):
+        self.jobs = {}
+        self._lock = lock
+        self._ttl_seconds = ttl_seconds
+
+    def put(self, job_id, job):
+        """Adds or replaces a job. Caller holds the lock."""
+        self.jobs[job_id] = job
+        self.mark_dirty(job_id)
+
+    def mark_dirty(self, job_id):
+        """Called after a job has changed. Caller holds the lock."""
+        self.jobs[job_id]["updated_at"] = time.time()
+
+    def expire(self, now=None):
+        """Removes the finished jobs older than the TTL; returns them. Caller holds the lock."""
+        if self._ttl_seconds <= 0:
+            return []
+        now = now or time.time()
+        expired_ids = [
+            job_id for job_id, job in self.jobs.items()
+            if job["status"] in FINISHED_STATUSES and now - job.get("updated_at", now) > self._ttl_seconds
+        ]
+        return [self._remove(job_id) for job_id in expired_ids]
+
+    def interrupted_jobs(self):
+        """Jobs that were still running when the previous process stopped."""
+        return []
+
+    def close(self):
+        pass
+
+    def _remove(self, job_id):
+        return self.jobs.pop(job_id)
+
+
+class SQLiteJobStore(MemoryJobStore):
+    """In-memory jobs, persisted to a SQLite file by a write-behind thread."""
+
+    def __init__(self, lock, ttl_seconds, db_path):
+        super().__init__(lock, ttl_seconds)
+        self._db_path = db_path
+        self._dirty = set()
+        self._deleted = set()
+        self._stop = threading.Event()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        # Jobs of the previous run
+        self._interrupted = []
+        for job_id, data in self._conn.execute("SELECT job_id, data FROM jobs"):
+            try:
+                job = json.loads(data)
+            except ValueError:
+                logger.warning(f"Job store: dropping unreadable job {job_id}")
+                self._deleted.add(job_id)
+                continue
+            self.jobs[job_id] = job
+            if job["status"] not in FINISHED_STATUSES:
+                self._interrupted.append(job_id)
+        logger.info(f"Job store: loaded {len(self.jobs)} jobs from {db_path} ({len(self._interrupted)} interrupted)")
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="job-store-flusher", daemon=True)
+        self._flusher.start()
+
+    def mark_dirty(self, job_id):
+        super().mark_dirty(job_id)
+        self._dirty.add(job_id)
+        self._deleted.discard(job_id)
+
+    def interrupted_jobs(self):
+        return [job_id for job_id in self._interrupted if job_id in self.jobs]
+
+    def close(self):
+        """Stops the flusher and writes the pending changes."""
+        self._stop.set()
+        self._flusher.join(timeout=5)
+        self._flush()
+        self._conn.close()
+
+    def _remove(self, job_id):
+        self._dirty.discard(job_id)
+        self._deleted.add(job_id)
+        return super()._remove(job_id)
+
+    def _flush_loop(self):
+        while not self._stop.wait(FLUSH_INTERVAL):
+            try:
+                self._flush()
+            except Exception:
+                logger.error("Job store: failed to write jobs to SQLite", exc_info=True)
+
+    def _flush(self):
+        # Serialize under the lock, write outside it
+        with self._lock:
+            rows = [
+                (job_id, self.jobs[job_id]["status"], json.dumps(self.jobs[job_id]), self.jobs[job_id]["updated_at"])
+                for job_id in self._dirty if job_id in self.jobs
+            ]
+            deleted = [(job_id,) for job_id in self._deleted]
+            self._dirty.clear()
+            self._deleted.clear()
+
+        if not rows and not deleted:
+            return
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO jobs (job_id, status, data, updated_at) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.executemany("DELETE FROM jobs WHERE job_id = ?", deleted)
+        except Exception:
+            # Retry with the next flush
+            with self._lock:
+                self._dirty.update(row[0] for row in rows)
+                self._deleted.update(row[0] for row in deleted)
+            raise
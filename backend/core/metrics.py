@@ -0,0 +1,192 @@
+# ==============================================================================
+# STAGE TIMING INSTRUMENTATION AND PROMETHEUS METRICS
+# ==============================================================================
+'''
+Records how long every pipeline stage takes (wall and CPU time), how many lines
+it processed and the peak RSS of the process:
+
+    with metrics.stage("ocr", page=page_num) as timing:
+        lines = ...
+        timing["lines"] = len(lines)
+
+A stage is attributed to the file that the current thread works on (set with
+file_context), and shows up in that file's "timings" in the job status. All
+stages are also aggregated process-wide and exported by render_prometheus() in
+the Prometheus text format (GET /metrics).
+
+Stages that run in OCR worker processes are captured with collect() and
+replayed in the server process with replay(). CPU time is the CPU time of the
+calling thread; the time Tesseract spends in its own subprocess (every
+OCR_ENGINE but tesserocr) is only visible as wall time.
+'''
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the stage duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_context = threading.local()
+
+# Key: stage name -> {"count", "wall", "cpu", "lines", "buckets": [count per bucket]}
+_stages = {}
+
+
+@contextmanager
+def file_context(job_id, file_path):
+    """Attributes the stages run by this thread to one file of a job."""
+    previous = getattr(_context, "file", None)
+    _context.file = (job_id, file_path)
+    try:
+        yield
+    finally:
+        _context.file = previous
+
+
+@contextmanager
+def collect():
+    """
+    Captures the stages run by this thread into a list instead of recording
+    them; used in worker processes, whose records are replayed by the server.
+    """
+    previous = getattr(_context, "records", None)
+    records = []
+    _context.records = records
+    try:
+        yield records
+    finally:
+        _context.records = previous
+
+
+@contextmanager
+def stage(name, page=None, job_id=None, file_path=None):
+    """
+    Times a block as stage `name`. The yielded dict can receive a "lines" count.
+    job_id / file_path override the file context of the thread.
+    """
+    timing = {"lines": 0}
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield timing
+    finally:
+        record(name, time.perf_counter() - wall_start, time.thread_time() - cpu_start,
+               page=page, lines=timing["lines"], job_id=job_id, file_path=file_path)
+
+
+def record(name, wall, cpu, page=None, lines=0, job_id=None, file_path=None):
+    """Records one run of a stage."""
+    records = getattr(_context, "records", None)
+    if records is not None:
+        records.append((name, wall, cpu, page, lines))
+        return
+
+    with _lock:
+        entry = _stages.setdefault(name, {"count": 0, "wall": 0.0, "cpu": 0.0, "lines": 0, "buckets": [0] * len(DURATION_BUCKETS)})
+        entry["count"] += 1
+        entry["wall"] += wall
+        entry["cpu"] += cpu
+        entry["lines"] += lines
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if wall <= bound:
+                entry["buckets"][i] += 1
+
+    if job_id is None:
+        job_id, file_path = getattr(_context, "file", None) or (None, None)
+    if job_id is not None:
+        # Imported here: worker processes only collect() and must not open the job store
+        from core import job_state
+        job_state.add_stage_timing(job_id, file_path, name, wall, cpu, lines=lines, page=page, peak_rss_bytes=peak_rss_bytes())
+
+
+def replay(records):
+    """Records the stages captured by collect() (e.g. in a worker process) in this thread's context."""
+    for name, wall, cpu, page, lines in records:
+        record(name, wall, cpu, page=page, lines=lines)
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None if the platform does not report it."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return counters.PeakWorkingSetSize
+        except Exception:
+            pass
+    return None
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    from core import job_state
+
+    with _lock:
+        stages = {name: dict(entry, buckets=list(entry["buckets"])) for name, entry in sorted(_stages.items())}
+
+    lines = [
+        "# HELP pdf_translation_stage_seconds Wall time of the pipeline stages.",
+        "# TYPE pdf_translation_stage_seconds histogram",
+    ]
+    for name, entry in stages.items():
+        for bound, count in zip(DURATION_BUCKETS, entry["buckets"]):
+            lines.append(f'pdf_translation_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+        lines.append(f'pdf_translation_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {entry["count"]}')
+        lines.append(f'pdf_translation_stage_seconds_sum{{stage="{name}"}} {entry["wall"]:.6f}')
+        lines.append(f'pdf_translation_stage_seconds_count{{stage="{name}"}} {entry["count"]}')
+
+    lines += [
+        "# HELP pdf_translation_stage_cpu_seconds_total CPU time of the pipeline stages (calling thread).",
+        "# TYPE pdf_translation_stage_cpu_seconds_total counter",
+    ]
+    lines += [f'pdf_translation_stage_cpu_seconds_total{{stage="{name}"}} {entry["cpu"]:.6f}' for name, entry in stages.items()]
+
+    lines += [
+        "# HELP pdf_translation_stage_lines_total Text lines processed by the pipeline stages.",
+        "# TYPE pdf_translation_stage_lines_total counter",
+    ]
+    lines += [f'pdf_translation_stage_lines_total{{stage="{name}"}} {entry["lines"]}' for name, entry in stages.items()]
+
+    lines += [
+        "# HELP pdf_translation_jobs Jobs in the job store by status.",
+        "# TYPE pdf_translation_jobs gauge",
+    ]
+    lines += [f'pdf_translation_jobs{{status="{status}"}} {count}' for status, count in sorted(job_state.count_jobs_by_status().items())]
+
+    peak = peak_rss_bytes()
+    if peak is not None:
+        lines += [
+            "# HELP process_peak_resident_memory_bytes Peak resident set size of the server process.",
+            "# TYPE process_peak_resident_memory_bytes gauge",
+            f"process_peak_resident_memory_bytes {peak}",
+        ]
+    return "\n".join(lines) + "\n"
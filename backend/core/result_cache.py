@@ -0,0 +1,204 @@
+# ==============================================================================
+# RESULT CACHE FOR RE-SUBMITTED PDFS
+# ==============================================================================
+'''
+Users re-submit the same drawing files many times a day. The result cache
+stores every translated PDF under a key made of the SHA-256 of the input PDF
+bytes and a fingerprint of the pipeline configuration (DPI, Tesseract options,
+model id, font settings, ...). A re-submitted file with the same settings is
+served from the cache without rasterization, OCR, translation or rendering.
+
+The cache is a folder of <key>.pdf files with a <key>.json sidecar each. The
+modification time of the PDF is the last use; the least recently used entries
+are evicted once the folder is larger than config.RESULT_CACHE_MAX_MB.
+'''
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from core import config
+from model import model as translation_model
+from utils import ocr_engine
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+# Counters for the admin endpoint
+_hits = 0
+_misses = 0
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pipeline_fingerprint():
+    """
+    Hash of every setting that changes the translated output. Returns None when
+    the model is not loaded, since the output cannot be attributed to a model.
+    """
+    if translation_model.model_id is None:
+        return None
+
+    settings = {
+        "pipeline_version": config.PIPELINE_VERSION,
+        "model_id": translation_model.model_id,
+        "translation_max_length": config.TRANSLATION_MAX_LENGTH,
+        "ocr_dpi": config.OCR_DPI,
+        "raster_backend": config.RASTER_BACKEND,
+        "tesseract_config": config.OCR_TESSERACT_CONFIG,
+        "vector_text": [config.VECTOR_TEXT_ENABLED, config.VECTOR_MIN_HEBREW_CHARS],
+        "ocr_mode": config.OCR_MODE,
+        "roi": [config.OCR_ROI_DOWNSCALE, config.OCR_ROI_PADDING],
+        "tiling": [config.OCR_TILING, config.OCR_TILE_SIZE, config.OCR_TILE_OVERLAP],
+        "font": [config.OUTPUT_FONT_NAME, config.OUTPUT_MAX_FONTSIZE, config.ABBREVIATION_FONTSIZE_THRESHOLD],
+        "legend_max_columns": config.LEGEND_MAX_COLUMNS,
+        "ocr_engine": ocr_engine.resolve_engine(),
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def make_key(pdf_sha256):
+    """Cache key for a PDF hash under the current pipeline settings, or None if uncacheable."""
+    fingerprint = pipeline_fingerprint()
+    if fingerprint is None:
+        return None
+    return f"{pdf_sha256[:32]}-{fingerprint[:16]}"
+
+
+def lookup(key):
+    """Returns the path of the cached translated PDF for this key, or None."""
+    global _hits, _misses
+
+    pdf_path = _entry_path(key)
+    with _lock:
+        if not os.path.exists(pdf_path):
+            _misses += 1
+            return None
+        _hits += 1
+        # Mark as recently used for eviction
+        os.utime(pdf_path, None)
+    return pdf_path
+
+
+def store(key, write_pdf, source_name):
+    """
+    Writes a translated PDF into the cache with write_pdf(path), then evicts
+    entries beyond the size limit.
+    """
+    os.makedirs(config.RESULT_CACHE_DIR, exist_ok=True)
+    pdf_path = _entry_path(key)
+    tmp_path = f"{pdf_path}.{threading.get_ident()}.tmp"
+
+    try:
+        write_pdf(tmp_path)
+        with _lock:
+            os.replace(tmp_path, pdf_path)
+            with open(_meta_path(key), "w", encoding="utf-8") as f:
+                json.dump({"source_name": source_name, "created_at": time.time()}, f)
+            _evict()
+    except Exception:
+        logger.error(f"Failed to store result cache entry {key}", exc_info=True)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def entries():
+    """Lists the cache entries, most recently used first."""
+    if not os.path.isdir(config.RESULT_CACHE_DIR):
+        return []
+
+    result = []
+    with _lock:
+        for file_name in os.listdir(config.RESULT_CACHE_DIR):
+            if not file_name.endswith(".pdf"):
+                continue
+            key = file_name[:-len(".pdf")]
+            stat = os.stat(_entry_path(key))
+            meta = {}
+            try:
+                with open(_meta_path(key), encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                pass
+            result.append({
+                "key": key,
+                "source_name": meta.get("source_name"),
+                "created_at": meta.get("created_at"),
+                "last_used_at": stat.st_mtime,
+                "size_bytes": stat.st_size,
+            })
+    result.sort(key=lambda entry: entry["last_used_at"], reverse=True)
+    return result
+
+
+def stats():
+    """Summary of the cache for the admin endpoint."""
+    cached = entries()
+    return {
+        "enabled": config.RESULT_CACHE_ENABLED,
+        "cache_dir": os.path.abspath(config.RESULT_CACHE_DIR),
+        "entries": len(cached),
+        "size_bytes": sum(entry["size_bytes"] for entry in cached),
+        "max_bytes": config.RESULT_CACHE_MAX_MB * 1024 * 1024,
+        "hits": _hits,
+        "misses": _misses,
+    }
+
+
+def purge(key=None):
+    """Deletes one entry, or the whole cache when key is None. Returns the number of entries removed."""
+    removed = 0
+    with _lock:
+        if not os.path.isdir(config.RESULT_CACHE_DIR):
+            return 0
+        keys = [key] if key else [f[:-len(".pdf")] for f in os.listdir(config.RESULT_CACHE_DIR) if f.endswith(".pdf")]
+        for k in keys:
+            if _remove_entry(k):
+                removed += 1
+    logger.info(f"Result cache: purged {removed} entries")
+    return removed
+
+
+def _evict():
+    """Removes least recently used entries until the cache fits its size limit. Caller holds _lock."""
+    max_bytes = config.RESULT_CACHE_MAX_MB * 1024 * 1024
+    files = []
+    for file_name in os.listdir(config.RESULT_CACHE_DIR):
+        if file_name.endswith(".pdf"):
+            stat = os.stat(os.path.join(config.RESULT_CACHE_DIR, file_name))
+            files.append((stat.st_mtime, stat.st_size, file_name[:-len(".pdf")]))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, key in sorted(files):
+        if total <= max_bytes:
+            break
+        if _remove_entry(key):
+            total -= size
+            logger.info(f"Result cache: evicted {key}")
+
+
+def _remove_entry(key):
+    existed = False
+    for path in (_entry_path(key), _meta_path(key)):
+        if os.path.exists(path):
+            os.remove(path)
+            existed = True
+    return existed
+
+
+def _entry_path(key):
+    return os.path.join(config.RESULT_CACHE_DIR, f"{os.path.basename(key)}.pdf")
+
+
+def _meta_path(key):
+    return os.path.join(config.RESULT_CACHE_DIR, f"{os.path.basename(key)}.json")
@@ -1,14 +1,24 @@
 # backend/main.py
+import time
+_import_start = time.perf_counter()
+
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 
 # File Imports
 from api.translations import router as translations_router
-from model.model import load_model
+from model import inference_worker
+from model import loader as model_loader
+from core import config
+from core import job_state, metrics
+from utils.text_extraction import shutdown_ocr_pool
+from utils.zip_and_queue_handler import start_batch_processing
+
+_import_seconds = time.perf_counter() - _import_start
 
 # ==============================================================================
 # 1. CONFIGURE LOGGING & MODEL
@@ -20,6 +30,7 @@ logging.basicConfig(
     filemode="a"
 )
 logger = logging.getLogger(__name__)
+logger.info(f"Startup: backend modules imported in {_import_seconds:.2f} s")
 
 # ==============================================================================
 # LIFESPAN EVENT FOR STARTUP
@@ -28,16 +39,35 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
 
     # Code to run before the server starts accepting any requests
-    try :
-        logger.info("Server starting up: Setting up the translation model...")
-        load_model()
-        logger.info("model loaded successfully. Server is ready")
-    except Exception as e:
-        logger.critical(f"FATAL: Failed to load the translation model. Unable to start the application, {e}", exc_info=True)
-        raise RuntimeError("Failed to load the translation model.") from e
+    lifespan_start = time.perf_counter()
+    logger.info(f"Server starting up: model load mode '{config.MODEL_LOAD_MODE}'")
+    if config.MODEL_LOAD_MODE == "startup":
+        try:
+            model_loader.load()
+        except Exception as e:
+            logger.critical(f"FATAL: Failed to load the translation model. Unable to start the application, {e}", exc_info=True)
+            raise
+    elif config.MODEL_LOAD_MODE == "background":
+        model_loader.start_background_load()
+
+    # Jobs that were running when the server last stopped
+    resumed_jobs = [
+        asyncio.create_task(start_batch_processing(file_paths, job_id))
+        for job_id, file_paths in job_state.recover_interrupted_jobs()
+    ]
+
+    logger.info(
+        f"Startup: server accepting requests after {time.perf_counter() - lifespan_start:.2f} s "
+        f"(imports took {_import_seconds:.2f} s)"
+    )
     
     yield
     logger.info("Shutting down the server")
+    for task in resumed_jobs:
+        task.cancel()
+    shutdown_ocr_pool()
+    inference_worker.shutdown()
+    job_state.close_store()
 
 # ==============================================================================
 # FASTAPI APP
@@ -67,7 +97,23 @@ app.add_middleware(
 
 @app.get("/health")
 async def health_check():
-    """A simple endpoint to check if the server is up and running."""
-    return {"status": "ready"}
+    """
+    Answers as soon as the server is up. status is "loading_model" while the
+    model loads, "ready" once jobs can run (in lazy mode, before the model is
+    loaded), or "error" if the model failed to load.
+    """
+    model_status = model_loader.get_status()
+    if model_status["model"] == "error":
+        status = "error"
+    elif model_status["model"] == "loading_model" or (model_status["model"] == "not_loaded" and config.MODEL_LOAD_MODE != "lazy"):
+        status = "loading_model"
+    else:
+        status = "ready"
+    return {"status": status, **model_status}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage timings, job counts and peak memory in the Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 app.include_router(translations_router, prefix="/translate", tags=["translation"])
\ No newline at end of file
@@ -0,0 +1,52 @@
+# ==============================================================================
+# ONE-TIME ONNX EXPORT OF THE TRANSLATION MODEL
+# ==============================================================================
+'''
+Exports he-en-model to ONNX Runtime (encoder, decoder and decoder-with-past so
+generation reuses the key/value cache) for TRANSLATION_BACKEND=onnx.
+
+Needs the optional dependency: pip install optimum[onnxruntime]
+
+Usage (from the project root, with the he-en-model folder in place):
+    python backend/model/export_onnx.py
+    python backend/model/export_onnx.py --output D:\\models\\he-en-model-onnx
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from transformers import AutoTokenizer
+
+from model.model import get_model_path, get_onnx_model_path
+
+
+def export_onnx(model_path, output_path):
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    start = time.perf_counter()
+    ort_model = ORTModelForSeq2SeqLM.from_pretrained(model_path, export=True, use_cache=True)
+    ort_model.save_pretrained(output_path)
+    # The tokenizer is loaded from he-en-model at runtime; saved here so the export is self-contained
+    AutoTokenizer.from_pretrained(model_path).save_pretrained(output_path)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=None, help="source model folder (default: he-en-model)")
+    parser.add_argument("--output", default=None, help="export folder (default: config.TRANSLATION_ONNX_DIR)")
+    args = parser.parse_args()
+
+    model_path = os.path.abspath(args.model or get_model_path())
+    output_path = os.path.abspath(args.output or get_onnx_model_path())
+
+    print(f"Exporting {model_path} -> {output_path}")
+    seconds = export_onnx(model_path, output_path)
+    print(f"Done in {seconds:.1f} s. Start the app with TRANSLATION_BACKEND=onnx to use it.")
+
+
+if __name__ == "__main__":
+    main()
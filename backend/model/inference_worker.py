@@ -0,0 +1,326 @@
+# ==============================================================================
+# DEDICATED MODEL INFERENCE WORKER PROCESSES
+# ==============================================================================
+'''
+Model inference runs in dedicated worker processes instead of the server
+threads, so generate() never competes with uvicorn and the event loop for the
+GIL. Every worker loads the model once and takes translation requests from one
+shared request queue.
+
+A worker does dynamic micro-batching: after taking a request it keeps
+collecting the requests of other concurrent jobs for up to
+config.INFERENCE_MAX_WAIT_MS, or until config.INFERENCE_MAX_BATCH_LINES lines
+are waiting, and translates all of them together with the batched engine of
+utils/translation.py. Under load the batches fill up, so throughput grows with
+the number of concurrent jobs instead of serializing them.
+
+Message protocol:
+- request queue:  (request_id, [hebrew texts]), or None to stop one worker
+- response queue: ("ready", worker_idx, model_id)
+                  ("failed", worker_idx, error message)       model failed to load
+                  ("taken", request_id, worker_idx)           a worker took the request
+                  ("result", request_id, [english texts])
+                  ("error", request_id, error message)
+'''
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from core import config
+from model import model as translation_model
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_processes = []
+_request_queue = None
+_response_queue = None
+_dispatcher = None
+_pending = {}  # Key: request_id -> Future of the translations
+_owners = {}  # Key: request_id -> index of the worker translating it
+_dead_workers = set()  # Indices of the workers whose exit has been handled
+_request_ids = itertools.count()
+
+
+# ==============================================================================
+# SERVER SIDE (CLIENT OF THE WORKERS)
+# ==============================================================================
+def start(workers=None, backend=None):
+    """
+    Starts the inference workers and blocks until all of them have loaded the
+    model. Sets translation_model.model_id to the id reported by the workers.
+    Raises RuntimeError if a worker fails to load the model.
+    """
+    global _request_queue, _response_queue, _dispatcher
+
+    workers = workers or config.INFERENCE_WORKERS
+    backend = backend or config.TRANSLATION_BACKEND
+
+    with _lock:
+        if _processes:
+            return
+
+        # spawn: forking a process that already runs uvicorn/torch threads is unsafe
+        context = multiprocessing.get_context("spawn")
+        _request_queue = context.Queue()
+        _response_queue = context.Queue()
+        for worker_idx in range(workers):
+            process = context.Process(
+                target=_worker_main,
+                args=(worker_idx, _request_queue, _response_queue, backend,
+                      config.INFERENCE_MAX_WAIT_MS / 1000, config.INFERENCE_MAX_BATCH_LINES),
+                name=f"inference-worker-{worker_idx}",
+                daemon=True
+            )
+            process.start()
+            _processes.append(process)
+
+        try:
+            model_id = _wait_until_ready(workers)
+        except Exception:
+            _stop_processes()
+            raise
+
+        translation_model.model_id = model_id
+        _dispatcher = threading.Thread(target=_dispatch_responses, name="inference-dispatcher", daemon=True)
+        _dispatcher.start()
+        logger.info(f"Started {workers} inference worker(s) (backend: {backend}, model id: {model_id})")
+
+
+def is_running():
+    """True when translations are served by the worker processes."""
+    return bool(_processes)
+
+
+def translate(hebrew_texts):
+    """
+    Sends a list of Hebrew strings to the workers and blocks until their
+    translations come back, in input order. Raises RuntimeError if they do not
+    come back within config.INFERENCE_REQUEST_TIMEOUT seconds.
+    """
+    if not hebrew_texts:
+        return []
+    if not any(process.is_alive() for process in _processes):
+        raise RuntimeError("No inference worker is running.")
+
+    request_id = next(_request_ids)
+    future = Future()
+    with _lock:
+        _pending[request_id] = future
+    _request_queue.put((request_id, list(hebrew_texts)))
+    try:
+        return future.result(timeout=config.INFERENCE_REQUEST_TIMEOUT)
+    except FutureTimeoutError:
+        with _lock:
+            _pending.pop(request_id, None)
+            _owners.pop(request_id, None)
+        raise RuntimeError(
+            f"No translation from the inference workers within {config.INFERENCE_REQUEST_TIMEOUT} s."
+        ) from None
+
+
+def shutdown():
+    """Stops the inference workers; called on server shutdown."""
+    global _dispatcher
+    with _lock:
+        if not _processes:
+            return
+        _stop_processes()
+        _response_queue.put(None)
+        _fail_pending(RuntimeError("The inference workers were shut down."))
+    if _dispatcher is not None:
+        _dispatcher.join(timeout=5)
+        _dispatcher = None
+
+
+def _wait_until_ready(workers):
+    ready = 0
+    model_id = None
+    while ready < workers:
+        try:
+            message = _response_queue.get(timeout=1.0)
+        except queue.Empty:
+            if not all(process.is_alive() for process in _processes):
+                raise RuntimeError("An inference worker exited while loading the model.")
+            continue
+
+        kind, _, payload = message
+        if kind == "failed":
+            raise RuntimeError(f"Failed to load the translation model in an inference worker: {payload}")
+        if kind == "ready":
+            ready += 1
+            model_id = payload
+    return model_id
+
+
+def _dispatch_responses():
+    """
+    Resolves the futures of the requests as the workers answer them, and about
+    once a second fails the requests of workers that have died.
+    """
+    next_check = time.monotonic() + 1.0
+    while True:
+        try:
+            message = _response_queue.get(timeout=1.0)
+        except queue.Empty:
+            message = ()
+        except (EOFError, OSError):
+            return
+
+        if message is None:
+            return
+        if message:
+            _handle_response(*message)
+
+        if time.monotonic() >= next_check:
+            next_check = time.monotonic() + 1.0
+            _fail_requests_of_dead_workers()
+
+
+def _handle_response(kind, request_id, payload):
+    with _lock:
+        if kind == "taken":
+            if request_id in _pending:
+                _owners[request_id] = payload
+            return
+        future = _pending.pop(request_id, None)
+        _owners.pop(request_id, None)
+    if future is None:
+        return
+    if kind == "result":
+        future.set_result(payload)
+    else:
+        future.set_exception(RuntimeError(f"Translation failed in the inference worker: {payload}"))
+
+
+def _fail_requests_of_dead_workers():
+    """
+    Fails the requests that a dead worker had taken; the requests still in the
+    queue are left to the live workers. With no live worker, everything fails.
+
+    A worker can die after taking a request but before its "taken" message is
+    sent, so when a new death is seen, the requests without an owner fail too:
+    one of them may have been lost with the worker, and they cannot be told
+    apart from the ones still queued. A queued one that a live worker answers
+    later is simply ignored.
+    """
+    with _lock:
+        dead = {worker_idx for worker_idx, process in enumerate(_processes) if not process.is_alive()}
+        new_deaths = dead - _dead_workers
+        _dead_workers.update(dead)
+        if not dead or not _pending:
+            return
+        if len(dead) == len(_processes):
+            logger.critical("All inference workers have exited")
+            _fail_pending(RuntimeError("The inference workers have exited."))
+            return
+
+        lost = [request_id for request_id, worker_idx in _owners.items() if worker_idx in dead]
+        if new_deaths:
+            lost += [request_id for request_id in _pending if request_id not in _owners]
+        for request_id in lost:
+            worker_idx = _owners.pop(request_id, None)
+            future = _pending.pop(request_id, None)
+            if future is not None and not future.done():
+                owner = f"Inference worker {worker_idx}" if worker_idx is not None else "An inference worker"
+                future.set_exception(RuntimeError(f"{owner} exited while translating."))
+    if lost:
+        logger.error(f"Inference worker(s) {sorted(dead)} exited; failed {len(lost)} request(s) they may have taken")
+
+
+def _stop_processes():
+    """Caller holds _lock."""
+    for _ in _processes:
+        _request_queue.put(None)
+    for process in _processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    _processes.clear()
+    _dead_workers.clear()
+
+
+def _fail_pending(error):
+    """Caller holds _lock."""
+    for future in _pending.values():
+        if not future.done():
+            future.set_exception(error)
+    _pending.clear()
+    _owners.clear()
+
+
+# ==============================================================================
+# WORKER PROCESS
+# ==============================================================================
+def _worker_main(worker_idx, request_queue, response_queue, backend, max_wait, max_batch_lines):
+    """Entry point of a worker process: loads the model, then serves micro-batches."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        filename="backend.log",
+        filemode="a"
+    )
+
+    # Imported here: utils.translation itself imports this module
+    from utils import translation
+
+    try:
+        translation_model.load_model(backend)
+    except Exception as e:
+        response_queue.put(("failed", worker_idx, str(e.__cause__ or e)))
+        return
+    response_queue.put(("ready", worker_idx, translation_model.model_id))
+
+    stopping = False
+    while not stopping:
+        first = request_queue.get()
+        if first is None:
+            break
+        # Sent before any work, so the server knows whose requests to fail if this process dies
+        response_queue.put(("taken", first[0], worker_idx))
+
+        # Collect the requests of other concurrent jobs for up to max_wait seconds
+        batch = [first]
+        lines = len(first[1])
+        deadline = time.monotonic() + max_wait
+        while lines < max_batch_lines:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = request_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                stopping = True
+                break
+            response_queue.put(("taken", request[0], worker_idx))
+            batch.append(request)
+            lines += len(request[1])
+
+        _run_micro_batch(translation, batch, response_queue, worker_idx)
+
+
+def _run_micro_batch(translation, batch, response_queue, worker_idx):
+    """Translates the lines of several requests together and answers every request."""
+    unique_texts = list(dict.fromkeys(text for _, texts in batch for text in texts))
+
+    start = time.perf_counter()
+    try:
+        translations = dict(zip(unique_texts, translation.translate_texts_in_process(unique_texts)))
+    except Exception as e:
+        logger.error(f"Inference worker {worker_idx}: micro-batch failed", exc_info=True)
+        for request_id, _ in batch:
+            response_queue.put(("error", request_id, str(e)))
+        return
+
+    logger.info(
+        f"Inference worker {worker_idx}: {len(batch)} request(s), {len(unique_texts)} unique lines "
+        f"in {time.perf_counter() - start:.2f} s"
+    )
+    for request_id, texts in batch:
+        response_queue.put(("result", request_id, [translations[text] for text in texts]))
@@ -0,0 +1,96 @@
+# ==============================================================================
+# MODEL LOADING LIFECYCLE
+# ==============================================================================
+'''
+Loading the translation model takes much longer than starting the server, so
+the server no longer waits for it. config.MODEL_LOAD_MODE decides when the
+model is loaded:
+
+- "background": a background thread starts loading it at startup (default)
+- "lazy": the first translation job loads it
+- "startup": the server waits for it before accepting requests (old behaviour)
+
+Loading means starting the inference workers (see model/inference_worker.py)
+or, with INFERENCE_WORKERS=0, loading the model in this process. /health
+reports the state through get_status().
+'''
+import logging
+import threading
+import time
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+# "not_loaded" -> "loading_model" -> "ready" | "error"
+_status = "not_loaded"
+_error = None
+_load_seconds = None
+_lock = threading.Lock()
+_done = threading.Event()
+
+
+def load():
+    """Loads the model once; concurrent callers wait for the first load. Raises RuntimeError on failure."""
+    global _status, _error, _load_seconds
+
+    with _lock:
+        if _status == "not_loaded":
+            _status = "loading_model"
+            owner = True
+        else:
+            owner = False
+
+    if not owner:
+        _done.wait()
+        if _status == "error":
+            raise RuntimeError(f"Failed to load the translation model: {_error}")
+        return
+
+    start = time.perf_counter()
+    try:
+        # Imported here: they pull in transformers / torch
+        if config.INFERENCE_WORKERS > 0:
+            from model import inference_worker
+            inference_worker.start()
+        else:
+            from model.model import load_model
+            load_model()
+    except Exception as e:
+        _error = str(e)
+        _status = "error"
+        logger.critical(f"FATAL: Failed to load the translation model. {e}", exc_info=True)
+        raise RuntimeError(f"Failed to load the translation model: {e}") from e
+    else:
+        _load_seconds = time.perf_counter() - start
+        _status = "ready"
+        logger.info(f"Startup: model loaded in {_load_seconds:.2f} s ({config.INFERENCE_WORKERS} inference worker(s))")
+    finally:
+        _done.set()
+
+
+def start_background_load():
+    """Starts loading the model in a daemon thread and returns immediately."""
+    def _run():
+        try:
+            load()
+        except RuntimeError:
+            pass  # Logged by load(); reported through get_status()
+
+    threading.Thread(target=_run, name="model-loader", daemon=True).start()
+
+
+def ensure_loaded():
+    """Blocks until the model is ready, loading it now if nobody has started to."""
+    if _status != "ready":
+        load()
+
+
+def get_status():
+    """State of the model for /health."""
+    return {
+        "model": _status,
+        "load_mode": config.MODEL_LOAD_MODE,
+        "load_seconds": round(_load_seconds, 2) if _load_seconds is not None else None,
+        "error": _error,
+    }
@@ -3,39 +3,132 @@
 # ==============================================================================
 import os
 import sys
+import hashlib
 import logging
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+from core import config
 
 logger = logging.getLogger(__name__)
 
+# Inference backends selectable with config.TRANSLATION_BACKEND
+BACKENDS = ("torch", "int8", "onnx")
+
 # These will be loaded once at startup and reused
 tokenizer = None
 model = None
 
-def load_model():
+# Identifies the loaded model, so cached translations from one model are never
+# served for another (see utils/translation_memory.py)
+model_id = None
+
+def load_model(backend=None):
     """
     Loads the model, reliably finding the path in both development
     and packaged (PyInstaller) mode.
+
+    backend (defaults to config.TRANSLATION_BACKEND) selects the inference engine:
+    - "torch": the fp32 PyTorch model
+    - "int8": the PyTorch model with dynamic int8 quantization of its Linear layers
+    - "onnx": the ONNX Runtime export made by model/export_onnx.py (needs optimum[onnxruntime])
+    All three expose the same tokenizer / generate() interface to utils/translation.py.
     """
-    global tokenizer, model
-    
-    if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
-        base_path = sys._MEIPASS
-        local_model_path = os.path.join(base_path, "he-en-model")
-    else:
-        # Path is relative to this file's location (backend/ml/)
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        local_model_path = os.path.join(base_path, "..", "..", "he-en-model")
+    global tokenizer, model, model_id
+
+    # Imported here so importing this module (e.g. for model_id) does not load transformers / torch
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+    backend = backend or config.TRANSLATION_BACKEND
+    if backend not in BACKENDS:
+        raise RuntimeError(f"Unknown translation backend '{backend}'; expected one of {', '.join(BACKENDS)}")
+
+    local_model_path = get_model_path()
     
-    logger.info(f"Attempting to load model from path: {local_model_path}")
+    logger.info(f"Attempting to load model from path: {local_model_path} (backend: {backend})")
     
     try:
         tokenizer = AutoTokenizer.from_pretrained(local_model_path)
-        model = AutoModelForSeq2SeqLM.from_pretrained(local_model_path)
 
-        logger.info("Model loaded successfully.")
+        if backend == "onnx":
+            onnx_model_path = get_onnx_model_path()
+            model = _load_onnx_model(onnx_model_path)
+            model_id = _compute_model_id(onnx_model_path)
+        elif backend == "int8":
+            model = _load_int8_model(local_model_path)
+            # Quantized output differs slightly from fp32, so it gets its own cache entries
+            model_id = f"{_compute_model_id(local_model_path)}-int8"
+        else:
+            model = AutoModelForSeq2SeqLM.from_pretrained(local_model_path).eval()
+            model_id = _compute_model_id(local_model_path)
+
+        logger.info(f"Model loaded successfully. Model id: {model_id}")
 
     except Exception as e:
         logger.critical(f"FATAL: Failed to load model from {local_model_path}.", exc_info=True)
         
-        raise RuntimeError("Failed to load the translation model.") from e
\ No newline at end of file
+        raise RuntimeError("Failed to load the translation model.") from e
+
+
+def get_model_path():
+    """Path of the he-en-model folder in dev mode and in the PyInstaller bundle."""
+    return _resolve_project_path("he-en-model")
+
+
+def get_onnx_model_path():
+    """Path of the ONNX export; config.TRANSLATION_ONNX_DIR is relative to the project root."""
+    return _resolve_project_path(config.TRANSLATION_ONNX_DIR)
+
+
+def _resolve_project_path(folder):
+    if os.path.isabs(folder):
+        return folder
+    if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
+        return os.path.join(sys._MEIPASS, folder)
+    # Path is relative to this file's location (backend/model/)
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, "..", "..", folder)
+
+
+def _load_int8_model(local_model_path):
+    """fp32 model with its Linear layers (attention, FFN, LM head) dynamically quantized to int8."""
+    import torch
+    from transformers import AutoModelForSeq2SeqLM
+
+    fp32_model = AutoModelForSeq2SeqLM.from_pretrained(local_model_path).eval()
+    return torch.ao.quantization.quantize_dynamic(fp32_model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_onnx_model(onnx_model_path):
+    """
+    ONNX Runtime encoder + decoder with past key/values, so each generated token
+    only runs the decoder on the new position.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise RuntimeError("The onnx backend needs the optional dependency: pip install optimum[onnxruntime]") from e
+
+    if not os.path.isdir(onnx_model_path):
+        raise RuntimeError(f"No ONNX export found at {onnx_model_path}; run python backend/model/export_onnx.py first")
+
+    return ORTModelForSeq2SeqLM.from_pretrained(onnx_model_path, use_cache=True, provider="CPUExecutionProvider")
+
+
+def _compute_model_id(local_model_path):
+    """
+    Builds a stable identifier for the model folder from its name, its
+    config.json and the size/modification time of every file in it. Replacing
+    the weights in place therefore produces a new id.
+    """
+    digest = hashlib.sha256()
+    for file_name in sorted(os.listdir(local_model_path)):
+        file_path = os.path.join(local_model_path, file_name)
+        if not os.path.isfile(file_path):
+            continue
+        stat = os.stat(file_path)
+        digest.update(f"{file_name}:{stat.st_size}:{int(stat.st_mtime)}".encode("utf-8"))
+        if file_name == "config.json":
+            with open(file_path, "rb") as f:
+                digest.update(f.read())
+
+    folder_name = os.path.basename(os.path.normpath(local_model_path))
+    return f"{folder_name}-{digest.hexdigest()[:16]}"
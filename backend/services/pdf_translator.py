@@ -3,33 +3,90 @@
 # ==============================================================================
 
 
+import functools
 import logging
 import fitz
 import os
+import queue
+import shutil
+import threading
+import time
+import uuid
 
 # Import isolated modules
 from core import job_state as job_state
-from utils.legends_util import create_legend_pdf_page
-from utils.text_extraction import extract_text_with_location, filter_hebrew_text, extract_table_cells, final_extracted_text_list
+from core import config, result_cache, metrics
+from utils.text_extraction import iter_text_with_location, filter_hebrew_text, extract_table_cells, final_extracted_text_list
 from utils.translation import translate_hebrew_to_english
-from utils.output_pdf_handler import prepare_display_data, create_translated_doc_in_memory, assemble_final_pdf
+from utils.deduplication import JobTranslations, deduplicate_text_data, fan_out_translations
+from utils.output_pdf_handler import prepare_display_data, OutputPdfWriter
+from utils.legends_util import AbbreviationRegistry
 
 logger = logging.getLogger(__name__)
 
+# Files of a job run in parallel; these cap how many of them are in each CPU-heavy
+# stage at once. OCR runs in Tesseract (subprocesses or the OCR workers), while translation shares the
+# model (in-process or in the inference workers), so the two stages get separate limits.
+_ocr_slots = threading.BoundedSemaphore(config.OCR_CONCURRENCY)
+_translation_slots = threading.BoundedSemaphore(config.TRANSLATION_CONCURRENCY)
+
 # ==============================================================================
 # BACKGROUND WORKER TASK
 # ==============================================================================
-def run_translation_task(job_id: str, pdf_path: str):
-    """The long-running function that will be executed in the background."""
+def run_translation_task(job_id: str, pdf_path: str, job_translations: JobTranslations = None, pdf_sha256: str = None,
+                         abbreviations: AbbreviationRegistry = None):
+    """
+    The long-running function that will be executed in the background, once
+    per file. Returns (output file name, write_pdf), or None if the file failed
+    (the error is recorded on the file in the job state). The translated PDF is
+    serialized once, into a working file in config.JOB_OUTPUT_DIR (never next
+    to the input); write_pdf(target) moves it into the job's output (a path) or
+    copies it into a binary stream (the job ZIP entry), and removes it.
+
+    job_translations is the JobTranslations shared by all the files of a job, so
+    a label repeated across files is translated only once, even by files
+    running at the same time.
+    abbreviations is the job's AbbreviationRegistry, so a term gets the same
+    legend code in every file. pdf_sha256 is the hash of the file when already
+    known (uploads).
+
+    The result cache is only used for a file with its own registry
+    (abbreviations None): with a job-wide one, the codes depend on the other
+    files of the job, and a cached PDF would carry codes allocated in another
+    job's order.
+    """
+    if job_translations is None:
+        job_translations = JobTranslations()
+    use_cache = config.RESULT_CACHE_ENABLED and abbreviations is None
+    if abbreviations is None:
+        abbreviations = AbbreviationRegistry()
+
     try:
         logger.info(f"Job {job_id}: Starting processing for {pdf_path}")
-        doc = fitz.open(pdf_path)
-        pdf_bytes = doc.tobytes()
+        output_name = os.path.basename(pdf_path).replace(".pdf", "_translated.pdf")
+        os.makedirs(config.JOB_OUTPUT_DIR, exist_ok=True)
+        output_path = os.path.join(config.JOB_OUTPUT_DIR, f"{job_id}-{uuid.uuid4().hex}.pdf.part")
+
+        # A file already translated with the same settings is served from the result cache
+        cache_key = None
+        if use_cache:
+            cache_key = result_cache.make_key(pdf_sha256 or result_cache.hash_file(pdf_path))
+            cached_path = result_cache.lookup(cache_key) if cache_key else None
+            if cached_path:
+                try:
+                    # Opened now, so a later eviction cannot take it away before it is copied
+                    cached_file = open(cached_path, "rb")
+                    logger.info(f"Job {job_id}: Result cache hit for {pdf_path} ({cache_key})")
+                    job_state.update_file_status(job_id, pdf_path, "done")
+                    return output_name, functools.partial(_copy_pdf, cached_file)
+                except OSError:
+                    # Evicted in the meantime; run the full pipeline instead
+                    logger.warning(f"Job {job_id}: Cached result {cache_key} could not be read", exc_info=True)
 
-        job_state.update_job_status(job_id, "extracting")
+        doc = fitz.open(pdf_path)
+        # pdf_bytes = doc.tobytes()
 
-        # Extract all text using fitz
-        all_text = extract_text_with_location(pdf_path)
+        job_state.update_file_status(job_id, pdf_path, "extracting")
 
         # Extract bottom right table text using pdfplumber
         # brt = extract_table_cells(pdf_bytes, 665, 665, 1180, 830)
@@ -43,42 +100,241 @@ def run_translation_task(job_id: str, pdf_path: str):
         # Similarly remove doubly extracted text from the lsd table
         # final_text_list = final_extracted_text_list(lsd, interim_text_list)
 
-        # Filter out the Chinese text from it.
-        hebrew_text_data = filter_hebrew_text(all_text)
+        # Extraction, translation and rendering run as a page-by-page pipeline
+        # The pages (with their legends) are rendered straight into the output PDF, which is saved as it grows
+        writer = OutputPdfWriter(output_path)
+        _run_page_pipeline(job_id, pdf_path, doc, job_translations, abbreviations, writer)
 
-        # logger.info(f"testing the obtained filtered hebrew text {hebrew_text_data}")
+        job_state.update_file_status(job_id, pdf_path, "creating_pdf")
 
-        if not hebrew_text_data:
-            raise ValueError("No Chinese text found in the document.")
+        with metrics.file_context(job_id, pdf_path), metrics.stage("save"):
+            writer.close()
 
-        job_state.update_job_status(job_id, "translating")
-        translated_data = translate_hebrew_to_english(hebrew_text_data)
-        
-        enriched_data, legend_terms = prepare_display_data(translated_data)
+        if cache_key:
+            # The cache entry shares the saved file; nothing is serialized again
+            result_cache.store(cache_key, functools.partial(_link_pdf, output_path), os.path.basename(pdf_path))
 
-        job_state.update_job_status(job_id, "creating_pdf")
-        output_path = pdf_path.replace(".pdf", "_translated.pdf")
-        
-        translated_doc = create_translated_doc_in_memory(doc, enriched_data)
+        job_state.update_file_status(job_id, pdf_path, "done")
+        return output_name, functools.partial(_move_pdf, output_path)
+
+    except Exception as e:
+        logger.error(f"Job {job_id}: Task failed for {pdf_path}.", exc_info=True)
+        job_state.update_file_status(job_id, pdf_path, "error", error=str(e))
+        if 'writer' in locals():
+            writer.discard()
+    finally:
+        if 'doc' in locals() and not doc.is_closed:
+            doc.close()
 
-        if legend_terms:
-            first_page = translated_doc[0]
-            page_height = first_page.rect.height
-            legend_width = max(180, first_page.rect.width * 0.35)
-            legend_doc = create_legend_pdf_page(legend_terms, page_height=page_height, page_width=legend_width)
-            assemble_final_pdf(translated_doc, legend_doc, output_path)
-            translated_doc.close()
-            legend_doc.close()
-        else:
-            translated_doc.save(output_path)
-            translated_doc.close()
 
+# ==============================================================================
+# PAGE PIPELINE: EXTRACT -> TRANSLATE -> RENDER
+# ==============================================================================
+'''
+The three stages of a file run concurrently and hand pages to each other through
+bounded queues:
 
-        return output_path
+    extract (thread) --extracted_q--> translate (thread) --translated_q--> render (caller)
 
-    except Exception as e:
-        logger.error(f"Job {job_id}: Task failed.", exc_info=True)
-        job_state.update_job_status(job_id, "error", error=str(e))
+so OCR of page N+1 overlaps with the translation of page N and the rendering of
+page N-1. The queues are bounded (config.PIPELINE_QUEUE_SIZE pages) so a fast
+stage cannot run far ahead and pile up pages in memory. Queue depths and per
+stage page counts are published on the file's "pipeline" entry in the job state.
+'''
+_END = object()
+
+
+def _run_page_pipeline(job_id, pdf_path, doc, job_translations, abbreviations, writer):
+    """
+    Runs the page pipeline for one file, rendering every page into `writer`
+    (an OutputPdfWriter). Raises the first error of any stage, and
+    ValueError for a file without Hebrew text, before any page is rendered.
+    """
+    extracted_q = queue.Queue(maxsize=config.PIPELINE_QUEUE_SIZE)
+    translated_q = queue.Queue(maxsize=config.PIPELINE_QUEUE_SIZE)
+    abort = threading.Event()
+    errors = []
+    progress = {
+        "pages_total": doc.page_count,
+        "pages_extracted": 0,
+        "pages_translated": 0,
+        "pages_rendered": 0,
+        "hebrew_lines": 0,
+        "extracted_queue_depth": 0,
+        "translated_queue_depth": 0,
+        "time_to_first_page_s": None,
+        "wall_time_s": None,
+    }
+    start = time.perf_counter()
+
+    def publish(**fields):
+        progress.update(fields)
+        progress["extracted_queue_depth"] = extracted_q.qsize()
+        progress["translated_queue_depth"] = translated_q.qsize()
+        job_state.update_file_pipeline(job_id, pdf_path, dict(progress))
+
+    def extract_stage():
+        page_paths = {}
+        try:
+            with metrics.file_context(job_id, pdf_path), _ocr_slots:
+                for page_num, page_lines in iter_text_with_location(pdf_path, page_paths=page_paths):
+                    if not _put(extracted_q, (page_num, page_lines), abort):
+                        return
+                    publish(pages_extracted=progress["pages_extracted"] + 1)
+            job_state.set_extraction_paths(job_id, pdf_path, page_paths)
+            job_state.update_file_status(job_id, pdf_path, "translating")
+        except Exception as e:
+            errors.append(e)
+            abort.set()
+        finally:
+            _put(extracted_q, _END, abort)
+
+    def translate_stage():
+        try:
+            with metrics.file_context(job_id, pdf_path):
+                while True:
+                    item = _get(extracted_q, abort)
+                    if item is _END:
+                        break
+                    page_num, page_lines = item
+
+                    # Filter out the Chinese text from it.
+                    hebrew_text_data = filter_hebrew_text(page_lines)
+
+                    translated_data = []
+                    if hebrew_text_data:
+                        # Translate every unique string once, then fan it out to all its bboxes
+                        # A string another file is already translating is waited for, not sent again
+                        keys, unique_items = deduplicate_text_data(hebrew_text_data, job_translations)
+                        claimed, pending = job_translations.claim(unique_items)
+                        if claimed:
+                            try:
+                                with _translation_slots:
+                                    translated_unique = translate_hebrew_to_english(list(claimed.values()))
+                                job_translations.publish(dict(zip(claimed.keys(), (t["english_translation"] for t in translated_unique))))
+                            finally:
+                                job_translations.release(claimed)
+                        for future in pending:
+                            future.result()
+                        translated_data = fan_out_translations(hebrew_text_data, keys, job_translations)
+                        job_state.add_dedup_stats(job_id, len(hebrew_text_data), len(job_translations))
+
+                    if not _put(translated_q, (page_num, translated_data), abort):
+                        return
+                    publish(
+                        pages_translated=progress["pages_translated"] + 1,
+                        hebrew_lines=progress["hebrew_lines"] + len(hebrew_text_data)
+                    )
+            job_state.update_file_status(job_id, pdf_path, "creating_pdf")
+        except Exception as e:
+            errors.append(e)
+            abort.set()
+        finally:
+            _put(translated_q, _END, abort)
+
+    stages = [
+        threading.Thread(target=extract_stage, name=f"extract-{job_id[:8]}", daemon=True),
+        threading.Thread(target=translate_stage, name=f"translate-{job_id[:8]}", daemon=True),
+    ]
+    for stage in stages:
+        stage.start()
+
+    def render_page(page_num, translated_data):
+        enriched_data, _ = prepare_display_data(translated_data, abbreviations)
+        writer.add_page(doc, page_num, enriched_data)
+
+        if progress["time_to_first_page_s"] is None:
+            progress["time_to_first_page_s"] = round(time.perf_counter() - start, 3)
+        publish(pages_rendered=progress["pages_rendered"] + 1)
+
+    # Render stage runs on the calling thread. Pages before the first one with
+    # Hebrew text wait (as page numbers only), so a file without any text
+    # fails before anything is rendered
+    has_text = False
+    held_pages = []
+    try:
+        with metrics.file_context(job_id, pdf_path):
+            while True:
+                item = _get(translated_q, abort)
+                if item is _END:
+                    break
+                page_num, translated_data = item
+
+                if not translated_data and not has_text:
+                    held_pages.append(page_num)
+                    continue
+                has_text = True
+                for held_page in held_pages:
+                    render_page(held_page, [])
+                held_pages.clear()
+                render_page(page_num, translated_data)
+    except Exception:
+        abort.set()
+        raise
     finally:
-        if 'doc' in locals() and not doc.is_closed:
-            doc.close()
\ No newline at end of file
+        for stage in stages:
+            stage.join()
+
+    if errors:
+        raise errors[0]
+
+    if not has_text:
+        raise ValueError("No Chinese text found in the document.")
+
+    publish(wall_time_s=round(time.perf_counter() - start, 3))
+    dedup = job_state.get_job(job_id).get("dedup") or {}
+    logger.info(
+        f"Job {job_id}: {pdf_path}: {progress['pages_rendered']} pages, {progress['hebrew_lines']} Hebrew lines, "
+        f"first page after {progress['time_to_first_page_s']} s, total {progress['wall_time_s']} s "
+        f"(job dedup: {dedup.get('total_lines')} lines / {dedup.get('unique_lines')} unique)"
+    )
+
+
+def _copy_pdf(source_file, target):
+    """Copies an open binary file (consumed) to `target`, a path or a writable binary stream."""
+    with source_file:
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "wb") as f:
+                shutil.copyfileobj(source_file, f)
+        else:
+            shutil.copyfileobj(source_file, target)
+
+
+def _move_pdf(pdf_path, target):
+    """Moves a working PDF (consumed) to `target`, a path or a writable binary stream."""
+    if isinstance(target, (str, os.PathLike)):
+        os.replace(pdf_path, target)
+        return
+    try:
+        _copy_pdf(open(pdf_path, "rb"), target)
+    finally:
+        os.remove(pdf_path)
+
+
+def _link_pdf(pdf_path, target_path):
+    """Hard-links a finished PDF to target_path, or copies it where links are not supported."""
+    try:
+        os.link(pdf_path, target_path)
+    except OSError:
+        shutil.copyfile(pdf_path, target_path)
+
+
+def _put(q, item, abort):
+    """Puts an item on a pipeline queue, giving up if the pipeline is aborted."""
+    while not abort.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, abort):
+    """Takes the next item from a pipeline queue; returns _END if the pipeline is aborted."""
+    while not abort.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
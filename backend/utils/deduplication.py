@@ -0,0 +1,121 @@
+# ==============================================================================
+# WITHIN-JOB DEDUPLICATION OF EXTRACTED TEXT
+# ==============================================================================
+'''
+Drawings repeat the same labels many times on a sheet and across the sheets
+and files of a job. These functions collapse identical (normalized) strings
+before translation, so each unique string is translated exactly once per job,
+and then fan the translations back out to every bbox.
+
+The files of a job run in parallel, so the strings shared by the job live in a
+JobTranslations: a file claims the strings it is about to translate, and
+another file that needs one of them meanwhile waits for that translation
+instead of sending the same text to the model again.
+'''
+import threading
+from concurrent.futures import Future
+
+from utils.translation_memory import normalize_hebrew_text
+
+
+class JobTranslations:
+    """
+    The {normalized text: translation} dict shared by all the files of a job.
+    Reads (`in`, len, get) need no lock; claim/publish/release keep every
+    unique string translated by one file only, however many files need it.
+    """
+
+    def __init__(self):
+        self._translations = {}
+        self._in_flight = {}  # Key: normalized text -> Future, set once its translation is published
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._translations
+
+    def __len__(self):
+        return len(self._translations)
+
+    def get(self, key, default=None):
+        return self._translations.get(key, default)
+
+    def claim(self, unique_items):
+        """
+        Splits the strings that still need translating (unique_items of
+        deduplicate_text_data) into (claimed, pending):
+        - claimed: {normalized text: item} this caller translates, then hands to
+          publish(); release() must follow in every case
+        - pending: Futures of the strings another file is translating; their
+          result() returns once the translations are in
+        """
+        claimed = {}
+        pending = []
+        with self._lock:
+            for key, item in unique_items.items():
+                if key in self._translations:
+                    continue
+                future = self._in_flight.get(key)
+                if future is None:
+                    self._in_flight[key] = Future()
+                    claimed[key] = item
+                else:
+                    pending.append(future)
+        return claimed, pending
+
+    def publish(self, translations):
+        """Adds {normalized text: translation} and wakes the files waiting on those strings."""
+        with self._lock:
+            self._translations.update(translations)
+            done = [self._in_flight.pop(key) for key in translations if key in self._in_flight]
+        for future in done:
+            future.set_result(None)
+
+    def release(self, keys):
+        """
+        Gives up the claimed strings that were not published (their translation
+        failed); the files waiting on them fail instead of waiting forever.
+        """
+        with self._lock:
+            failed = [self._in_flight.pop(key) for key in keys if key in self._in_flight]
+        for future in failed:
+            future.set_exception(RuntimeError("The translation of a line shared with another file of the job failed."))
+
+
+def deduplicate_text_data(hebrew_text_data, known_translations):
+    """
+    Collapses identical normalized strings.
+
+    Inputs:
+    - hebrew_text_data: list of {"text", "bbox", "page"} dicts
+    - known_translations: dict (or JobTranslations) {normalized text: translation}
+      of strings already translated earlier in the same job
+
+    Output: (keys, unique_items)
+    - keys: the normalized key of every input item, in input order
+    - unique_items: dict {normalized text: first item with that text} for the
+      strings that still need translating
+    """
+    keys = []
+    unique_items = {}
+    for item in hebrew_text_data:
+        key = normalize_hebrew_text(item["text"])
+        keys.append(key)
+        if key not in known_translations and key not in unique_items:
+            unique_items[key] = item
+    return keys, unique_items
+
+
+def fan_out_translations(hebrew_text_data, keys, translations):
+    """
+    Builds the translated data list (same format as translate_hebrew_to_english)
+    by looking up the translation of every item's normalized key.
+    """
+    translated_data = []
+    for item, key in zip(hebrew_text_data, keys):
+        translated_data.append({
+            "text": item["text"],
+            "bbox": item["bbox"],
+            "page": item["page"],
+            "english_translation": translations.get(key, "")
+        })
+    return translated_data
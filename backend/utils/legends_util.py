@@ -3,35 +3,25 @@
 # ==============================================================================
 import fitz  # PyMuPDF
 import re
-from reportlab.pdfgen import canvas
-from reportlab.lib.colors import black, grey, whitesmoke
-from reportlab.platypus import Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-import io
+import threading
 
-# Paragraph style for wrapping
-styles = getSampleStyleSheet()
-styleN = styles["Normal"]
-styleN.fontName = "Helvetica"
-styleN.fontSize = 9
-styleN.wordWrap = 'CJK'
+from core import config
+from utils.text_fitting import wrap_text
 
+# Table layout of a legend column, in points (same look as the former reportlab table)
+LEGEND_FONTSIZE = 9
+LEGEND_LEADING = 11
+LEGEND_CODE_WIDTH = 70
+LEGEND_MARGIN = 10
+LEGEND_CELL_PADDING = (6, 3)  # horizontal, vertical
+LEGEND_HEADER_HEIGHT = 20
 
-def refine_abbreviation(term, used_codes, max_len=3):
-    """
-    Generates a short, unique abbreviation for a given term without
-    relying on any external libraries.
-
-    Args:
-        term (str): The full string to be abbreviated.
-        used_codes (dict): A dictionary tracking terms and the codes
-                           already assigned to them to prevent duplicates.
-        max_len (int): The target length for abbreviations of single words.
 
-    Returns:
-        str: The generated unique abbreviation.
+def abbreviation_candidate(term, max_len=3):
+    """
+    The preferred abbreviation of a term: the initials of its first three
+    words, or the first max_len characters of a single word.
     """
-    # 1. Generate a candidate abbreviation
     words = term.split()
     if len(words) > 1:
         # Use regex to find the first alphabetic character in each word
@@ -47,30 +37,68 @@ def refine_abbreviation(term, used_codes, max_len=3):
         # If it's a single word, truncate it
         candidate = term[:max_len].upper()
 
-    # 2. Ensure the candidate isn't empty
+    # Ensure the candidate isn't empty
     if not candidate:
         candidate = term[:max_len].upper()
-
-    # 3. Handle duplicates by adding a number
-    if candidate in used_codes.values():
-        # First, check if this exact term has already been abbreviated
-        for k, v in used_codes.items():
-            if k == term:
-                return v # Return the existing abbreviation
-
-        # If not, find a new unique code by appending a number
-        idx = 1
-        new_code = f"{candidate}{idx}"
-        while new_code in used_codes.values():
-            idx += 1
-            new_code = f"{candidate}{idx}"
-        candidate = new_code
-
-    # 4. Store and return the unique code
-    used_codes[term] = candidate
     return candidate
 
 
+class AbbreviationRegistry:
+    """
+    Assigns a short, unique code to every abbreviated term of a job, shared by
+    all pages and files of the job, so the same term always gets the same code.
+
+    - forward map  term -> code: a known term is a dict lookup
+    - reverse index code -> term: a taken code is a dict lookup
+    - per-candidate counters: the numbered codes of a candidate (TNW1, TNW2, ...)
+      continue from the last one handed out instead of probing from 1 again
+
+    so allocating a code costs O(1) however many terms are registered. Codes
+    are deterministic for a given order of first appearance. Files of a job run
+    in parallel threads, hence the lock.
+    """
+
+    def __init__(self, max_len=3):
+        self.max_len = max_len
+        self._codes = {}
+        self._terms = {}
+        self._next_suffix = {}
+        self._lock = threading.Lock()
+
+    def code_for(self, term):
+        """The code of a term, allocated on first use."""
+        code = self._codes.get(term)
+        if code is not None:
+            return code
+
+        candidate = abbreviation_candidate(term, self.max_len)
+        with self._lock:
+            code = self._codes.get(term)
+            if code is not None:
+                return code
+
+            code = candidate
+            if code in self._terms:
+                # Handle duplicates by adding a number
+                idx = self._next_suffix.get(candidate, 1)
+                code = f"{candidate}{idx}"
+                while code in self._terms:
+                    # Taken by a term whose own candidate ends in a digit
+                    idx += 1
+                    code = f"{candidate}{idx}"
+                self._next_suffix[candidate] = idx + 1
+
+            self._codes[term] = code
+            self._terms[code] = term
+        return code
+
+    def term_for(self, code):
+        return self._terms.get(code)
+
+    def __len__(self):
+        return len(self._codes)
+
+
 # def determine_legend_font_size(avg_font_size, min_font_size=7):
 #     """
 #     Returns a readable legend font size based on a heuristic average, with a floor.
@@ -78,67 +106,115 @@ def refine_abbreviation(term, used_codes, max_len=3):
 #     return max(avg_font_size, min_font_size)
 
 
-def _create_legend_data_from_terms(legend_terms_dict):
+def legend_column_width(page_width):
+    """Width of one legend column beside a sheet of the given width."""
+    return max(180, page_width * 0.35)
+
+
+def _layout_legend(legend_terms, column_width, page_height):
     """
-    Build a 2D list suitable for reportlab's Table from a dict of {code: term}.
-    Wraps long meanings using a Paragraph so they line-break inside the table cell.
+    Splits the rows of the legend table into columns that fit the page height.
+    Returns [[(code, meaning lines, row height), ...] per column].
     """
-    data = [["Code", "Meaning"]]
-    for code, term in legend_terms_dict.items():
-        meaning_para = Paragraph(term, styleN)
-        data.append([code, meaning_para])
-    return data
-
+    meaning_width = column_width - 2 * LEGEND_MARGIN - LEGEND_CODE_WIDTH - 2 * LEGEND_CELL_PADDING[0]
+    available = page_height - 2 * LEGEND_MARGIN - LEGEND_HEADER_HEIGHT
+
+    columns = [[]]
+    used = 0.0
+    for code, term in legend_terms.items():
+        lines = wrap_text(term, meaning_width / LEGEND_FONTSIZE, "helv", split_words=True)
+        row_height = len(lines) * LEGEND_LEADING + 2 * LEGEND_CELL_PADDING[1]
+        if columns[-1] and used + row_height > available:
+            columns.append([])
+            used = 0.0
+        columns[-1].append((code, lines, row_height))
+        used += row_height
+    return columns
+
+
+def _draw_legend_column(page, x, rows, column_width):
+    """Draws one legend table (header + rows) with its left edge at x."""
+    table = fitz.Rect(x + LEGEND_MARGIN, LEGEND_MARGIN, x + column_width - LEGEND_MARGIN, LEGEND_MARGIN)
+    code_x1 = table.x0 + LEGEND_CODE_WIDTH
+    pad_x, pad_y = LEGEND_CELL_PADDING
+    ascender = fitz.Font("helv").ascender * LEGEND_FONTSIZE
+
+    shape = page.new_shape()
+    header = fitz.Rect(table.x0, table.y0, table.x1, table.y0 + LEGEND_HEADER_HEIGHT)
+    shape.draw_rect(header)
+    shape.finish(color=None, fill=(0.5, 0.5, 0.5))
+    shape.insert_text((table.x0 + pad_x, header.y0 + pad_y + ascender), "Code",
+                      fontname="hebo", fontsize=LEGEND_FONTSIZE, color=(0.96, 0.96, 0.96))
+    shape.insert_text((code_x1 + pad_x, header.y0 + pad_y + ascender), "Meaning",
+                      fontname="helv", fontsize=LEGEND_FONTSIZE, color=(0.96, 0.96, 0.96))
+
+    y = header.y1
+    for code, lines, row_height in rows:
+        shape.insert_text((table.x0 + pad_x, y + pad_y + ascender), code,
+                          fontname="hebo", fontsize=LEGEND_FONTSIZE, color=(0, 0, 0))
+        for i, line in enumerate(lines):
+            shape.insert_text((code_x1 + pad_x, y + pad_y + ascender + i * LEGEND_LEADING), line,
+                              fontname="helv", fontsize=LEGEND_FONTSIZE, color=(0, 0, 0))
+        y += row_height
+
+    # Grid: outer box, column divider and row separators
+    shape.draw_rect(fitz.Rect(table.x0, table.y0, table.x1, y))
+    shape.draw_line((code_x1, table.y0), (code_x1, y))
+    row_y = header.y1
+    for _, _, row_height in rows:
+        shape.draw_line((table.x0, row_y), (table.x1, row_y))
+        row_y += row_height
+    shape.finish(color=(0, 0, 0), width=0.5)
+    shape.commit()
+
+
+def create_legend_pages(legend_terms, page_height, column_width, legend_doc=None, max_columns=None):
+    """
+    Draws the legend table of legend_terms ({code: term}) with PyMuPDF onto new
+    pages of legend_doc (a new document if None). Rows that do not fit the page
+    height continue in another column beside it; beyond max_columns columns
+    (config.LEGEND_MAX_COLUMNS) the legend continues on another page.
 
-def create_legend_pdf_page(legend_terms, page_height, page_width):
+    Returns (legend_doc, [page numbers of the new legend pages]).
     """
-    Create a single-page PDF in memory containing ONLY the legend table.
+    legend_doc = fitz.open() if legend_doc is None else legend_doc
+    max_columns = max_columns or config.LEGEND_MAX_COLUMNS
+
+    columns = _layout_legend(legend_terms, column_width, page_height)
+    page_numbers = []
+    for start in range(0, len(columns), max_columns):
+        page_columns = columns[start:start + max_columns]
+        page = legend_doc.new_page(width=column_width * len(page_columns), height=page_height)
+        for idx, rows in enumerate(page_columns):
+            _draw_legend_column(page, idx * column_width, rows, column_width)
+        page_numbers.append(page.number)
+    return legend_doc, page_numbers
 
-    Inputs:
-    - legend_terms: dict like {'GAD': 'General Arrangement Drawing'}
-    - page_height: float
-    - page_width: float
 
-    Logic:
-    - Use reportlab to create a Table from the legend_terms
-    - Style the table via TableStyle
-    - Draw onto an in-memory canvas sized to (page_width x page_height)
+class LegendCache:
+    """
+    The legend pages of one output document. A legend with the same codes at
+    the same size is drawn once and its pages are stamped again (the output
+    document reuses the XObject of a page it has already shown).
 
-    Output:
-    - Returns a fitz.Document loaded from the in-memory PDF stream
+    Every legend gets a small document of its own: PyMuPDF cannot graft from a
+    source document that has grown since the output first showed one of its
+    pages, so a shared document would break on the second distinct legend.
     """
-    # Prepare table data
-    table_data = _create_legend_data_from_terms(legend_terms)
-
-    # Create reportlab table and style
-    table = Table(table_data, colWidths=[70, page_width - 90])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, black),
-        ('VALIGN', (0, 1), (-1, -1), 'TOP'),
-    ]))
-
-    # Lay out table and draw to a PDF page in memory
-    packet = io.BytesIO()
-    c = canvas.Canvas(packet, pagesize=(page_width, page_height))
-
-    # Compute table size and place at a margin from the top-right inside legend page
-    available_w = page_width - 20
-    available_h = page_height - 20
-    wrapped_w, wrapped_h = table.wrap(available_w, available_h)
-    x = 10
-    y = page_height - wrapped_h - 10
-    table.drawOn(c, x, y)
-
-    c.showPage()
-    c.save()
-    packet.seek(0)
-
-    # Return as a fitz.Document
-    legend_doc = fitz.open(stream=packet.read(), filetype="pdf")
-    return legend_doc
+
+    def __init__(self):
+        self._legends = {}  # Key: (codes and terms, column width, height) -> (legend doc, [page numbers])
+
+    def pages_for(self, legend_terms, page_height, column_width):
+        """(legend document, [numbers of its pages]) holding this legend."""
+        key = (tuple(legend_terms.items()), round(column_width, 2), round(page_height, 2))
+        legend = self._legends.get(key)
+        if legend is None:
+            legend = create_legend_pages(legend_terms, page_height, column_width)
+            self._legends[key] = legend
+        return legend
+
+    def close(self):
+        for legend_doc, _ in self._legends.values():
+            legend_doc.close()
+        self._legends.clear()
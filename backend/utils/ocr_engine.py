@@ -0,0 +1,217 @@
+# ==============================================================================
+# TESSERACT INVOCATION FILE
+# ==============================================================================
+'''
+Single place where Tesseract is called. Every OCR path (full page, tiles,
+regions) goes through image_to_data, so they all share one configuration and
+one output format.
+
+config.OCR_ENGINE picks how Tesseract is run:
+- "tesserocr": in-process through the Tesseract C API (tesserocr, optional).
+  The heb+eng traineddata is loaded once per API instance, and the instances
+  are reused for every page this process OCRs.
+- "pipe": the tesseract executable, with the image piped in uncompressed (PNM)
+  over stdin and the TSV read from stdout: no temporary files, no PNG.
+- "pytesseract" (default): pytesseract.image_to_data (PNG and TSV temporary
+  files).
+- "auto": tesserocr when it is installed, otherwise "pipe".
+
+All of them return pytesseract's DICT output, so nothing downstream changes.
+'''
+import logging
+import os
+import shlex
+import subprocess
+import threading
+
+import numpy as np
+import pytesseract
+from pytesseract import Output
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+# Columns of Tesseract's TSV output (the keys of the DICT output)
+TSV_COLUMNS = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+               'left', 'top', 'width', 'height', 'conf', 'text')
+
+
+def image_to_data(img_np):
+    """
+    Runs Tesseract on an image (numpy array) and returns pytesseract's DICT
+    output: parallel lists keyed by 'level', 'page_num', 'block_num',
+    'par_num', 'line_num', 'word_num', 'left', 'top', 'width', 'height',
+    'conf' and 'text'.
+    """
+    engine = resolve_engine()
+    if engine == "tesserocr":
+        return _image_to_data_tesserocr(img_np)
+    if engine == "pipe":
+        return _image_to_data_pipe(img_np)
+    return pytesseract.image_to_data(img_np, output_type=Output.DICT, config=config.OCR_TESSERACT_CONFIG)
+
+
+def resolve_engine(engine=None):
+    """The engine config.OCR_ENGINE (or `engine`) stands for in this process."""
+    engine = engine or config.OCR_ENGINE
+    if engine == "auto":
+        return "tesserocr" if _tesserocr_available() else "pipe"
+    if engine not in ("tesserocr", "pipe", "pytesseract"):
+        raise ValueError(f"Unknown OCR_ENGINE {engine!r}")
+    return engine
+
+
+def tsv_to_dict(tsv):
+    """
+    Parses Tesseract TSV (with or without its header row) into the DICT output,
+    with the same value types as pytesseract: ints for the numeric columns
+    (conf included), strings for the text.
+    """
+    data = {key: [] for key in TSV_COLUMNS}
+    text_idx = len(TSV_COLUMNS) - 1
+    for row in tsv.split("\n"):
+        if not row or row.startswith("level\t"):
+            continue
+        cells = row.split("\t", text_idx)
+        if len(cells) < text_idx:
+            continue
+        if len(cells) == text_idx:
+            cells.append("")  # Rows without text may lose their last cell
+        for key, cell in zip(TSV_COLUMNS[:text_idx], cells):
+            try:
+                data[key].append(int(float(cell)))
+            except ValueError:
+                data[key].append(cell)
+        data['text'].append(cells[text_idx].rstrip("\r"))
+    return data
+
+
+def parse_tesseract_config(tesseract_config=None):
+    """
+    Splits a tesseract command-line config (config.OCR_TESSERACT_CONFIG) into
+    (lang, oem, psm, variables) for the C API. Options the C API has no
+    counterpart for are logged and ignored.
+    """
+    args = shlex.split(tesseract_config if tesseract_config is not None else config.OCR_TESSERACT_CONFIG)
+    lang, oem, psm, variables = "eng", None, None, {}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        value = args[i + 1] if i + 1 < len(args) else None
+        if arg == "-l" and value is not None:
+            lang = value
+        elif arg == "--oem" and value is not None:
+            oem = int(value)
+        elif arg == "--psm" and value is not None:
+            psm = int(value)
+        elif arg == "--dpi" and value is not None:
+            variables["user_defined_dpi"] = value
+        elif arg == "-c" and value is not None and "=" in value:
+            name, _, var_value = value.partition("=")
+            variables[name] = var_value
+        else:
+            logger.warning(f"Tesseract option {arg!r} is not supported by the tesserocr engine; ignoring it")
+            i += 1
+            continue
+        i += 2
+    return lang, oem, psm, variables
+
+
+def _as_uint8_image(img_np):
+    """The image as a C-contiguous uint8 array of shape (h, w) or (h, w, 3)."""
+    img_np = np.asarray(img_np)
+    if img_np.ndim == 3 and img_np.shape[2] == 4:
+        img_np = img_np[:, :, :3]  # Alpha is not used by Tesseract
+    elif img_np.ndim == 3 and img_np.shape[2] == 1:
+        img_np = img_np[:, :, 0]
+    if img_np.ndim not in (2, 3) or (img_np.ndim == 3 and img_np.shape[2] != 3):
+        raise ValueError(f"Unsupported image shape {img_np.shape}")
+    return np.ascontiguousarray(img_np, dtype=np.uint8)
+
+
+# ==============================================================================
+# IN-PROCESS ENGINE (TESSEROCR)
+# ==============================================================================
+# Idle PyTessBaseAPI instances of this process. A thread takes one for each
+# image; the tiles of a page run in threads, and one instance is not thread-safe.
+_idle_apis = []
+_apis_lock = threading.Lock()
+_tesserocr = None
+
+
+def _tesserocr_available():
+    global _tesserocr
+    if _tesserocr is None:
+        try:
+            import tesserocr
+            _tesserocr = tesserocr
+        except ImportError:
+            _tesserocr = False
+    return _tesserocr is not False
+
+
+def _create_api():
+    if not _tesserocr_available():
+        raise RuntimeError("OCR_ENGINE is 'tesserocr' but tesserocr is not installed")
+    lang, oem, psm, variables = parse_tesseract_config()
+
+    kwargs = {"lang": lang}
+    if oem is not None:
+        kwargs["oem"] = oem  # tesserocr.OEM / tesserocr.PSM values are these plain ints
+    if psm is not None:
+        kwargs["psm"] = psm
+    # Bundled tessdata (startup.py); otherwise tesserocr's compiled-in default
+    tessdata = os.environ.get("TESSDATA_PREFIX")
+    if tessdata:
+        kwargs["path"] = tessdata
+
+    api = _tesserocr.PyTessBaseAPI(**kwargs)
+    for name, value in variables.items():
+        if not api.SetVariable(name, value):
+            logger.warning(f"Tesseract variable {name!r} was not accepted")
+    logger.info(f"Loaded Tesseract ({lang}) in-process")
+    return api
+
+
+def _image_to_data_tesserocr(img_np):
+    img_np = _as_uint8_image(img_np)
+    with _apis_lock:
+        api = _idle_apis.pop() if _idle_apis else None
+    if api is None:
+        api = _create_api()
+
+    try:
+        height, width = img_np.shape[:2]
+        bytes_per_pixel = 1 if img_np.ndim == 2 else 3
+        api.SetImageBytes(img_np.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+        api.Recognize()
+        tsv = api.GetTSVText(0)
+        api.Clear()
+    except Exception:
+        api.End()
+        raise
+    with _apis_lock:
+        _idle_apis.append(api)
+    return tsv_to_dict(tsv)
+
+
+# ==============================================================================
+# SUBPROCESS ENGINE (PNM OVER STDIN, TSV OVER STDOUT)
+# ==============================================================================
+def _image_to_data_pipe(img_np):
+    img_np = _as_uint8_image(img_np)
+    height, width = img_np.shape[:2]
+    # Binary PGM (gray) / PPM (RGB): a short header and the raw pixels, which Leptonica reads without decoding
+    header = f"{'P5' if img_np.ndim == 2 else 'P6'}\n{width} {height}\n255\n".encode("ascii")
+
+    # The executable configured by startup.py (bundled or system)
+    cmd = [pytesseract.pytesseract.tesseract_cmd, "stdin", "stdout",
+           *shlex.split(config.OCR_TESSERACT_CONFIG), "tsv"]
+    result = subprocess.run(
+        cmd, input=header + img_np.tobytes(), capture_output=True,
+        creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)  # No console window on Windows
+    )
+    if result.returncode != 0:
+        raise pytesseract.TesseractError(result.returncode, result.stderr.decode("utf-8", "replace").strip())
+    return tsv_to_dict(result.stdout.decode("utf-8"))
@@ -0,0 +1,267 @@
+# ==============================================================================
+# TILED OCR FOR LARGE-FORMAT SHEETS
+# ==============================================================================
+'''
+At 300 DPI an A0/A1 sheet is a 10k x 14k pixel image; sparse-text OCR on the
+whole image is slow and memory heavy. This module splits a page image into
+overlapping tiles, OCRs the tiles concurrently and merges the results back into
+one page-level Tesseract output in page pixel coordinates.
+
+A line that falls in the overlap band between two tiles is read by both tiles;
+the copy that sits deeper inside its tile (and is therefore not cut by the
+tile edge) is kept, and the words only the other tile has read (a long label
+crossing the seam) are added to it, so the label stays one line.
+'''
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from core import config
+from utils.ocr_engine import image_to_data
+
+logger = logging.getLogger(__name__)
+
+# Keys of the pytesseract DICT output
+DATA_KEYS = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+             'left', 'top', 'width', 'height', 'conf', 'text')
+
+# Block numbers of region r are offset by (r + 1) * BLOCK_STRIDE so that lines
+# from different regions never share a (block, par, line) key
+BLOCK_STRIDE = 100000
+
+# Two words are the same word if this share of the smaller box is covered by the other
+DUPLICATE_OVERLAP_RATIO = 0.5
+
+
+def should_tile(img_np):
+    """Decides from config.OCR_TILING whether this page image should be tiled."""
+    if config.OCR_TILING == "on":
+        return True
+    if config.OCR_TILING == "auto":
+        return max(img_np.shape[:2]) > config.OCR_TILE_SIZE
+    return False
+
+
+def compute_tiles(height, width, tile_size, overlap):
+    """
+    Returns the tiles covering a (height x width) image as (x0, y0, x1, y1)
+    pixel boxes. Tiles are at most tile_size pixels, spread evenly over the
+    image, and neighbouring tiles overlap by `overlap` pixels (a pixel or two
+    more from rounding), never by the remainder of the image.
+    """
+    xs = _tile_spans(width, tile_size, overlap)
+    ys = _tile_spans(height, tile_size, overlap)
+    return [(x0, y0, x1, y1) for y0, y1 in ys for x0, x1 in xs]
+
+
+def ocr_image_tiled(img_np, tile_size=None, overlap=None, workers=None):
+    """
+    OCRs a page image tile by tile and returns a single pytesseract-style DICT
+    for the whole page, in page pixel coordinates.
+    """
+    tile_size = tile_size or config.OCR_TILE_SIZE
+    overlap = config.OCR_TILE_OVERLAP if overlap is None else overlap
+    workers = workers or config.OCR_TILE_WORKERS
+
+    height, width = img_np.shape[:2]
+    tiles = compute_tiles(height, width, tile_size, overlap)
+    logger.info(f"OCR of a {width}x{height} page in {len(tiles)} tiles")
+
+    results = ocr_regions(img_np, tiles, workers)
+    return merge_region_data(tiles, results, (height, width))
+
+
+def ocr_regions(img_np, regions, workers):
+    """
+    OCRs the (x0, y0, x1, y1) regions of an image concurrently. A region that
+    fails is logged and treated as empty. Returns one DICT per region.
+    """
+    def _ocr_region(region):
+        x0, y0, x1, y1 = region
+        try:
+            return image_to_data(img_np[y0:y1, x0:x1])
+        except Exception:
+            logger.error(f"OCR failed for region {region}; skipping it", exc_info=True)
+            return {key: [] for key in DATA_KEYS}
+
+    if not regions:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(regions))) as executor:
+        return list(executor.map(_ocr_region, regions))
+
+
+def merge_region_data(regions, results, image_size):
+    """
+    Merges per-region OCR output into one DICT in page pixel coordinates.
+
+    Inputs:
+    - regions: the (x0, y0, x1, y1) boxes that were OCR'd
+    - results: the DICT returned for each region
+    - image_size: (height, width) of the page image
+    """
+    lines = []
+
+    for region_idx, (region, data) in enumerate(zip(regions, results)):
+        x0, y0 = region[:2]
+        # The regions this one overlaps: a line inside one of them may have been read twice
+        neighbours = [other for other_idx, other in enumerate(regions)
+                      if other_idx != region_idx and _intersects(region, other)]
+
+        region_lines = {}
+        for k in range(len(data['text'])):
+            if not str(data['text'][k]).strip():
+                continue
+            left = data['left'][k] + x0
+            top = data['top'][k] + y0
+            bbox = (left, top, left + data['width'][k], top + data['height'][k])
+            line_key = (data['block_num'][k], data['par_num'][k], data['line_num'][k])
+            line = region_lines.setdefault(line_key, {"region": region_idx, "words": []})
+            line["words"].append({
+                "region": region_idx,
+                "index": k,
+                "bbox": bbox,
+                "margin": _edge_margin(bbox, region, image_size),
+            })
+
+        for line in region_lines.values():
+            line["anchor"] = line["words"][0]
+            bbox = _union_bbox(word["bbox"] for word in line["words"])
+            line["margin"] = _edge_margin(bbox, region, image_size)
+            line["shared"] = any(_intersects(bbox, other) for other in neighbours)
+            lines.append(line)
+
+    dropped_words = _merge_overlap_duplicates(lines)
+
+    merged = {key: [] for key in DATA_KEYS}
+    for line in lines:
+        if line.get("merged_into") is not None or not line["words"]:
+            continue
+        # Every word gets the (block, par, line) key of the line's own first word, so
+        # words taken over from another region's copy stay on the same line
+        first = line["anchor"]
+        first_data = results[first["region"]]
+        block_num = (first["region"] + 1) * BLOCK_STRIDE + first_data['block_num'][first["index"]]
+        for word in line["words"]:
+            data = results[word["region"]]
+            k = word["index"]
+            for key in DATA_KEYS:
+                merged[key].append(data[key][k])
+            merged['block_num'][-1] = block_num
+            merged['par_num'][-1] = first_data['par_num'][first["index"]]
+            merged['line_num'][-1] = first_data['line_num'][first["index"]]
+            merged['left'][-1] = word["bbox"][0]
+            merged['top'][-1] = word["bbox"][1]
+
+    if dropped_words:
+        logger.info(f"Dropped {dropped_words} duplicate words from region overlaps")
+    return merged
+
+
+def _merge_overlap_duplicates(lines):
+    """
+    Merges the copies of a line that was read by several regions into one line,
+    in place, and returns the number of duplicate words dropped.
+
+    Only lines that lie (partly) inside another region can have a copy, however
+    wide the overlap of the two regions is. Those are visited from the deepest
+    inside their region to the closest to an edge, so the line kept is the copy
+    its region contains fully (or most deeply). A later copy of it (one of its
+    words is read again by another region) is folded into the kept line: of
+    every word read twice, the copy deeper inside its region (not cut by the
+    edge) is kept, and the words only the later copy has read (the part of a
+    long label beyond the kept region's edge) join the kept line, so a label
+    crossing a tile seam comes out as one line.
+    """
+    candidates = [line for line in lines if line["shared"]]
+    candidates.sort(key=lambda line: -line["margin"])
+
+    kept = []
+    dropped = 0
+    for line in candidates:
+        copies = [other for other in kept if other["region"] != line["region"] and _shares_a_word(other, line)]
+        if not copies:
+            kept.append(line)
+            continue
+
+        target = copies[0]
+        reading_order = (list(target["words"]), list(line["words"]))
+        for word in line["words"]:
+            same = [(copy, other) for copy in copies for other in copy["words"] if _is_same_word(word, other)]
+            if same and word["margin"] <= max(other["margin"] for _, other in same):
+                dropped += 1
+                continue
+            for copy, other in same:
+                copy["words"].remove(other)
+            dropped += len(same)
+            target["words"].append(word)
+        target["words"] = _in_reading_order(target["words"], *reading_order)
+        line["merged_into"] = target
+    return dropped
+
+
+def _shares_a_word(line_a, line_b):
+    return any(_is_same_word(word_a, word_b) for word_a in line_a["words"] for word_b in line_b["words"])
+
+
+def _is_same_word(word_a, word_b):
+    return _overlap_ratio(word_a["bbox"], word_b["bbox"]) >= DUPLICATE_OVERLAP_RATIO
+
+
+def _in_reading_order(words, *copies):
+    """
+    Sorts the words of a merged line along x, in the direction the OCR output
+    lists them in (left to right, or right to left for Hebrew lines), taken
+    from the first copy with more than one word.
+    """
+    right_to_left = False
+    for copy in copies:
+        if len(copy) > 1:
+            right_to_left = copy[-1]["bbox"][0] < copy[0]["bbox"][0]
+            break
+    return sorted(words, key=lambda word: word["bbox"][0], reverse=right_to_left)
+
+
+def _edge_margin(bbox, region, image_size):
+    """Distance of a box to the nearest edge of its region that is not an image edge."""
+    height, width = image_size
+    x0, y0, x1, y1 = region
+    margin = float("inf")
+    if x0 > 0: margin = min(margin, bbox[0] - x0)
+    if y0 > 0: margin = min(margin, bbox[1] - y0)
+    if x1 < width: margin = min(margin, x1 - bbox[2])
+    if y1 < height: margin = min(margin, y1 - bbox[3])
+    return margin
+
+
+def _union_bbox(bboxes):
+    x0s, y0s, x1s, y1s = zip(*bboxes)
+    return min(x0s), min(y0s), max(x1s), max(y1s)
+
+
+def _overlap_ratio(bbox_a, bbox_b):
+    """Intersection area divided by the area of the smaller box."""
+    ix = min(bbox_a[2], bbox_b[2]) - max(bbox_a[0], bbox_b[0])
+    iy = min(bbox_a[3], bbox_b[3]) - max(bbox_a[1], bbox_b[1])
+    if ix <= 0 or iy <= 0:
+        return 0.0
+    area_a = (bbox_a[2] - bbox_a[0]) * (bbox_a[3] - bbox_a[1])
+    area_b = (bbox_b[2] - bbox_b[0]) * (bbox_b[3] - bbox_b[1])
+    smaller = min(area_a, area_b)
+    return (ix * iy) / smaller if smaller > 0 else 0.0
+
+
+def _intersects(bbox_a, bbox_b):
+    return bbox_a[0] < bbox_b[2] and bbox_b[0] < bbox_a[2] and bbox_a[1] < bbox_b[3] and bbox_b[1] < bbox_a[3]
+
+
+def _tile_spans(length, tile_size, overlap):
+    """
+    (start, end) of the tiles along one axis: the fewest tiles of at most
+    tile_size that cover `length` with `overlap` between neighbours, all of
+    the same size and evenly spaced.
+    """
+    if length <= tile_size:
+        return [(0, length)]
+    count = math.ceil((length - overlap) / max(1, tile_size - overlap))
+    size = min(tile_size, math.ceil((length + (count - 1) * overlap) / count))
+    return [(start, start + size) for start in (round(i * (length - size) / (count - 1)) for i in range(count))]
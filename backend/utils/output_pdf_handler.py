@@ -3,130 +3,222 @@
 # ==============================================================================
 
 
-import fitz
-from utils.legends_util import refine_abbreviation
-
-
-def get_optimal_fontsize(rect, text, fontname="helv", max_fontsize=12, line_height_factor=1.2):
-    """
-    Calculates the optimal font size to fit text within a rectangle,
-    considering BOTH width and height.
-    """
-    # 1. Calculate optimal size based on width (same as before)
-    width_optimal_size = max_fontsize
-    text_len_at_size_1 = fitz.get_text_length(text, fontname=fontname, fontsize=1)
-    if text_len_at_size_1 > 0:
-        width_optimal_size = rect.width / text_len_at_size_1
-
-    # 2. Calculate optimal size based on height
-    # The rendered height of a line of text is roughly fontsize * 1.2
-    height_optimal_size = rect.height / line_height_factor
-
-    # 3. The true optimal size is the SMALLER of the two constraints
-    optimal_size = min(width_optimal_size, height_optimal_size)
-
-    # 4. Return the final size, capped by the maximum allowed font size
-    return min(int(optimal_size), max_fontsize)
-
-
+import os
 
+import fitz
+from core import config, metrics
+from utils.legends_util import AbbreviationRegistry, legend_column_width, LegendCache
+from utils.text_fitting import fit_text, line_origins
 
 
-def prepare_display_data(translated_data):
+def prepare_display_data(translated_data, abbreviations=None, legend_terms=None):
     """
     Enrich translated items by deciding whether to display full text or an abbreviation,
     and collect legend terms for any abbreviated entries.
 
     Input: translated_data (list of dicts from translate_hebrew_to_english)
+    Optional: abbreviations (the job's AbbreviationRegistry) and a legend_terms
+    dict to carry on from an earlier call, so every page and file of a job gets
+    one consistent set of codes.
     Output: (enriched_translated_data, legend_terms)
-    - enriched_translated_data: list with additional 'display_text' per item
+    - enriched_translated_data: list with additional 'display_text' per item, whether
+      it is an 'abbreviated' code, and the 'fontsize' / wrapped 'lines' it is
+      rendered with (fontsize None: does not fit)
     - legend_terms: dict mapping {code: full term}
     """
-    legend_terms = {}
-    used_codes = {}
+    legend_terms = {} if legend_terms is None else legend_terms
+    abbreviations = AbbreviationRegistry() if abbreviations is None else abbreviations
     enriched = []
 
     for item in translated_data:
         english = (item.get("english_translation") or "").strip()
         display_text = english
-        # Simple heuristic: abbreviate if longer than 4 words
 
+        # Labels that only fit below the threshold size are abbreviated instead
         original_bbox = fitz.Rect(item["bbox"])
-        max_fontsize_possible = get_optimal_fontsize(original_bbox, display_text)
+        fontsize, lines = fit_text(display_text, original_bbox)
 
-        if max_fontsize_possible < 4:
-            code = refine_abbreviation(english, used_codes)
+        if display_text and (fontsize is None or fontsize < config.ABBREVIATION_FONTSIZE_THRESHOLD):
+            code = abbreviations.code_for(english)
             display_text = code
             legend_terms[code] = english
-        enriched.append({**item, "display_text": display_text})
+            fontsize, lines = fit_text(display_text, original_bbox)
+        enriched.append({
+            **item, "display_text": display_text, "fontsize": fontsize, "lines": lines,
+            "abbreviated": display_text != english,
+        })
 
     return enriched, legend_terms
 
-def create_translated_doc_in_memory(doc, enriched_translated_data):
+def page_legend_terms(page_items):
+    """{code: term} of the abbreviations used on one page, sorted by code."""
+    terms = {item["display_text"]: item["english_translation"].strip() for item in page_items if item.get("abbreviated")}
+    return dict(sorted(terms.items()))
+
+
+def group_items_by_page(enriched_translated_data):
+    """Groups items by their page in one pass: {page_num: [items]}."""
+    pages = {}
+    for item in enriched_translated_data:
+        pages.setdefault(item["page"], []).append(item)
+    return pages
+
+
+def create_translated_pdf(doc, enriched_translated_data, output_path):
     """
-    Build a translated PDF (vector-first) in memory. Instead of writing to disk, return the fitz.Document.
-    Uses 'display_text' for overlayed content (may be full term or abbreviation).
+    Builds the translated PDF of a whole document (vector-first) at output_path,
+    page by page through an OutputPdfWriter. Uses 'display_text' for
+    overlayed content (may be full term or abbreviation).
     """
-    output_doc = fitz.open()
-    for page_num in range(doc.page_count):
+    items_by_page = group_items_by_page(enriched_translated_data)
+    writer = OutputPdfWriter(output_path)
+    try:
+        for page_num in range(doc.page_count):
+            writer.add_page(doc, page_num, items_by_page.get(page_num, []))
+        return writer.close()
+    except Exception:
+        writer.discard()
+        raise
+
+
+def render_translated_page(output_doc, doc, page_num, page_items):
+    """
+    Appends page `page_num` of `doc` to output_doc with the translated labels of
+    that page (enriched items) drawn over the original text. Every label is
+    written once, at the size and line breaks computed by prepare_display_data,
+    and all of them go into one content stream of the page.
+    """
+    with metrics.stage("render", page=page_num) as timing:
+        timing["lines"] = len(page_items)
         page = doc[page_num]
         output_page = output_doc.new_page(width=page.rect.width, height=page.rect.height)
         output_page.show_pdf_page(page.rect, doc, page_num)
-        for item in enriched_translated_data:
-            if item["page"] == page_num:
-                original_bbox = fitz.Rect(item["bbox"])
-                display_text = item.get("display_text", item.get("english_translation", ""))
-                if display_text:
-        
-                    best_fsize = get_optimal_fontsize(original_bbox, display_text)
 
-                    leftover = -1
-                    font_size = best_fsize
+        shape = output_page.new_shape()
+        for item in page_items:
+            original_bbox = fitz.Rect(item["bbox"])
+            display_text = item.get("display_text", item.get("english_translation", ""))
+            if not display_text:
+                continue
 
-                    while leftover<0 and font_size >= 2:
+            # White box over the original text
+            shape.draw_rect(original_bbox)
 
-                        # Draw the rectangle
-                        output_page.draw_rect(original_bbox, color=(1, 1, 1), fill=(1, 1, 1), overlay=True, )
+            if "fontsize" in item:
+                fontsize, lines = item["fontsize"], item["lines"]
+            else:
+                fontsize, lines = fit_text(display_text, original_bbox)
+            if fontsize is None:
+                continue  # Does not fit even at the smallest size
 
-                        # Insert the text
-                        leftover = output_page.insert_textbox(
-                            original_bbox, display_text, fontsize=font_size, fontname="helv",
-                            color=(0, 0, 0), align=fitz.TEXT_ALIGN_RIGHT, overlay=True
-                        )
+            for origin, line in zip(line_origins(original_bbox, fontsize, lines), lines):
+                shape.insert_text(origin, line, fontsize=fontsize, fontname=config.OUTPUT_FONT_NAME, color=(0, 0, 0))
 
-                        font_size -= 1
+        # Boxes are drawn before all the text, so a box never covers a neighbouring label
+        shape.finish(color=(1, 1, 1), fill=(1, 1, 1))
+        shape.commit(overlay=True)
 
-                    # print(f"display_text:{display_text}, leftover: {leftover}")
-                    
-    return output_doc
+    return output_page
 
 
-def assemble_final_pdf(translated_doc, legend_doc, output_path):
+# ==============================================================================
+# FINAL OUTPUT DOCUMENT, WRITTEN TO DISK AS IT GROWS
+# ==============================================================================
+class OutputPdfWriter:
     """
-    Assemble each translated page with a corresponding legend page on the right
-    into a new, wider final PDF, and save to output_path.
+    The final output PDF of one file, at `path`. Every translated page is
+    stamped straight into it (the source page plus its labels, in one step).
+
+    The document stays open while it grows, so resources shared by several
+    pages (fonts, images, the legend XObjects) are embedded once. Only when
+    config.OUTPUT_FLUSH_MB of new content has piled up is it saved
+    incrementally and reopened, which drops the pages already written from
+    memory: peak memory stays flat for large scanned sets, and a shared
+    resource is embedded again at most once per flush. Every page is
+    serialized once, either by a flush or by close().
+
+    Every sheet gets its own legend panel on the right, listing only the codes
+    used on that sheet (see legends_util.LegendCache); a legend too long for one
+    panel continues on legend pages right after the sheet.
     """
-    final_doc = fitz.open()
-
-    # Assume single-page legend reused for each page; size defines legend panel width
-    legend_page = legend_doc[0] if legend_doc and legend_doc.page_count > 0 else None
-
-    for i in range(translated_doc.page_count):
-        t_page = translated_doc[i]
-        t_rect = t_page.rect
-        l_rect = legend_page.rect if legend_page else fitz.Rect(0, 0, 0, t_rect.height)
-        new_width = t_rect.width + l_rect.width
-        new_height = max(t_rect.height, l_rect.height)
-        new_page = final_doc.new_page(width=new_width, height=new_height)
-
-        # Stamp translated page at left
-        new_page.show_pdf_page(fitz.Rect(0, 0, t_rect.width, t_rect.height), translated_doc, i)
-
-        # Stamp legend page at right (if exists)
-        if legend_page:
-            new_page.show_pdf_page(
-                fitz.Rect(t_rect.width, 0, t_rect.width + l_rect.width, l_rect.height), legend_doc, 0
-            )
-
-    final_doc.save(output_path)
-    final_doc.close()
+
+    def __init__(self, path, flush_mb=None):
+        self.path = path
+        self.flush_bytes = (flush_mb or config.OUTPUT_FLUSH_MB) * 1024 * 1024
+        self.doc = fitz.open()
+        self.page_count = 0
+        self._legends = LegendCache()
+        self._on_disk = False
+        self._unflushed = 0
+        self._unflushed_bytes = 0
+        self._xref_count = self.doc.xref_length()
+
+    def add_page(self, source_doc, page_num, page_items):
+        """
+        Renders page `page_num` of source_doc with its translated labels (and
+        the legend of its abbreviations) as the next output page.
+        """
+        output_page = render_translated_page(self.doc, source_doc, page_num, page_items)
+        self.page_count += 1
+
+        legend_terms = page_legend_terms(page_items)
+        if legend_terms:
+            with metrics.stage("legend", page=page_num) as timing:
+                timing["lines"] = len(legend_terms)
+                self._add_legend(output_page, legend_terms)
+        self._page_written()
+
+    def close(self):
+        """Writes the remaining pages and returns the path of the PDF."""
+        self._flush(reopen=False)
+        self._legends.close()
+        return self.path
+
+    def discard(self):
+        """Drops a partial output (failed file)."""
+        if not self.doc.is_closed:
+            self.doc.close()
+        self._legends.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _add_legend(self, output_page, legend_terms):
+        """Widens the sheet by its legend panel and stamps the legend; overflow goes on extra pages."""
+        rect = output_page.rect
+        legend_doc, legend_pages = self._legends.pages_for(legend_terms, rect.height, legend_column_width(rect.width))
+
+        panel = legend_doc[legend_pages[0]].rect
+        output_page.set_mediabox(fitz.Rect(0, 0, rect.width + panel.width, rect.height))
+        output_page.show_pdf_page(fitz.Rect(rect.width, 0, rect.width + panel.width, rect.height), legend_doc, legend_pages[0])
+
+        for legend_page in legend_pages[1:]:
+            panel = legend_doc[legend_page].rect
+            continuation = self.doc.new_page(width=panel.width, height=panel.height)
+            continuation.show_pdf_page(panel, legend_doc, legend_page)
+            self.page_count += 1
+
+    def _page_written(self):
+        """Adds up the streams stamped since the last page, and flushes once they exceed the budget."""
+        self._unflushed += 1
+        xref_count = self.doc.xref_length()
+        for xref in range(self._xref_count, xref_count):
+            kind, length = self.doc.xref_get_key(xref, "Length")
+            if kind == "int":
+                self._unflushed_bytes += int(length)
+        self._xref_count = xref_count
+        if self._unflushed_bytes >= self.flush_bytes:
+            self._flush(reopen=True)
+
+    def _flush(self, reopen):
+        if self._on_disk:
+            if self._unflushed:
+                self.doc.saveIncr()
+        else:
+            self.doc.save(self.path)
+            self._on_disk = True
+        self.doc.close()
+        self._unflushed = 0
+        self._unflushed_bytes = 0
+        if reopen:
+            self.doc = fitz.open(self.path)
+            self._xref_count = self.doc.xref_length()
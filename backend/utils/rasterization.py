@@ -0,0 +1,83 @@
+# ==============================================================================
+# PAGE RASTERIZATION FUNCTIONS
+# ==============================================================================
+'''
+Renders PDF pages to images for OCR one page at a time. Rendering the whole
+document up front (pdf2image.convert_from_path without a page range) keeps
+every page image in memory at once, which does not fit for large A0 sets at
+300 DPI. The generator below holds at most one page image at a time.
+'''
+import logging
+import fitz
+import numpy as np
+from pdf2image import convert_from_path
+
+from startup import POPPLER_PATH
+from core import config
+
+logger = logging.getLogger(__name__)
+
+
+def get_page_count(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def render_page_image(pdf_path, page_num, dpi=None, backend=None, doc=None):
+    """
+    Renders a single page (0-indexed) to an RGB numpy array of shape (h, w, 3).
+
+    Inputs:
+    - dpi: render resolution, defaults to config.OCR_DPI
+    - backend: "pymupdf" or "poppler", defaults to config.RASTER_BACKEND
+    - doc: an already open fitz.Document for pdf_path, to avoid reopening it
+    """
+    dpi = dpi or config.OCR_DPI
+    backend = backend or config.RASTER_BACKEND
+
+    if backend == "poppler":
+        # pdf2image pages are 1-indexed; render exactly one page
+        images = convert_from_path(
+            pdf_path, dpi=dpi, first_page=page_num + 1, last_page=page_num + 1, poppler_path=POPPLER_PATH
+        )
+        img_np = np.array(images[0])
+        images[0].close()
+        return img_np
+
+    if doc is None:
+        with fitz.open(pdf_path) as own_doc:
+            return _render_with_pymupdf(own_doc, page_num, dpi)
+    return _render_with_pymupdf(doc, page_num, dpi)
+
+
+def iter_page_images(pdf_path, dpi=None, page_numbers=None, backend=None):
+    """
+    Generator yielding (page_num, image) for the requested pages (all pages by
+    default), rendering each page only when it is requested. A page that fails
+    to render is logged and skipped.
+
+    The caller should drop its reference to the image once OCR for that page
+    is done, so only one page image is ever alive.
+    """
+    with fitz.open(pdf_path) as doc:
+        if page_numbers is None:
+            page_numbers = range(doc.page_count)
+
+        for page_num in page_numbers:
+            try:
+                img_np = render_page_image(pdf_path, page_num, dpi=dpi, backend=backend, doc=doc)
+            except Exception:
+                logger.error(f"Failed to render page number {page_num} of {pdf_path}; skipping it", exc_info=True)
+                continue
+
+            yield page_num, img_np
+
+            # Release this page before the next one is rendered
+            del img_np
+
+
+def _render_with_pymupdf(doc, page_num, dpi):
+    pix = doc[page_num].get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+    img_np = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    del pix
+    return img_np
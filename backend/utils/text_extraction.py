@@ -2,18 +2,22 @@
 # TEXT EXTRACTION FUNCTIONS
 # ==============================================================================
 
-from startup import POPPLER_PATH
 import re
 import os
-import pdfplumber
 import io
 import logging
-from pdf2image import convert_from_path
+import fitz
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from PIL import ImageFont, ImageDraw
-import pytesseract
-from pytesseract import Output
 import numpy as np
-import cv2
+
+from core import config, metrics
+from utils.rasterization import render_page_image, get_page_count
+from utils.ocr_engine import image_to_data
+from utils.ocr_tiling import should_tile, ocr_image_tiled
 
 logger = logging.getLogger(__name__)
 
@@ -23,27 +27,135 @@ logger = logging.getLogger(__name__)
 # FUNCTION TO EXTRACT ALL VECTOR TEXT FROM THE DOC
 # ==============================================================================
 '''
-The extract_text_with_location function has been kept separate from the OCR function even though it does nothing other than simply just call the OCR function and pass on its output ahead, is to allow easy support into integrating methods other than OCR for text extraction, which could be integrated here and the final output created from the combination of them.
+The extract_text_with_location function combines the text extraction methods. Every page is first read from its
+embedded (vector) text layer, which is exact and takes milliseconds; only the pages without usable Hebrew vector text
+are rasterized and sent to OCR.
 '''
-def extract_text_with_location(doc):
+def extract_text_with_location(doc, page_paths=None):
+    """
+    Extracts all text lines of the PDF at path `doc` as {"text", "bbox", "page"} dicts.
+
+    If a dict is passed as page_paths, it is filled with {page_num: "vector" | "ocr"}
+    telling which extraction path was taken for every page.
+    """
 
     # print("inside extract_text_with_location function...")
 
-    extracted_text_with_location = _process_hebrew_lines_ocr(doc)
+    extracted_text_with_location = []
+    for _, page_lines in iter_text_with_location(doc, page_paths=page_paths):
+        extracted_text_with_location.extend(page_lines)
 
-    logger.info("OCR process is complete; Moving ahead...")
+    return extracted_text_with_location
 
-    # for page_num in range(doc.page_count):
-    #     page = doc[page_num]
-    #     words = page.get_text("blocks")
-    #     for word in words:
-    #         extracted_text_with_location.append({
-    #             "text": word[4],
-    #             "bbox": (word[0]-2, word[1]-2, word[2]+2, word[3]+2),
-    #             "page": page_num
-    #         })
 
-    return extracted_text_with_location
+def iter_text_with_location(doc, page_paths=None):
+    """
+    Generator yielding (page_num, lines) for every page of the PDF at path `doc`,
+    in page order, as soon as each page's text is available. This lets the
+    translation stage start on page N while later pages are still being OCR'd.
+
+    page_paths is filled as in extract_text_with_location before the first page is yielded.
+    """
+    if page_paths is None:
+        page_paths = {}
+
+    if config.VECTOR_TEXT_ENABLED:
+        with metrics.stage("vector_text") as timing:
+            vector_lines_by_page, ocr_pages = _extract_vector_hebrew_lines(doc)
+            timing["lines"] = sum(len(lines) for lines in vector_lines_by_page.values())
+    else:
+        vector_lines_by_page, ocr_pages = {}, list(range(get_page_count(doc)))
+
+    for page_num in vector_lines_by_page:
+        page_paths[page_num] = "vector"
+    for page_num in ocr_pages:
+        page_paths[page_num] = "ocr"
+
+    logger.info(
+        f"Text extraction paths for {os.path.basename(doc)}: "
+        + ", ".join(f"page {page_num + 1}: {path}" for page_num, path in sorted(page_paths.items()))
+    )
+
+    # OCR of the remaining pages starts right away (in the pool) and is consumed in page order
+    ocr_results = _iter_ocr_pages(doc, ocr_pages)
+    try:
+        for page_num in sorted(page_paths):
+            if page_num in vector_lines_by_page:
+                yield page_num, vector_lines_by_page[page_num]
+            else:
+                yield next(ocr_results)
+    finally:
+        ocr_results.close()
+
+    if ocr_pages:
+        logger.info("OCR process is complete; Moving ahead...")
+
+
+# ==============================================================================
+# FUNCTION TO EXTRACT THE EMBEDDED (VECTOR) TEXT LAYER
+# ==============================================================================
+def _extract_vector_hebrew_lines(pdf_path):
+    """
+    Reads the text layer of every page with PyMuPDF and groups words into lines.
+
+    Output: (vector_lines_by_page, ocr_pages)
+    - vector_lines_by_page: {page_num: line dicts} for the pages that have usable Hebrew vector text
+    - ocr_pages: the page numbers that still need OCR
+    """
+    vector_lines_by_page = {}
+    ocr_pages = []
+
+    with fitz.open(pdf_path) as pdf:
+        for page_num in range(pdf.page_count):
+            try:
+                # (x0, y0, x1, y1, word, block_no, line_no, word_no)
+                words = pdf[page_num].get_text("words")
+            except Exception:
+                logger.error(f"Failed to read the text layer of page number {page_num}; using OCR", exc_info=True)
+                ocr_pages.append(page_num)
+                continue
+
+            if not _has_usable_hebrew(words):
+                ocr_pages.append(page_num)
+                continue
+
+            lines = {} # Key: (block_no, line_no) -> Value: {text, x_min, y_min, x_max, y_max}
+            for x0, y0, x1, y1, text, block_no, line_no, _ in words:
+                line_key = (block_no, line_no)
+                if line_key not in lines:
+                    lines[line_key] = {"text": [text], "x_min": x0, "y_min": y0, "x_max": x1, "y_max": y1}
+                else:
+                    line = lines[line_key]
+                    line["text"].append(text)
+                    line["x_min"] = min(line["x_min"], x0)
+                    line["y_min"] = min(line["y_min"], y0)
+                    line["x_max"] = max(line["x_max"], x1)
+                    line["y_max"] = max(line["y_max"], y1)
+
+            page_lines = vector_lines_by_page[page_num] = []
+            for ln in sorted(lines.values(), key=lambda v: (v['y_min'], v['x_min'])):
+                page_lines.append({
+                    "text": " ".join(ln["text"]),
+                    "bbox": (ln["x_min"], ln["y_min"], ln["x_max"], ln["y_max"]),
+                    "page": page_num
+                })
+
+    return vector_lines_by_page, ocr_pages
+
+
+def _has_usable_hebrew(words):
+    """
+    A page's text layer is usable when it has enough Hebrew characters and is not
+    mostly undecodable glyphs (fonts without a ToUnicode map come out as U+FFFD).
+    """
+    page_text = "".join(word[4] for word in words)
+    if not page_text:
+        return False
+
+    hebrew_count = len(re.findall(r'[\u0590-\u05FF]', page_text))
+    unknown_count = page_text.count("\ufffd")
+    return hebrew_count >= config.VECTOR_MIN_HEBREW_CHARS and unknown_count <= 0.1 * len(page_text)
+
 
 '''
 For Implementing OCR into the current work flow, follow the following tentative steps/points:
@@ -58,19 +170,29 @@ Q. Identify the issue that might arise with PDF coordinate system and image coor
 # FUNCTION TO EXTRACT TEXT USING OCR
 # ==============================================================================
 
-def _process_hebrew_lines_ocr(pdf_path):
+def _process_hebrew_lines_ocr(pdf_path, page_numbers=None):
     # logger.info(f"Processing: {pdf_path} inside the process_hebrew_lines function...")
 
+    if page_numbers is None:
+        page_numbers = range(get_page_count(pdf_path))
+
     extracted_text_with_location = []
+    for _, page_lines in _iter_ocr_pages(pdf_path, list(page_numbers)):
+        extracted_text_with_location.extend(page_lines)
 
-    # Configuration for Hebrew
-    custom_config = '--oem 3 --psm 11 -l heb+eng'
+    return extracted_text_with_location
 
-    try:
-        images = convert_from_path(pdf_path, dpi=300, poppler_path=POPPLER_PATH)
-    except Exception as e:
-        print(f"Error: {e}")
-        return
+
+def _iter_ocr_pages(pdf_path, page_numbers):
+    """
+    Generator yielding (page_num, lines) for each of the given pages, in order.
+    A page that fails to render or OCR yields an empty list of lines.
+
+    With config.OCR_WORKERS > 1 all pages are submitted to the process pool up
+    front and yielded as they complete in page order; otherwise pages are
+    rendered and OCR'd here one at a time, so peak memory is bounded by one page
+    image.
+    """
 
     # Load Hebrew Font (Fall back if missing)
     # try:
@@ -80,93 +202,215 @@ def _process_hebrew_lines_ocr(pdf_path):
     # except:
     #     font = ImageFont.load_default()
 
-    for page_num, page_image in enumerate(images):
-        logger.info(f"\n--- Page {page_num + 1} ---")
-        img_np = np.array(page_image)
+    remaining = list(page_numbers)
 
-        # 1. Get Raw Data
+    if config.OCR_WORKERS > 1 and remaining:
+        pool = _get_ocr_pool()
+        futures = [pool.submit(_ocr_page_worker, pdf_path, page_num, config.OCR_DPI) for page_num in remaining]
         try:
-            data = pytesseract.image_to_data(img_np, output_type=Output.DICT, config=custom_config)
-            # print(data["text"])
-        except Exception as e:
-            print(f"Failed to perform OCR on page number {page_num}; continuing to next page")
-            continue
-        '''
-        Output data format : 
-        {
-            'level':    [5, 5],
-            'page_num': [1, 1],
-            'block_num':[1, 1],
-            'par_num':  [1, 1],
-            'line_num': [1, 1],
-            'word_num': [1, 2],
-            'left':     [34, 120],
-            'top':      [50, 50],
-            'width':    [60, 80],
-            'height':   [20, 20],
-            'conf':     [96, 92],
-            'text':     ['Hello', 'World']
-        }
-        '''
-
-        # 2. Group Words into Lines
-        lines = {} # Key: (block_num, par_num, line_num) -> Value: {text, x, y, w, h}
-
-        n_boxes = len(data['text'])
-        for k in range(n_boxes):
-            # Filter low confidence noise
-            if int(data['conf'][k]) < 40: continue
-
-            text = data['text'][k].strip()
-            if not text: continue
-
-            # Create a unique key for this specific line on the page
-            # We group by Block, Paragraph, AND Line number
-            line_key = (data['block_num'][k], data['par_num'][k], data['line_num'][k])
-
-            x, y, w, h = (data['left'][k], data['top'][k], data['width'][k], data['height'][k])
-
-            if line_key not in lines:
-                # Start a new line entry
-                lines[line_key] = {
-                    "text": [text],
-                    "x_min": x,
-                    "y_min": y,
-                    "x_max": x + w,
-                    "y_max": y + h
-                }
-            else:
-                # Merge into existing line
-                lines[line_key]["text"].append(text)
-                # Expand the bounding box to include this new word
-                lines[line_key]["x_min"] = min(lines[line_key]["x_min"], x)
-                lines[line_key]["y_min"] = min(lines[line_key]["y_min"], y)
-                lines[line_key]["x_max"] = max(lines[line_key]["x_max"], x + w)
-                lines[line_key]["y_max"] = max(lines[line_key]["y_max"], y + h)
-
-
-        # 3. Convert grouped lines into the requested output format
-        # Sort lines top-to-bottom then left-to-right for stable ordering
-        sorted_lines = sorted(
-            lines.values(),
-            key=lambda v: (v['y_min'], v['x_min'])
-        )
-
-        # logger.info(f"Sorted lines data: {sorted_lines}")
-
-        scale = 72/300 # constant to scale pixel coordinates to pdf points
-
-        for ln in sorted_lines:
-            joined_text = " ".join(ln['text'])  # keep original word order
-            x1, y1, x2, y2 = ln['x_min']*scale, ln['y_min']*scale, ln['x_max']*scale, ln['y_max']*scale
-            extracted_text_with_location.append({
-                "text": joined_text,
-                "bbox": (x1, y1, x2, y2),
-                "page": page_num
-            })
+            for page_num, future in zip(list(remaining), futures):
+                try:
+                    page_lines, timings = future.result()
+                    metrics.replay(timings)
+                except BrokenProcessPool:
+                    logger.error("OCR worker pool crashed; falling back to in-process OCR", exc_info=True)
+                    shutdown_ocr_pool()
+                    break
+                except Exception:
+                    logger.error(f"Failed to OCR page number {page_num}; continuing to next page", exc_info=True)
+                    page_lines = []
+                logger.info(f"\n--- Page {page_num + 1} ---")
+                remaining.pop(0)
+                yield page_num, page_lines
+        finally:
+            # The consumer may stop early (e.g. on error); don't leave pages queued in the pool
+            for future in futures:
+                future.cancel()
+
+    with fitz.open(pdf_path) as pdf:
+        for page_num in remaining:
+            logger.info(f"\n--- Page {page_num + 1} ---")
+            try:
+                with metrics.stage("rasterize", page=page_num):
+                    img_np = render_page_image(pdf_path, page_num, dpi=config.OCR_DPI, doc=pdf)
+            except Exception:
+                logger.error(f"Failed to render page number {page_num} of {pdf_path}; skipping it", exc_info=True)
+                yield page_num, []
+                continue
+
+            with metrics.stage("ocr", page=page_num) as timing:
+                page_lines = _ocr_page_lines(img_np, page_num)
+                timing["lines"] = len(page_lines)
+            del img_np
+            yield page_num, page_lines
 
-    
-    return extracted_text_with_location
+
+# ==============================================================================
+# PROCESS POOL FOR PARALLEL PAGE OCR
+# ==============================================================================
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+
+def _get_ocr_pool():
+    """Returns the shared OCR process pool, creating it on first use."""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            # spawn: forking a process that already runs uvicorn/torch threads is unsafe
+            _ocr_pool = ProcessPoolExecutor(
+                max_workers=config.OCR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_ocr_worker,
+                initargs=(config.OCR_OMP_THREAD_LIMIT, _pool_tile_workers())
+            )
+            logger.info(f"Started OCR process pool with {config.OCR_WORKERS} workers")
+        return _ocr_pool
+
+
+def shutdown_ocr_pool():
+    """Stops the OCR worker processes; called on server shutdown."""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is not None:
+            _ocr_pool.shutdown(wait=False, cancel_futures=True)
+            _ocr_pool = None
+
+
+def _pool_tile_workers():
+    """
+    Tile threads per pool worker: the cores are shared among the OCR_WORKERS
+    processes, so pages x tiles never start more tesseract processes than there
+    are cores (OCR_TILE_WORKERS stays the upper bound).
+    """
+    return max(1, min(config.OCR_TILE_WORKERS, (os.cpu_count() or 1) // config.OCR_WORKERS))
+
+
+def _init_ocr_worker(omp_thread_limit, tile_workers):
+    # Inherited by every tesseract subprocess this worker starts
+    os.environ["OMP_THREAD_LIMIT"] = str(omp_thread_limit)
+    config.OCR_TILE_WORKERS = tile_workers
+
+
+def _ocr_page_worker(pdf_path, page_num, dpi):
+    """
+    Runs in a worker process: renders one page and returns its grouped lines and
+    the stage timings, which the server records with metrics.replay.
+    """
+    with metrics.collect() as timings:
+        with metrics.stage("rasterize", page=page_num):
+            img_np = render_page_image(pdf_path, page_num, dpi=dpi)
+        with metrics.stage("ocr", page=page_num) as timing:
+            page_lines = _ocr_page_lines(img_np, page_num, dpi=dpi)
+            timing["lines"] = len(page_lines)
+    return page_lines, timings
+
+
+def _ocr_page_lines(img_np, page_num, dpi=None):
+    """
+    Runs Tesseract on one rendered page and returns its text lines as
+    {"text", "bbox", "page"} dicts with the bbox in PDF points.
+    """
+    dpi = dpi or config.OCR_DPI
+
+    # 1. Get Raw Data (text regions only, or overlapping tiles for large sheets; always in page pixels)
+    try:
+        if config.OCR_MODE == "roi":
+            # Imported here: OpenCV is only needed in ROI mode
+            from utils.text_regions import ocr_text_regions
+            data = ocr_text_regions(img_np)
+        elif should_tile(img_np):
+            data = ocr_image_tiled(img_np)
+        else:
+            data = image_to_data(img_np)
+        # print(data["text"])
+    except Exception:
+        logger.error(f"Failed to perform OCR on page number {page_num}; continuing to next page", exc_info=True)
+        return []
+    '''
+    Output data format : 
+    {
+        'level':    [5, 5],
+        'page_num': [1, 1],
+        'block_num':[1, 1],
+        'par_num':  [1, 1],
+        'line_num': [1, 1],
+        'word_num': [1, 2],
+        'left':     [34, 120],
+        'top':      [50, 50],
+        'width':    [60, 80],
+        'height':   [20, 20],
+        'conf':     [96, 92],
+        'text':     ['Hello', 'World']
+    }
+    '''
+
+    # 2. Group words into lines and scale them to PDF points
+    return _group_words_into_lines(data, page_num, dpi)
+
+
+def _group_words_into_lines(data, page_num, dpi):
+    """
+    Groups the words of an image_to_data dict into text lines, on NumPy arrays:
+    - words below confidence 40 or without text are dropped
+    - words are grouped by their (block_num, par_num, line_num) key; a line's
+      text is its words in reading order and its bbox the min/max of theirs
+    - lines are sorted top-to-bottom then left-to-right (ties keep the order in
+      which the lines first appear) and scaled from pixels to PDF points
+    """
+    texts = [text.strip() for text in data['text']]
+    if not texts:
+        return []
+
+    # Filter low confidence noise and empty words
+    conf = np.asarray(data['conf'], dtype=np.float64)
+    keep = np.flatnonzero((conf >= 40) & np.fromiter((bool(text) for text in texts), dtype=bool, count=len(texts)))
+    if keep.size == 0:
+        return []
+
+    block = np.asarray(data['block_num'], dtype=np.int64)[keep]
+    par = np.asarray(data['par_num'], dtype=np.int64)[keep]
+    line = np.asarray(data['line_num'], dtype=np.int64)[keep]
+    left = np.asarray(data['left'], dtype=np.int64)[keep]
+    top = np.asarray(data['top'], dtype=np.int64)[keep]
+    right = left + np.asarray(data['width'], dtype=np.int64)[keep]
+    bottom = top + np.asarray(data['height'], dtype=np.int64)[keep]
+
+    # One integer per (block, par, line); the radixes come from the largest numbers on the page
+    line_radix = int(line.max()) + 1
+    par_radix = (int(par.max()) + 1) * line_radix
+    line_key = block * par_radix + par * line_radix + line
+
+    # first: position of the first word of every line, which also orders ties like the old dict did
+    _, first, inverse = np.unique(line_key, return_index=True, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")  # Words of a line stay in reading order
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(inverse[order])) + 1))
+
+    x_min = np.minimum.reduceat(left[order], starts)
+    y_min = np.minimum.reduceat(top[order], starts)
+    x_max = np.maximum.reduceat(right[order], starts)
+    y_max = np.maximum.reduceat(bottom[order], starts)
+
+    # Sort lines top-to-bottom then left-to-right for stable ordering
+    line_order = np.lexsort((first, x_min, y_min))
+
+    scale = 72/dpi # constant to scale pixel coordinates to pdf points
+    bboxes = (np.stack((x_min, y_min, x_max, y_max), axis=1) * scale).tolist()
+
+    # Words grouped line by line; only the text joins remain per line
+    grouped_texts = [texts[k] for k in keep[order].tolist()]
+    bounds = list(zip(starts.tolist(), np.append(starts[1:], order.size).tolist()))
+
+    page_lines = []
+    for idx in line_order.tolist():
+        start, end = bounds[idx]
+        page_lines.append({
+            "text": " ".join(grouped_texts[start:end]),  # keep original word order
+            "bbox": tuple(bboxes[idx]),
+            "page": page_num
+        })
+
+    return page_lines
 
 
 
@@ -197,6 +441,8 @@ def _is_likely_hebrew(text):
 # FUNCTION TO EXTRACT ALL TABLE CELL TEXT FROM THE PDF
 # ==============================================================================
 def extract_table_cells(pdf_bytes, x1, y1, x2, y2):
+    import pdfplumber
+
     extracted_cells = []
     
     # Open the PDF from bytes
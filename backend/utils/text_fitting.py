@@ -0,0 +1,135 @@
+# ==============================================================================
+# ANALYTIC TEXT FITTING FOR THE TRANSLATED LABELS
+# ==============================================================================
+'''
+Finds the largest font size at which a label fits its box, and the wrapped
+lines at that size, from the font metrics alone, without writing anything to a
+page. Rendering then writes every label exactly once.
+
+Widths come from fitz.get_text_length at font size 1, cached per font and
+character (the base-14 fonts have no kerning, so the width of a string is the
+sum of its characters' widths). The line layout follows insert_textbox: the
+first baseline sits `ascender` below the top of the box, and lines are
+(ascender - descender) apart, all times the font size. The last line's
+descent thus ends exactly len(lines) line heights below the top, which is
+the height the text needs.
+'''
+import fitz
+
+from core import config
+
+# Smallest font size a label is written at
+MIN_FONTSIZE = 2
+
+# Key: font name -> {character: width at font size 1}
+_glyph_widths = {}
+
+# Key: font name -> (ascender, descender)
+_font_metrics = {}
+
+
+def text_width(text, fontname=None):
+    """Width of `text` at font size 1."""
+    fontname = fontname or config.OUTPUT_FONT_NAME
+    widths = _glyph_widths.setdefault(fontname, {})
+    total = 0.0
+    for char in text:
+        width = widths.get(char)
+        if width is None:
+            width = widths[char] = fitz.get_text_length(char, fontname=fontname, fontsize=1)
+        total += width
+    return total
+
+
+def font_metrics(fontname=None):
+    """(ascender, descender) of a font, per unit of font size."""
+    fontname = fontname or config.OUTPUT_FONT_NAME
+    metrics = _font_metrics.get(fontname)
+    if metrics is None:
+        font = fitz.Font(fontname)
+        metrics = _font_metrics[fontname] = (font.ascender, font.descender)
+    return metrics
+
+
+def wrap_text(text, max_width, fontname=None, split_words=False):
+    """
+    Greedy word wrap of `text` into lines no wider than max_width (at font
+    size 1). A word wider than a line is broken into pieces with split_words,
+    otherwise None is returned.
+    """
+    space = text_width(" ", fontname)
+    lines = []
+    for paragraph in text.split("\n"):
+        line, line_width = [], 0.0
+        words = paragraph.split()
+        if split_words:
+            words = [piece for word in words for piece in _split_word(word, max_width, fontname)]
+        for word in words:
+            word_width = text_width(word, fontname)
+            if word_width > max_width:
+                return None
+            if line and line_width + space + word_width > max_width:
+                lines.append(" ".join(line))
+                line, line_width = [], 0.0
+            line_width += (space if line else 0.0) + word_width
+            line.append(word)
+        lines.append(" ".join(line))
+    return lines
+
+
+def _split_word(word, max_width, fontname):
+    """Breaks a word into pieces no wider than max_width (at least one character each)."""
+    pieces, piece = [], ""
+    for char in word:
+        if piece and text_width(piece + char, fontname) > max_width:
+            pieces.append(piece)
+            piece = ""
+        piece += char
+    pieces.append(piece)
+    return pieces
+
+
+def layout_at(text, rect, fontsize, fontname=None):
+    """The wrapped lines of `text` in `rect` at `fontsize`, or None if they don't fit."""
+    ascender, descender = font_metrics(fontname)
+    lines = wrap_text(text, rect.width / fontsize, fontname)
+    if lines is None:
+        return None
+    if fontsize * (ascender - descender) * len(lines) > rect.height:
+        return None
+    return lines
+
+
+def fit_text(text, rect, fontname=None, max_fontsize=None, min_fontsize=MIN_FONTSIZE):
+    """
+    Binary search for the largest whole font size (up to max_fontsize) at which
+    the wrapped text fits `rect`. Returns (fontsize, lines), or (None, None) if
+    it does not fit even at min_fontsize.
+    """
+    max_fontsize = max_fontsize or config.OUTPUT_MAX_FONTSIZE
+    rect = fitz.Rect(rect)
+    if not text or rect.is_empty:
+        return None, None
+
+    best = (None, None)
+    low, high = min_fontsize, max_fontsize
+    while low <= high:
+        fontsize = (low + high) // 2
+        lines = layout_at(text, rect, fontsize, fontname)
+        if lines is None:
+            high = fontsize - 1
+        else:
+            best = (fontsize, lines)
+            low = fontsize + 1
+    return best
+
+
+def line_origins(rect, fontsize, lines, fontname=None):
+    """Baseline start point of every line, right-aligned in `rect` (as insert_textbox with TEXT_ALIGN_RIGHT)."""
+    ascender, descender = font_metrics(fontname)
+    rect = fitz.Rect(rect)
+    line_height = fontsize * (ascender - descender)
+    return [
+        fitz.Point(rect.x1 - text_width(line, fontname) * fontsize, rect.y0 + fontsize * ascender + i * line_height)
+        for i, line in enumerate(lines)
+    ]
@@ -0,0 +1,198 @@
+# ==============================================================================
+# REGION-OF-INTEREST OCR
+# ==============================================================================
+'''
+Most of a drawing sheet is linework, yet full-page OCR makes Tesseract read
+the whole 300 DPI bitmap. This module finds the candidate text regions with a
+cheap OpenCV pass on a downscaled copy of the page:
+
+1. Binarize the downscaled page (Otsu).
+2. Remove long horizontal/vertical strokes (borders, dimension and table lines).
+3. Dilate what is left so the letters of a word/line join up, and keep the
+   connected components that have a text-like size.
+
+Only those crops are OCR'd. They are packed side by side into one compact
+mosaic image, so Tesseract runs once per page on the text pixels only, and
+every word found in the mosaic is mapped back to page pixel coordinates.
+'''
+import bisect
+import logging
+import numpy as np
+import cv2
+
+from core import config
+from utils.ocr_engine import image_to_data
+from utils.ocr_tiling import DATA_KEYS, BLOCK_STRIDE
+
+logger = logging.getLogger(__name__)
+
+# White space between crops in the mosaic, in pixels
+MOSAIC_GAP = 40
+
+
+def detect_text_regions(img_np, downscale=None, padding=None):
+    """
+    Finds candidate text regions on a page image.
+
+    Inputs:
+    - img_np: RGB or grayscale page image
+    - downscale: factor applied to the page before analysis, defaults to config.OCR_ROI_DOWNSCALE
+    - padding: pixels added around every region (full resolution), defaults to config.OCR_ROI_PADDING
+
+    Output: list of (x0, y0, x1, y1) boxes in full resolution page pixels.
+    Overlapping regions are merged.
+    """
+    downscale = downscale or config.OCR_ROI_DOWNSCALE
+    padding = config.OCR_ROI_PADDING if padding is None else padding
+
+    height, width = img_np.shape[:2]
+    gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY) if img_np.ndim == 3 else img_np
+    small = cv2.resize(gray, None, fx=downscale, fy=downscale, interpolation=cv2.INTER_AREA)
+    del gray
+
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+    # Strokes longer than ~1/4 inch are linework, not letters
+    line_len = max(10, int(round(75 * downscale)))
+    horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (line_len, 1)))
+    vertical = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, line_len)))
+    text_mask = cv2.subtract(binary, cv2.bitwise_or(horizontal, vertical))
+
+    # Join the letters of a word / line into one component
+    join_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, int(round(20 * downscale))), max(1, int(round(4 * downscale)))))
+    joined = cv2.dilate(text_mask, join_kernel)
+
+    # Text heights between ~1 mm and ~20 mm at 300 DPI
+    min_height = max(2, int(round(12 * downscale)))
+    max_height = int(round(240 * downscale))
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(joined, connectivity=8)
+
+    pad_small = int(np.ceil(padding * downscale))
+    region_mask = np.zeros_like(joined)
+    for i in range(1, count):
+        x, y, w, h, area = stats[i]
+        if h < min_height or h > max_height or area < min_height * min_height:
+            continue
+        cv2.rectangle(region_mask, (x - pad_small, y - pad_small), (x + w + pad_small, y + h + pad_small), 255, thickness=-1)
+
+    # Overlapping padded boxes become one region
+    count, _, stats, _ = cv2.connectedComponentsWithStats(region_mask, connectivity=8)
+
+    regions = []
+    for i in range(1, count):
+        x, y, w, h, _ = stats[i]
+        x0 = max(0, int(x / downscale))
+        y0 = max(0, int(y / downscale))
+        x1 = min(width, int(np.ceil((x + w) / downscale)))
+        y1 = min(height, int(np.ceil((y + h) / downscale)))
+        if x1 > x0 and y1 > y0:
+            regions.append((x0, y0, x1, y1))
+
+    return regions
+
+
+def ocr_text_regions(img_np, regions=None):
+    """
+    OCRs only the text regions of a page image and returns a pytesseract-style
+    DICT for the whole page, in page pixel coordinates.
+    """
+    if regions is None:
+        regions = detect_text_regions(img_np)
+    if not regions:
+        return {key: [] for key in DATA_KEYS}
+
+    height, width = img_np.shape[:2]
+    region_pixels = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+    logger.info(f"ROI OCR: {len(regions)} regions covering {100 * region_pixels / (width * height):.1f}% of the page")
+
+    mosaic, shelves = _build_mosaic(img_np, regions)
+    data = image_to_data(mosaic)
+    del mosaic
+
+    shelf_starts = [shelf[0] for shelf in shelves]
+    placement_starts = [[p[0] for p in shelf[2]] for shelf in shelves]
+
+    merged = {key: [] for key in DATA_KEYS}
+    for k in range(len(data['text'])):
+        if not str(data['text'][k]).strip():
+            continue
+
+        # The crop that contains the centre of the word
+        center_x = data['left'][k] + data['width'][k] / 2
+        center_y = data['top'][k] + data['height'][k] / 2
+        placement = _find_placement(shelves, shelf_starts, placement_starts, center_x, center_y)
+        if placement is None:
+            continue
+        mosaic_x, mosaic_y, region_idx = placement
+        x0, y0, _, _ = regions[region_idx]
+
+        for key in DATA_KEYS:
+            merged[key].append(data[key][k])
+        # Keep words of different crops on different lines
+        merged['block_num'][-1] = (region_idx + 1) * BLOCK_STRIDE + data['block_num'][k]
+        merged['left'][-1] = data['left'][k] - mosaic_x + x0
+        merged['top'][-1] = data['top'][k] - mosaic_y + y0
+
+    return merged
+
+
+def _build_mosaic(img_np, regions):
+    """
+    Packs the region crops into rows ("shelves") of one white image.
+
+    Returns (mosaic, shelves) where shelves is a list of
+    (shelf_y, shelf_height, [(mosaic_x, crop_width, region_idx), ...]).
+    """
+    region_widths = [x1 - x0 for x0, _, x1, _ in regions]
+    total_area = sum((x1 - x0 + MOSAIC_GAP) * (y1 - y0 + MOSAIC_GAP) for x0, y0, x1, y1 in regions)
+    mosaic_width = max(max(region_widths), int(np.sqrt(total_area))) + 2 * MOSAIC_GAP
+
+    # Tallest crops first keeps the shelves dense
+    order = sorted(range(len(regions)), key=lambda i: regions[i][3] - regions[i][1], reverse=True)
+
+    shelves = []
+    shelf_y = MOSAIC_GAP
+    shelf_height = 0
+    cursor_x = MOSAIC_GAP
+    current = []
+    for i in order:
+        x0, y0, x1, y1 = regions[i]
+        w, h = x1 - x0, y1 - y0
+        if current and cursor_x + w + MOSAIC_GAP > mosaic_width:
+            shelves.append((shelf_y, shelf_height, current))
+            shelf_y += shelf_height + MOSAIC_GAP
+            shelf_height = 0
+            cursor_x = MOSAIC_GAP
+            current = []
+        current.append((cursor_x, w, i))
+        cursor_x += w + MOSAIC_GAP
+        shelf_height = max(shelf_height, h)
+    shelves.append((shelf_y, shelf_height, current))
+
+    mosaic_height = shelf_y + shelf_height + MOSAIC_GAP
+    mosaic = np.full((mosaic_height, mosaic_width) + img_np.shape[2:], 255, dtype=img_np.dtype)
+    for shelf_y, _, placements in shelves:
+        for mosaic_x, _, i in placements:
+            x0, y0, x1, y1 = regions[i]
+            mosaic[shelf_y:shelf_y + (y1 - y0), mosaic_x:mosaic_x + (x1 - x0)] = img_np[y0:y1, x0:x1]
+
+    return mosaic, shelves
+
+
+def _find_placement(shelves, shelf_starts, placement_starts, x, y):
+    """Returns (mosaic_x, shelf_y, region_idx) of the crop containing point (x, y), or None."""
+    shelf_idx = bisect.bisect_right(shelf_starts, y) - 1
+    if shelf_idx < 0:
+        return None
+    shelf_y, shelf_height, placements = shelves[shelf_idx]
+    if y > shelf_y + shelf_height:
+        return None
+
+    placement_idx = bisect.bisect_right(placement_starts[shelf_idx], x) - 1
+    if placement_idx < 0:
+        return None
+    mosaic_x, crop_width, region_idx = placements[placement_idx]
+    if x > mosaic_x + crop_width:
+        return None
+    return mosaic_x, shelf_y, region_idx
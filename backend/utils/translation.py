@@ -5,6 +5,9 @@
 
 import logging
 from model import model as translation_model
+from model import inference_worker
+from core import config, metrics
+from utils.translation_memory import translate_with_memory
 
 logger = logging.getLogger(__name__)
 
@@ -13,22 +16,117 @@ def translate_hebrew_to_english(hebrew_text_data):
 
     # logger.info(f"testing if the extracted text data reaches to translation function safely {hebrew_text_data}")
 
+    # Known lines are answered by the translation memory; only new ones reach the model
+    english_texts = translate_with_memory([item["text"] for item in hebrew_text_data], translate_texts)
+
     translated_data = []
-    for i, item in enumerate(hebrew_text_data):
-        hebrew_text = item["text"]
-        try:
-            input_ids = translation_model.tokenizer(hebrew_text, return_tensors="pt").input_ids
-            translated_ids = translation_model.model.generate(input_ids, max_length=512)
-            english_text = translation_model.tokenizer.decode(translated_ids[0], skip_special_tokens=True).strip()
-        except Exception as e:
-            logger.error(f"Error translating '{hebrew_text}'", exc_info=True)
-            english_text = ""
+    for item, english_text in zip(hebrew_text_data, english_texts):
         translated_data.append({
-            "text": hebrew_text,
+            "text": item["text"],
             "bbox": item["bbox"],
             "page": item["page"],
             "english_translation": english_text
         })
 
         # logger.info(f"text translation: {english_text}")
-    return translated_data
\ No newline at end of file
+    return translated_data
+
+
+# ==============================================================================
+# BATCHED TRANSLATION ENGINE
+# ==============================================================================
+def translate_texts(hebrew_texts, max_batch_size=None, max_batch_tokens=None):
+    """
+    Translates a list of Hebrew strings and returns the English strings in
+    the same order. When the inference workers are running (see
+    model/inference_worker.py) the lines are sent to them, otherwise the model
+    runs in this process.
+    """
+    with metrics.stage("translate") as timing:
+        timing["lines"] = len(hebrew_texts)
+        if inference_worker.is_running():
+            return inference_worker.translate(list(hebrew_texts))
+        return translate_texts_in_process(hebrew_texts, max_batch_size, max_batch_tokens)
+
+
+def translate_texts_in_process(hebrew_texts, max_batch_size=None, max_batch_tokens=None):
+    """
+    Translates a list of Hebrew strings with the model loaded in this process.
+
+    Lines are sorted by token length and grouped into padded batches, so the
+    model runs one generate() call per batch instead of one per line. If a
+    batch fails, its lines are retried one by one so a single bad line only
+    loses its own translation.
+    """
+    english_texts = [""] * len(hebrew_texts)
+    if not hebrew_texts:
+        return english_texts
+
+    max_batch_size = max_batch_size or config.TRANSLATION_MAX_BATCH_SIZE
+    max_batch_tokens = max_batch_tokens or config.TRANSLATION_MAX_BATCH_TOKENS
+
+    token_lengths = [len(ids) for ids in translation_model.tokenizer(list(hebrew_texts)).input_ids]
+
+    for batch in _build_batches(token_lengths, max_batch_size, max_batch_tokens):
+        batch_texts = [hebrew_texts[i] for i in batch]
+        try:
+            batch_translations = _generate(batch_texts)
+        except Exception:
+            logger.warning(f"Batch of {len(batch_texts)} lines failed; retrying line by line", exc_info=True)
+            batch_translations = [_translate_line(text) for text in batch_texts]
+
+        for i, english_text in zip(batch, batch_translations):
+            english_texts[i] = english_text
+
+    return english_texts
+
+
+def _build_batches(token_lengths, max_batch_size, max_batch_tokens):
+    """
+    Groups line indices into batches of similar token length.
+
+    A batch is closed when adding another line would exceed either the
+    maximum number of lines or the padded token budget (lines x longest line).
+    """
+    order = sorted(range(len(token_lengths)), key=lambda i: token_lengths[i])
+
+    batches = []
+    current = []
+    current_max_len = 0
+    for i in order:
+        longest = max(current_max_len, token_lengths[i])
+        if current and (len(current) >= max_batch_size or longest * (len(current) + 1) > max_batch_tokens):
+            batches.append(current)
+            current = []
+            longest = token_lengths[i]
+        current.append(i)
+        current_max_len = longest
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _generate(hebrew_texts):
+    """Runs a single padded generate() call for a batch of lines."""
+    import torch
+
+    inputs = translation_model.tokenizer(hebrew_texts, return_tensors="pt", padding=True)
+    with torch.inference_mode():
+        translated_ids = translation_model.model.generate(**inputs, max_length=config.TRANSLATION_MAX_LENGTH)
+    decoded = translation_model.tokenizer.batch_decode(translated_ids, skip_special_tokens=True)
+    return [text.strip() for text in decoded]
+
+
+def _translate_line(hebrew_text):
+    """Translates one line on its own; returns an empty string on failure."""
+    import torch
+
+    try:
+        input_ids = translation_model.tokenizer(hebrew_text, return_tensors="pt").input_ids
+        with torch.inference_mode():
+            translated_ids = translation_model.model.generate(input_ids, max_length=config.TRANSLATION_MAX_LENGTH)
+        return translation_model.tokenizer.decode(translated_ids[0], skip_special_tokens=True).strip()
+    except Exception:
+        logger.error(f"Error translating '{hebrew_text}'", exc_info=True)
+        return ""
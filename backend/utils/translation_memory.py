@@ -0,0 +1,230 @@
+# ==============================================================================
+# TRANSLATION MEMORY (PERSISTENT TRANSLATION CACHE) FILE
+# ==============================================================================
+'''
+Engineering drawings repeat the same Hebrew labels on every sheet and across
+every file of a batch. The translation memory sits in front of the model: it
+keeps recent translations in an in-process LRU and every translation in a
+SQLite file, so a label is sent to the model once per model, not once per
+occurrence.
+
+Keys are the normalized Hebrew text together with the model id, so a result
+produced by one model is never served for another.
+'''
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from core import config
+from model import model as translation_model
+
+logger = logging.getLogger(__name__)
+
+# Hebrew cantillation marks (U+0591-U+05AF) and niqqud points. Punctuation in
+# the same block (maqaf U+05BE, paseq U+05C0, sof pasuq U+05C3, nun hafukha
+# U+05C6) is kept.
+_NIQQUD_RE = re.compile(r'[\u0591-\u05BD\u05BF\u05C1\u05C2\u05C4\u05C5\u05C7]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_hebrew_text(text):
+    """
+    Normalizes a Hebrew string for use as a cache key: strips niqqud and
+    cantillation, applies Unicode NFC and collapses runs of whitespace.
+    """
+    text = unicodedata.normalize("NFD", text)
+    text = _NIQQUD_RE.sub("", text)
+    text = unicodedata.normalize("NFC", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+# ==============================================================================
+# TRANSLATION MEMORY CLASS
+# ==============================================================================
+class TranslationMemory:
+    """
+    Two-level translation cache: an in-process LRU backed by a SQLite table.
+
+    All methods are thread-safe; the pipeline calls them from worker threads.
+    """
+
+    def __init__(self, db_path, max_entries):
+        self.db_path = db_path
+        self.max_entries = max_entries
+
+        self._lru = OrderedDict()  # Key: (model_id, normalized_text) -> english translation
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " model_id TEXT NOT NULL,"
+            " source TEXT NOT NULL,"
+            " translation TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (model_id, source))"
+        )
+        self._conn.commit()
+
+        # Counters exposed through /translate/translation-memory/stats
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.model_lines = 0
+        self.model_seconds = 0.0
+
+    def lookup(self, model_id, normalized_texts):
+        """
+        Returns {normalized_text: translation} for every text that is already
+        known for this model. Texts are expected to be normalized and unique.
+        """
+        found = {}
+        missing = []
+
+        with self._lock:
+            for text in normalized_texts:
+                key = (model_id, text)
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[text] = self._lru[key]
+                else:
+                    missing.append(text)
+            self.memory_hits += len(found)
+
+            disk_found = self._lookup_disk(model_id, missing)
+            for text, translation in disk_found.items():
+                self._remember(model_id, text, translation)
+            found.update(disk_found)
+
+            self.disk_hits += len(disk_found)
+            self.misses += len(missing) - len(disk_found)
+
+        return found
+
+    def store(self, model_id, translations, model_seconds=0.0):
+        """
+        Saves {normalized_text: translation} pairs produced by the model.
+        Empty translations (failed lines) are not stored so they are retried.
+        """
+        rows = [(model_id, text, english, time.time()) for text, english in translations.items() if english]
+
+        with self._lock:
+            self.model_lines += len(translations)
+            self.model_seconds += model_seconds
+
+            for _, text, english, _ in rows:
+                self._remember(model_id, text, english)
+            if rows:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO translations (model_id, source, translation, created_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+
+    def stats(self):
+        """Returns the hit/miss counters and an estimate of model time saved."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            seconds_per_line = self.model_seconds / self.model_lines if self.model_lines else 0.0
+            stored = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            return {
+                "enabled": True,
+                "db_path": self.db_path,
+                "memory_entries": len(self._lru),
+                "stored_entries": stored,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "model_lines": self.model_lines,
+                "model_seconds": self.model_seconds,
+                "estimated_model_seconds_saved": hits * seconds_per_line,
+            }
+
+    def _lookup_disk(self, model_id, normalized_texts):
+        found = {}
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(normalized_texts), 500):
+            chunk = normalized_texts[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT source, translation FROM translations WHERE model_id = ? AND source IN ({placeholders})",
+                [model_id, *chunk]
+            ).fetchall()
+            found.update(rows)
+        return found
+
+    def _remember(self, model_id, text, translation):
+        key = (model_id, text)
+        self._lru[key] = translation
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+
+# ==============================================================================
+# MODULE LEVEL ACCESS
+# ==============================================================================
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_translation_memory():
+    """Returns the process-wide TranslationMemory, or None when disabled."""
+    global _memory
+
+    if not config.TRANSLATION_MEMORY_ENABLED:
+        return None
+
+    with _memory_lock:
+        if _memory is None:
+            try:
+                _memory = TranslationMemory(config.TRANSLATION_MEMORY_PATH, config.TRANSLATION_MEMORY_LRU_SIZE)
+                logger.info(f"Translation memory opened at {config.TRANSLATION_MEMORY_PATH}")
+            except Exception:
+                logger.error("Failed to open the translation memory; continuing without it", exc_info=True)
+                return None
+    return _memory
+
+
+def translate_with_memory(hebrew_texts, translate_fn):
+    """
+    Translates a list of Hebrew strings, answering from the translation
+    memory where possible and sending only the unknown normalized strings to
+    translate_fn (a function mapping a list of strings to a list of
+    translations). Returns the translations in input order.
+    """
+    memory = get_translation_memory()
+    model_id = translation_model.model_id
+    if memory is None or model_id is None:
+        return translate_fn(list(hebrew_texts))
+
+    normalized = [normalize_hebrew_text(text) for text in hebrew_texts]
+    unique_texts = list(dict.fromkeys(normalized))
+
+    known = memory.lookup(model_id, unique_texts)
+    to_translate = [text for text in unique_texts if text not in known]
+
+    if to_translate:
+        start = time.perf_counter()
+        new_translations = dict(zip(to_translate, translate_fn(to_translate)))
+        memory.store(model_id, new_translations, model_seconds=time.perf_counter() - start)
+        known.update(new_translations)
+
+    logger.info(
+        f"Translation memory: {len(unique_texts) - len(to_translate)} of {len(unique_texts)} unique lines served from cache"
+    )
+    return [known.get(text, "") for text in normalized]
+
+
+def get_translation_memory_stats():
+    """Returns the counters of the translation memory for the API."""
+    memory = get_translation_memory()
+    if memory is None:
+        return {"enabled": False}
+    return {**memory.stats(), "model_id": translation_model.model_id}
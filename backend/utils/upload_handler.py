@@ -0,0 +1,188 @@
+# ==============================================================================
+# STREAMING PDF UPLOADS
+# ==============================================================================
+'''
+Receives the PDFs of a job as a multipart/form-data upload, so the client does
+not need to share a disk with the backend. The request body is parsed with
+python-multipart's streaming parser as it arrives, and every file part is
+written to config.UPLOAD_DIR/<job_id>/ chunk by chunk: no file is ever held
+in memory as a whole (unlike UploadFile, which spools the full body first).
+
+While a file streams to disk it is hashed (SHA-256), so the result cache does
+not read it a second time. The size limits are checked on the bytes received,
+not on the declared Content-Length alone.
+'''
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+# The first bytes of every PDF
+PDF_MAGIC = b"%PDF-"
+
+
+class UploadError(Exception):
+    """A rejected upload; status_code is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _PdfPartWriter:
+    """
+    Callbacks of the multipart parser: writes every file part of the body to
+    its own spool file and hashes it on the way.
+    """
+
+    def __init__(self, spool_dir):
+        self.spool_dir = spool_dir
+        self.files = []  # [(path, sha256)]
+        self.total_bytes = 0
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+        self._file = None
+        self._path = None
+        self._digest = None
+        self._head = b""
+        self._size = 0
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        file_name = options.get(b"filename")
+        if file_name is None:
+            return  # A plain form field; ignored
+
+        # Only the base name of the client path is kept, and never a path of its own
+        file_name = os.path.basename(file_name.decode("utf-8", "replace").replace("\\", "/"))
+        if not file_name.lower().endswith(".pdf"):
+            raise UploadError(f"{file_name or 'Unnamed file'} is not a PDF.", status_code=415)
+        if len(self.files) >= config.UPLOAD_MAX_FILES:
+            raise UploadError(f"Too many files; at most {config.UPLOAD_MAX_FILES} per job.", status_code=413)
+
+        # One folder per file: uploads of the same name keep their name (it names the output)
+        file_dir = os.path.join(self.spool_dir, str(len(self.files)))
+        os.makedirs(file_dir, exist_ok=True)
+        self._path = os.path.join(file_dir, file_name)
+        self._file = open(f"{self._path}.part", "wb")
+        self._digest = hashlib.sha256()
+        self._head = b""
+        self._size = 0
+
+    def on_part_data(self, data, start, end):
+        if self._file is None:
+            return
+        chunk = data[start:end]
+        if len(self._head) < len(PDF_MAGIC):
+            self._head += chunk[:len(PDF_MAGIC) - len(self._head)]
+            if not PDF_MAGIC.startswith(self._head):
+                raise UploadError(f"{os.path.basename(self._path)} is not a PDF.", status_code=415)
+
+        self._size += len(chunk)
+        self.total_bytes += len(chunk)
+        if self._size > config.UPLOAD_MAX_FILE_MB * 1024 * 1024:
+            raise UploadError(f"{os.path.basename(self._path)} is larger than {config.UPLOAD_MAX_FILE_MB} MB.", status_code=413)
+        if self.total_bytes > config.UPLOAD_MAX_TOTAL_MB * 1024 * 1024:
+            raise UploadError(f"The upload is larger than {config.UPLOAD_MAX_TOTAL_MB} MB.", status_code=413)
+
+        self._file.write(chunk)
+        self._digest.update(chunk)
+
+    def on_part_end(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        if self._head != PDF_MAGIC:
+            raise UploadError(f"{os.path.basename(self._path)} is empty or not a PDF.", status_code=415)
+        os.replace(f"{self._path}.part", self._path)
+        self.files.append((self._path, self._digest.hexdigest()))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def receive_pdf_uploads(request, job_id):
+    """
+    Streams the PDF files of a multipart/form-data request into the job's spool
+    folder. Returns [(path, sha256)] in upload order. Raises UploadError (and
+    removes whatever was spooled) when the upload is rejected.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError("Expected a multipart/form-data upload.", status_code=415)
+
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > config.UPLOAD_MAX_TOTAL_MB * 1024 * 1024:
+        raise UploadError(f"The upload is larger than {config.UPLOAD_MAX_TOTAL_MB} MB.", status_code=413)
+
+    spool_dir = os.path.join(config.UPLOAD_DIR, job_id)
+    os.makedirs(spool_dir, exist_ok=True)
+    writer = _PdfPartWriter(spool_dir)
+    parser = MultipartParser(boundary, callbacks=writer.callbacks())
+
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                # The callbacks write to disk; keep that off the event loop
+                await asyncio.to_thread(parser.write, chunk)
+        parser.finalize()
+    except Exception as e:
+        # Also a client that disconnects halfway
+        writer.close()
+        remove_job_uploads(job_id)
+        if isinstance(e, UploadError):
+            raise
+        raise UploadError(f"Malformed upload: {e}") from e
+
+    if not writer.files:
+        remove_job_uploads(job_id)
+        raise UploadError("The upload contains no PDF file.")
+
+    logger.info(f"Job {job_id}: Received {len(writer.files)} uploaded files ({writer.total_bytes / 1024 / 1024:.1f} MB)")
+    return writer.files
+
+
+def remove_job_uploads(job_id):
+    """Deletes the spooled input files of a job."""
+    spool_dir = os.path.join(config.UPLOAD_DIR, job_id)
+    if os.path.isdir(spool_dir):
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        logger.debug(f"Job {job_id}: Removed uploaded files in {spool_dir}")
+
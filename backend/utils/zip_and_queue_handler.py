@@ -2,72 +2,168 @@ import logging
 import zipfile
 import asyncio
 import os
+import threading
 
 from core import job_state as job_state
+from core import config, metrics
+from model import loader as model_loader
 from services.pdf_translator import run_translation_task
+from utils import upload_handler
+from utils.deduplication import JobTranslations
+from utils.legends_util import AbbreviationRegistry
 
 logger = logging.getLogger(__name__)
 
-# Function to handle serial processing of selected PDFs
-async def start_serial_processing(pdf_list: list, job_id: str):
-
-    processed_pdf_paths = []
-
-    job_state.create_job(job_id)
-    # jobs[job_id] = {"status": "starting", "result_path": None, "error": None}
-
-    logger.info(f"Job {job_id}: Created.")
-
-    logger.info("Starting serial translation task...")
+# ==============================================================================
+# JOB SCHEDULER: PROCESSES THE SELECTED PDFS OF A JOB IN PARALLEL
+# ==============================================================================
+async def start_batch_processing(pdf_list: list, job_id: str, file_hashes: dict = None):
+    """
+    Runs run_translation_task for every PDF of the job, up to
+    config.JOB_FILE_CONCURRENCY files at a time, and writes every translated
+    PDF into the job output (see JobOutput) as soon as its file finishes.
+
+    file_hashes ({path: sha256}) are the hashes of uploaded files, computed
+    while they streamed in; the other files are hashed by the task.
+
+    The job must already exist (job_state.create_job, called by the endpoint
+    that returns its id).
+
+    A file that fails is recorded as failed on the job and the rest of the batch
+    carries on; the job only fails when no file could be translated.
+    """
+
+    # Translations shared by every file of the job (normalized text -> english)
+    job_translations = JobTranslations()
+    # Legend codes shared by every file of the job (term -> code). A single file
+    # gets its own registry in the task, which also lets it use the result cache
+    abbreviations = AbbreviationRegistry() if len(pdf_list) > 1 else None
+    file_hashes = file_hashes or {}
+
+    logger.info(f"Starting batch translation task for {len(pdf_list)} files ({config.JOB_FILE_CONCURRENCY} at a time)...")
+
+    file_slots = asyncio.Semaphore(config.JOB_FILE_CONCURRENCY)
+    output = JobOutput(job_id, single_file=config.SINGLE_FILE_SKIP_ZIP and len(pdf_list) == 1)
+
+    async def process_file(file_path):
+        async with file_slots:
+            result = await asyncio.to_thread(run_translation_task, job_id, file_path, job_translations,
+                                             file_hashes.get(file_path), abbreviations)
+            if result:
+                # Moved into the job output right away, so no per-file PDF is left behind
+                output_name, write_pdf = result
+                await asyncio.to_thread(output.add, output_name, write_pdf)
+            return result
 
     try:
-        for file_path in pdf_list:
-
-            output_path = await asyncio.to_thread(run_translation_task, job_id, file_path)
-
-            processed_pdf_paths.append(output_path)
-
-        
-        # ZIP_DIR = "output_zips"
-        # os.makedirs(ZIP_DIR, exist_ok=True)
-        # zip_file_path = os.path.join(ZIP_DIR, f"{job_id}.zip")
-
-        zip_file = f"{job_id}.zip"
+        # Jobs submitted while the model is still loading (or before its lazy load) wait for it here
+        if model_loader.get_status()["model"] != "ready":
+            job_state.update_job_status(job_id, "loading_model")
+            await asyncio.to_thread(model_loader.ensure_loaded)
 
-        logger.info(f"Job {job_id}: Zipping {len(processed_pdf_paths)} files...")
+        results = await asyncio.gather(*(process_file(file_path) for file_path in pdf_list), return_exceptions=True)
 
-        with zipfile.ZipFile(zip_file, 'w') as zf:
-            for file_path in processed_pdf_paths:
+        for file_path, result in zip(pdf_list, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Job {job_id}: {file_path} failed: {result}")
+                job_state.update_file_status(job_id, file_path, "error", error=str(result))
 
-                file_name = os.path.basename(file_path)
-                zf.write(file_path, arcname=file_name)
+        if not output.file_count:
+            errors = [f"{os.path.basename(path)}: {entry['error']}" for path, entry in job_state.get_job(job_id)["files"].items()]
+            raise RuntimeError("No file could be translated. " + "; ".join(errors))
 
+        result_path, result_name = await asyncio.to_thread(output.close)
 
-        logger.info(f"Zip file {zip_file} created successfully")
+        logger.info(f"Job {job_id}: {output.file_count} file(s) written to {result_path}")
 
-        job_state.set_job_result(job_id, zip_file)
+        job_state.set_job_result(job_id, result_path, result_name)
         # logger.info(f"Job {job_id}: Processing complete. Result at {output_path}")
 
     except Exception as e:
-        logger.error(f"Job {job_id}: Serial processing FAILED.", exc_info=True)
+        logger.error(f"Job {job_id}: Batch processing FAILED.", exc_info=True)
         job_state.update_job_status(job_id, "error", error=str(e))
-        
-    finally:
-        # 4. THIS IS THE 'finally' BLOCK YOU NEED
-        # It cleans up all the intermediate translated PDFs
-        logger.info(f"Job {job_id}: Cleaning up intermediate files...")
-        for path in processed_pdf_paths:
-            if os.path.exists(path):
-                try:
-                    os.remove(path)
-                    logger.debug(f"Job {job_id}: Removed {path}")
-                except Exception as e:
-                    logger.error(f"Job {job_id}: Failed to remove {path}. {e}")
+        output.discard()
+
+    # Uploaded inputs are no longer needed (an interrupted job keeps them to be resumed)
+    upload_handler.remove_job_uploads(job_id)
+
+
+# ==============================================================================
+# JOB OUTPUT: ONE ZIP (OR ONE PDF) WRITTEN AS THE FILES FINISH
+# ==============================================================================
+class JobOutput:
+    """
+    The downloadable result of a job, in config.JOB_OUTPUT_DIR. Every translated
+    PDF goes into its entry of the job's ZIP when its file finishes (and its
+    working file is removed), so the archive is complete as soon as the last
+    file is. A single-file job can skip the ZIP and keep the PDF itself.
+
+    add() is called from worker threads of several files at once.
+    """
+
+    def __init__(self, job_id, single_file=False):
+        self.job_id = job_id
+        self.single_file = single_file
+        self.file_count = 0
+        self._lock = threading.Lock()
+        self._used_names = set()
+        self._zip = None
+        self._result_name = f"{job_id}.zip"
+
+        os.makedirs(config.JOB_OUTPUT_DIR, exist_ok=True)
+        self.path = os.path.join(config.JOB_OUTPUT_DIR, f"{job_id}.pdf" if single_file else f"{job_id}.zip")
+
+    def add(self, file_name, write_pdf):
+        """
+        Puts one translated PDF into the output: write_pdf(target) moves it to
+        a path (single file) or writes it to the binary stream of its ZIP entry.
+        """
+        with self._lock, metrics.stage("zip", job_id=self.job_id):
+            if self.single_file:
+                write_pdf(self.path)
+                self._result_name = file_name
+            else:
+                if self._zip is None:
+                    compression = zipfile.ZIP_DEFLATED if config.OUTPUT_ZIP_COMPRESSION == "deflated" else zipfile.ZIP_STORED
+                    self._zip = zipfile.ZipFile(self.path, "w", compression=compression)
+                arcname = _unique_name(file_name, self._used_names)
+                with self._zip.open(arcname, "w", force_zip64=True) as entry:
+                    write_pdf(entry)
+            self.file_count += 1
+
+    def close(self):
+        """Finishes the output; returns (path, file name offered for download)."""
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+                self._zip = None
+        return self.path, self._result_name
+
+    def discard(self):
+        """Removes a partial output (failed job)."""
+        self.close()
+        if os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logger.error(f"Job {self.job_id}: Failed to remove {self.path}. {e}")
+
+
+def _unique_name(file_name, used_names):
+    """Avoids two files of the same name (from different folders) overwriting each other in the zip."""
+    base, ext = os.path.splitext(file_name)
+    candidate = file_name
+    idx = 2
+    while candidate in used_names:
+        candidate = f"{base} ({idx}){ext}"
+        idx += 1
+    used_names.add(candidate)
+    return candidate
 
 
 
 async def cleanup_zip_file(zip_path: str):
-    
+    """Removes a job output once it has been downloaded."""
     try:
         if os.path.exists(zip_path):
             os.remove(zip_path)
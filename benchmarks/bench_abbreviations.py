@@ -0,0 +1,85 @@
+# ==============================================================================
+# ABBREVIATION ALLOCATION BENCHMARK
+# ==============================================================================
+'''
+Compares the old dict-scanning refine_abbreviation with AbbreviationRegistry
+when allocating legend codes for many terms. The terms share their initials
+(as on dense drawings), so most of them need a numbered code.
+
+Usage (from the project root):
+    python benchmarks/bench_abbreviations.py
+    python benchmarks/bench_abbreviations.py --terms 1000 5000 10000 20000
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from utils.legends_util import AbbreviationRegistry, abbreviation_candidate
+
+# Words with few distinct initials, so the candidates collide a lot
+WORDS = ["main", "pipe", "pressure", "valve", "pump", "supply", "cooling", "cold", "water", "wall"]
+
+
+def make_terms(count):
+    terms = []
+    for i in range(count):
+        words = [WORDS[(i // 10 ** k) % len(WORDS)] for k in range(3)]
+        terms.append(f"{' '.join(words)} {i}")
+    return terms
+
+
+def legacy_refine_abbreviation(term, used_codes, max_len=3):
+    """The former implementation: linear scans of used_codes for every duplicate."""
+    candidate = abbreviation_candidate(term, max_len)
+    if candidate in used_codes.values():
+        for k, v in used_codes.items():
+            if k == term:
+                return v
+        idx = 1
+        new_code = f"{candidate}{idx}"
+        while new_code in used_codes.values():
+            idx += 1
+            new_code = f"{candidate}{idx}"
+        candidate = new_code
+    used_codes[term] = candidate
+    return candidate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--terms", type=int, nargs="+", default=[1000, 2500, 5000, 10000], help="numbers of terms to allocate")
+    parser.add_argument("--skip-legacy-above", type=int, default=10000, help="don't run the quadratic version beyond this many terms")
+    args = parser.parse_args()
+
+    print(f"{'terms':>8} {'legacy':>12} {'registry':>12} {'legacy/term':>14} {'registry/term':>14}")
+    for count in args.terms:
+        terms = make_terms(count)
+
+        legacy_seconds = None
+        legacy_codes = None
+        if count <= args.skip_legacy_above:
+            used_codes = {}
+            start = time.perf_counter()
+            legacy_codes = [legacy_refine_abbreviation(term, used_codes) for term in terms]
+            legacy_seconds = time.perf_counter() - start
+
+        registry = AbbreviationRegistry()
+        start = time.perf_counter()
+        codes = [registry.code_for(term) for term in terms]
+        registry_seconds = time.perf_counter() - start
+
+        # Same term -> same code, and the codes of the old implementation
+        assert [registry.code_for(term) for term in terms] == codes
+        if legacy_codes is not None:
+            assert legacy_codes == codes, "registry codes differ from the former implementation"
+
+        legacy = f"{legacy_seconds:10.3f} s" if legacy_seconds is not None else f"{'-':>12}"
+        legacy_per_term = f"{legacy_seconds / count * 1e6:11.2f} us" if legacy_seconds is not None else f"{'-':>14}"
+        print(f"{count:>8} {legacy} {registry_seconds:10.3f} s {legacy_per_term} {registry_seconds / count * 1e6:11.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# ==============================================================================
+# TRANSLATION BACKEND BENCHMARK
+# ==============================================================================
+'''
+Compares the inference backends (torch fp32, int8, onnx) on a fixed sample set:
+load time, single-line latency, batched throughput, and BLEU of every backend
+against the fp32 output (100 = identical translations).
+
+Usage (from the project root, with the he-en-model folder in place; the onnx
+backend also needs the export from backend/model/export_onnx.py):
+    python benchmarks/bench_backends.py
+    python benchmarks/bench_backends.py --backends torch int8 --lines 800
+'''
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from model.model import load_model, BACKENDS
+from utils import translation
+
+# Fixed sample set of typical drawing labels, so BLEU drift is comparable between runs
+SAMPLE_LINES = [
+    "מידות",
+    "חומר",
+    "קנה מידה",
+    "שרטט",
+    "בדק",
+    "אישר",
+    "תאריך",
+    "מספר שרטוט",
+    "גיליון 1 מתוך 3",
+    "מהדורה",
+    "כל המידות במילימטרים אלא אם צוין אחרת",
+    "אין למדוד מהשרטוט",
+    "פלדה אל חלד",
+    "אלומיניום מאולגן",
+    "ריתוך רציף לאורך כל ההיקף",
+    "חיבור לצינור ניקוז קיים",
+    "פרט חתך א-א",
+    "מבט על",
+    "חזית דרומית",
+    "קיר בטון מזוין בעובי 20 ס\"מ",
+    "תקרה אקוסטית מונמכת",
+    "לוח חשמל ראשי",
+    "יציאת חירום",
+    "מפלס רצפה סופית",
+    "בידוד תרמי מצמר סלעים",
+    "צבע אפוקסי דו רכיבי",
+    "ברגי עיגון M12",
+    "פתח לאוורור",
+    "גובה מעקה 105 ס\"מ",
+    "הערות כלליות",
+]
+
+
+def corpus_bleu(hypotheses, references, max_n=4):
+    """Corpus BLEU (whitespace tokens, add-one smoothing for n > 1), 0-100."""
+    matches = [0] * max_n
+    totals = [0] * max_n
+    hyp_len = ref_len = 0
+    for hyp, ref in zip(hypotheses, references):
+        hyp_tokens, ref_tokens = hyp.split(), ref.split()
+        hyp_len += len(hyp_tokens)
+        ref_len += len(ref_tokens)
+        for n in range(1, max_n + 1):
+            hyp_ngrams = Counter(tuple(hyp_tokens[i:i + n]) for i in range(len(hyp_tokens) - n + 1))
+            ref_ngrams = Counter(tuple(ref_tokens[i:i + n]) for i in range(len(ref_tokens) - n + 1))
+            matches[n - 1] += sum((hyp_ngrams & ref_ngrams).values())
+            totals[n - 1] += sum(hyp_ngrams.values())
+
+    if hyp_len == 0:
+        return 0.0
+    log_precision = 0.0
+    for n in range(max_n):
+        smoothing = 1 if n > 0 else 0
+        if matches[n] + smoothing == 0:
+            return 0.0
+        log_precision += math.log((matches[n] + smoothing) / (totals[n] + smoothing)) / max_n
+    brevity_penalty = 1.0 if hyp_len > ref_len else math.exp(1 - ref_len / hyp_len)
+    return 100 * brevity_penalty * math.exp(log_precision)
+
+
+def run_backend(backend, lines):
+    start = time.perf_counter()
+    load_model(backend)
+    load_seconds = time.perf_counter() - start
+
+    # Warm up so one-time allocations are not measured
+    translation.translate_texts(SAMPLE_LINES[:4])
+
+    latencies = []
+    for line in SAMPLE_LINES:
+        start = time.perf_counter()
+        translation._translate_line(line)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    translation.translate_texts(lines)
+    batched_seconds = time.perf_counter() - start
+
+    return {
+        "load_s": load_seconds,
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+        "lines_per_s": len(lines) / batched_seconds,
+        "samples": translation.translate_texts(SAMPLE_LINES),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--lines", type=int, default=400, help="number of lines for the throughput run")
+    args = parser.parse_args()
+
+    lines = [f"{SAMPLE_LINES[i % len(SAMPLE_LINES)]} {i}" for i in range(args.lines)]
+
+    # The fp32 output is the BLEU reference, so torch always runs first
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    results = {}
+    for backend in backends:
+        try:
+            results[backend] = run_backend(backend, lines)
+        except RuntimeError as e:
+            print(f"{backend}: skipped ({e.__cause__ or e})")
+
+    if "torch" not in results:
+        return
+    reference = results["torch"]["samples"]
+
+    print(f"{'backend':8} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'lines/s':>9} {'BLEU vs fp32':>13}")
+    for backend, r in results.items():
+        bleu = corpus_bleu(r["samples"], reference)
+        print(f"{backend:8} {r['load_s']:8.2f} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['lines_per_s']:9.1f} {bleu:13.2f}")
+    for backend, r in results.items():
+        changed = sum(1 for a, b in zip(r["samples"], reference) if a != b)
+        print(f"{backend}: {changed}/{len(reference)} sample translations differ from fp32")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# ==============================================================================
+# PER-SHEET LEGEND BENCHMARK
+# ==============================================================================
+'''
+Renders sheets whose abbreviations change from one sheet to the next (the
+legend code sets are cycled, so consecutive sheets always differ) through
+OutputPdfWriter, and checks that every sheet carries the legend of its own
+codes and that each distinct legend is embedded only once.
+
+Usage (from the project root):
+    python benchmarks/bench_legends.py
+    python benchmarks/bench_legends.py --sheets 200 --legends 5 --codes 40
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import fitz
+from utils.output_pdf_handler import OutputPdfWriter
+
+
+def make_sheets(count, width=1190, height=842):
+    doc = fitz.open()
+    for i in range(count):
+        page = doc.new_page(width=width, height=height)
+        page.insert_text((72, 72), f"Sheet {i}", fontsize=24)
+    return doc
+
+
+def sheet_items(sheet, legend, codes):
+    """Abbreviated labels of one sheet: `codes` codes of legend set `legend`."""
+    items = []
+    for i in range(codes):
+        code = f"L{legend}C{i}"
+        bbox = [72 + (i % 10) * 90, 120 + (i // 10) * 30, 150 + (i % 10) * 90, 135 + (i // 10) * 30]
+        items.append({"page": sheet, "bbox": bbox, "english_translation": f"term {i} of legend {legend}",
+                      "display_text": code, "abbreviated": True, "fontsize": 6, "lines": [code]})
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sheets", type=int, default=60, help="number of sheets")
+    parser.add_argument("--legends", type=int, default=3, help="distinct legend code sets, cycled over the sheets")
+    parser.add_argument("--codes", type=int, default=20, help="codes per legend")
+    args = parser.parse_args()
+
+    source = make_sheets(args.sheets)
+    legend_of = [sheet % args.legends for sheet in range(args.sheets)]
+    path = os.path.join(tempfile.mkdtemp(), "legends.pdf")
+
+    writer = OutputPdfWriter(path)
+    first_pages = []  # Output page of every sheet; a long legend continues on the pages after it
+    start = time.perf_counter()
+    try:
+        for sheet, legend in enumerate(legend_of):
+            first_pages.append(writer.page_count)
+            writer.add_page(source, sheet, sheet_items(sheet, legend, args.codes))
+        writer.close()
+    except Exception:
+        writer.discard()
+        raise
+    seconds = time.perf_counter() - start
+
+    output = fitz.open(path)
+    first_pages.append(output.page_count)
+    legend_xobjects = set()
+    for sheet, legend in enumerate(legend_of):
+        page = output[first_pages[sheet]]
+        words = set()
+        for page_num in range(first_pages[sheet], first_pages[sheet + 1]):
+            words.update(output[page_num].get_text().split())
+        expected = {f"L{legend}C{i}" for i in range(args.codes)}
+        others = {word for word in words if word.startswith("L") and word not in expected and "C" in word}
+        assert expected <= words and not others, f"sheet {sheet} does not carry the legend of its own codes"
+        # The legend panel is the page XObject shown right of the sheet
+        xobjects = page.get_xobjects()
+        panels = {xref for xref, _, _, bbox in xobjects if bbox[0] >= source[sheet].rect.width}
+        legend_xobjects.update(xref for xref, name, invoker, _ in xobjects if name == "fullpage" and invoker in panels)
+    assert len(legend_xobjects) == args.legends, f"{len(legend_xobjects)} legend XObjects for {args.legends} legends"
+
+    print(f"{args.sheets} sheets, {args.legends} legends x {args.codes} codes: {seconds:.3f} s, "
+          f"{output.page_count} pages, {os.path.getsize(path) / 1e6:.2f} MB, {len(legend_xobjects)} legend XObjects")
+    output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# ==============================================================================
+# OCR WORD-TO-LINE GROUPING BENCHMARK
+# ==============================================================================
+'''
+Compares the old word-by-word grouping loop of the OCR path with the NumPy
+grouping (_group_words_into_lines) on synthetic image_to_data output of a
+dense sheet, and checks that both produce identical lines.
+
+Usage (from the project root):
+    python benchmarks/bench_line_grouping.py
+    python benchmarks/bench_line_grouping.py --words 10000 50000 100000
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend"))
+
+from utils.text_extraction import _group_words_into_lines
+
+DPI = 300
+
+
+def make_data(words, seed=0):
+    """image_to_data-like dict: lines of 1-8 words, some noise and empty boxes, shuffled blocks."""
+    rng = random.Random(seed)
+    data = {key: [] for key in ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+                                'left', 'top', 'width', 'height', 'conf', 'text')}
+    block = 0
+    while len(data['text']) < words:
+        block += 1
+        x0, y0 = rng.randrange(0, 9000), rng.randrange(0, 6000)
+        for par in range(1, rng.randint(1, 3) + 1):
+            for line in range(1, rng.randint(1, 4) + 1):
+                x = x0
+                for word in range(1, rng.randint(1, 8) + 1):
+                    width = rng.randint(20, 120)
+                    data['level'].append(5)
+                    data['page_num'].append(1)
+                    data['block_num'].append(block)
+                    data['par_num'].append(par)
+                    data['line_num'].append(line)
+                    data['word_num'].append(word)
+                    data['left'].append(x)
+                    data['top'].append(y0 + line * 40 + rng.randint(-3, 3))
+                    data['width'].append(width)
+                    data['height'].append(rng.randint(18, 30))
+                    data['conf'].append(rng.choice([-1, 12, 39.9, 40, 65.5, 91, 96]))
+                    data['text'].append(rng.choice(["שלום", "מידה", "A-1", "  ", "", "120", "חומר "]))
+                    x += width + 10
+    return data
+
+
+def legacy_group(data, page_num, dpi):
+    """The former loop: one dict update per word, then a sort with a Python key."""
+    lines = {}
+    for k in range(len(data['text'])):
+        if int(data['conf'][k]) < 40: continue
+        text = data['text'][k].strip()
+        if not text: continue
+        line_key = (data['block_num'][k], data['par_num'][k], data['line_num'][k])
+        x, y, w, h = (data['left'][k], data['top'][k], data['width'][k], data['height'][k])
+        if line_key not in lines:
+            lines[line_key] = {"text": [text], "x_min": x, "y_min": y, "x_max": x + w, "y_max": y + h}
+        else:
+            lines[line_key]["text"].append(text)
+            lines[line_key]["x_min"] = min(lines[line_key]["x_min"], x)
+            lines[line_key]["y_min"] = min(lines[line_key]["y_min"], y)
+            lines[line_key]["x_max"] = max(lines[line_key]["x_max"], x + w)
+            lines[line_key]["y_max"] = max(lines[line_key]["y_max"], y + h)
+
+    sorted_lines = sorted(lines.values(), key=lambda v: (v['y_min'], v['x_min']))
+    scale = 72/dpi
+    return [
+        {
+            "text": " ".join(ln['text']),
+            "bbox": (ln['x_min']*scale, ln['y_min']*scale, ln['x_max']*scale, ln['y_max']*scale),
+            "page": page_num,
+        }
+        for ln in sorted_lines
+    ]
+
+
+def best_of(func, repeat, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, nargs="+", default=[1000, 10000, 50000, 100000], help="OCR boxes per page")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    print(f"{'words':>8} {'lines':>7} {'legacy':>10} {'numpy':>10} {'speedup':>8}")
+    for words in args.words:
+        data = make_data(words)
+        legacy_seconds, expected = best_of(legacy_group, args.repeat, data, 0, DPI)
+        numpy_seconds, lines = best_of(_group_words_into_lines, args.repeat, data, 0, DPI)
+        assert lines == expected, "NumPy grouping differs from the former loop"
+        print(f"{words:>8} {len(lines):>7} {legacy_seconds * 1000:8.1f} ms {numpy_seconds * 1000:8.1f} ms "
+              f"{legacy_seconds / numpy_seconds:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# ==============================================================================
+# OCR ENGINE BENCHMARK
+# ==============================================================================
+'''
+Runs every available OCR_ENGINE (pytesseract, pipe, and tesserocr when it is
+installed) on the pages of a PDF, and reports the time of each and whether
+they read the same words as pytesseract. The first tesserocr page includes
+loading the traineddata; later pages reuse it.
+
+Usage (from the project root):
+    python benchmarks/bench_ocr_engine.py path/to/drawing.pdf
+    python benchmarks/bench_ocr_engine.py path/to/drawing.pdf --pages 3
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from core import config
+from utils import ocr_engine
+from utils.rasterization import iter_page_images
+
+
+def words(data):
+    return [(data['left'][k], data['top'][k], data['text'][k]) for k in range(len(data['text'])) if data['text'][k].strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pdf_path", help="PDF to OCR")
+    parser.add_argument("--pages", type=int, default=None, help="only the first N pages")
+    args = parser.parse_args()
+
+    engines = ["pytesseract", "pipe"]
+    if ocr_engine.resolve_engine("auto") == "tesserocr":
+        engines.append("tesserocr")
+    totals = dict.fromkeys(engines, 0.0)
+    same = dict.fromkeys(engines, 0)
+
+    page_numbers = range(args.pages) if args.pages else None
+    print(f"{'page':>5} " + " ".join(f"{engine + ' s':>14}" for engine in engines))
+    pages = 0
+    for page_num, img_np in iter_page_images(args.pdf_path, dpi=config.OCR_DPI, page_numbers=page_numbers):
+        seconds, reference = {}, None
+        for engine in engines:
+            config.OCR_ENGINE = engine
+            start = time.perf_counter()
+            data = ocr_engine.image_to_data(img_np)
+            seconds[engine] = time.perf_counter() - start
+            reference = reference if reference is not None else words(data)
+            totals[engine] += seconds[engine]
+            same[engine] += words(data) == reference
+        del img_np
+        pages += 1
+        print(f"{page_num + 1:>5} " + " ".join(f"{seconds[engine]:>14.2f}" for engine in engines))
+
+    print()
+    for engine in engines:
+        print(f"{engine:>12}: {totals[engine]:.2f} s, {totals['pytesseract'] / totals[engine]:.2f}x, "
+              f"same words as pytesseract on {same[engine]}/{pages} pages")
+
+
+if __name__ == "__main__":
+    main()
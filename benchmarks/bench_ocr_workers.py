@@ -0,0 +1,52 @@
+# ==============================================================================
+# PARALLEL OCR BENCHMARK
+# ==============================================================================
+'''
+Reports OCR throughput (pages/second) for different numbers of OCR worker
+processes on one PDF.
+
+Usage (from the project root):
+    python benchmarks/bench_ocr_workers.py path/to/drawing.pdf --workers 1 2 4 8
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from core import config
+from utils import text_extraction
+from utils.rasterization import get_page_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pdf_path", help="PDF to OCR")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="worker counts to compare")
+    args = parser.parse_args()
+
+    page_count = get_page_count(args.pdf_path)
+    print(f"{args.pdf_path}: {page_count} pages at {config.OCR_DPI} DPI")
+    print(f"{'workers':>8} {'seconds':>10} {'pages/s':>10} {'lines':>8}")
+
+    for workers in args.workers:
+        config.OCR_WORKERS = workers
+        text_extraction.shutdown_ocr_pool()
+
+        # Start the pool outside the timed region; process spawn is a one-time cost
+        if workers > 1:
+            text_extraction._get_ocr_pool().submit(os.getpid).result()
+
+        start = time.perf_counter()
+        lines = text_extraction._process_hebrew_lines_ocr(args.pdf_path)
+        seconds = time.perf_counter() - start
+
+        print(f"{workers:>8} {seconds:>10.2f} {page_count / seconds:>10.2f} {len(lines):>8}")
+
+    text_extraction.shutdown_ocr_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# ==============================================================================
+# REGION-OF-INTEREST OCR BENCHMARK
+# ==============================================================================
+'''
+Compares full-page OCR with region-of-interest OCR on every page of a PDF.
+Reports the time of both, and the recall of the ROI path: the share of the
+lines found by full-page OCR that the ROI path also found (same text, and
+overlapping bboxes).
+
+Usage (from the project root):
+    python benchmarks/bench_roi_ocr.py path/to/drawing.pdf
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from core import config
+from utils import text_extraction
+from utils.ocr_tiling import _overlap_ratio
+from utils.rasterization import iter_page_images
+
+
+def ocr_page(img_np, page_num, mode):
+    config.OCR_MODE = mode
+    start = time.perf_counter()
+    lines = text_extraction._ocr_page_lines(img_np, page_num)
+    return lines, time.perf_counter() - start
+
+
+def matched(line, candidates):
+    return any(
+        line["text"] == other["text"] and _overlap_ratio(line["bbox"], other["bbox"]) >= 0.5
+        for other in candidates
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pdf_path", help="PDF to OCR")
+    args = parser.parse_args()
+
+    totals = {"full": 0.0, "roi": 0.0}
+    found_full = found_roi = recalled = 0
+
+    print(f"{'page':>5} {'full s':>8} {'roi s':>8} {'full lines':>11} {'roi lines':>10} {'recall':>7}")
+    for page_num, img_np in iter_page_images(args.pdf_path, dpi=config.OCR_DPI):
+        full_lines, full_seconds = ocr_page(img_np, page_num, "full")
+        roi_lines, roi_seconds = ocr_page(img_np, page_num, "roi")
+        del img_np
+
+        page_recalled = sum(1 for line in full_lines if matched(line, roi_lines))
+        recall = page_recalled / len(full_lines) if full_lines else 1.0
+        print(f"{page_num + 1:>5} {full_seconds:>8.2f} {roi_seconds:>8.2f} {len(full_lines):>11} {len(roi_lines):>10} {recall:>7.1%}")
+
+        totals["full"] += full_seconds
+        totals["roi"] += roi_seconds
+        found_full += len(full_lines)
+        found_roi += len(roi_lines)
+        recalled += page_recalled
+
+    print()
+    print(f"full-page OCR: {totals['full']:.2f} s, {found_full} lines")
+    print(f"ROI OCR:       {totals['roi']:.2f} s, {found_roi} lines")
+    if totals["roi"]:
+        print(f"speedup:       {totals['full'] / totals['roi']:.2f}x")
+    print(f"recall:        {recalled / found_full if found_full else 1.0:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# ==============================================================================
+# TILED OCR MERGE BENCHMARK
+# ==============================================================================
+'''
+Merges synthetic per-tile OCR output of a large sheet (merge_region_data) and
+groups it into lines. Labels are placed anywhere on the sheet, many of them
+across a tile seam: every tile reads the words inside it, plus a garbled copy
+of a word cut by its edge. Checks that every label comes out as exactly one
+line with all its words in reading order, and reports the merge time.
+
+Usage (from the project root):
+    python benchmarks/bench_tile_merge.py
+    python benchmarks/bench_tile_merge.py --labels 500 2000 --width 14000 --height 10000
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend"))
+
+from utils.ocr_tiling import DATA_KEYS, compute_tiles, merge_region_data
+from utils.text_extraction import _group_words_into_lines
+
+DPI = 300
+TILE_SIZE = 4000
+OVERLAP = 300
+LINE_HEIGHT = 30
+ROW_PITCH = 80
+
+
+def make_labels(count, height, width, seed=0):
+    """Hebrew-like labels of 2-12 words, one per row slot, laid out right to left."""
+    rng = random.Random(seed)
+    rows = rng.sample(range(height // ROW_PITCH - 1), min(count, height // ROW_PITCH - 1))
+    labels = []
+    for label_idx, row in enumerate(rows):
+        words = []
+        x = rng.randrange(400, width - 400)
+        for word_idx in range(rng.randint(2, 12)):
+            word_width = rng.randint(60, 150)
+            if x - word_width < 0:
+                break
+            # Reading order is right to left: every next word lies left of the previous one
+            words.append((f"l{label_idx}w{word_idx}", (x - word_width, row * ROW_PITCH, x, row * ROW_PITCH + LINE_HEIGHT)))
+            x -= word_width + 15
+        labels.append(words)
+    return labels
+
+
+def ocr_tile(tile, labels):
+    """What Tesseract returns for one tile: the words inside it, and a garbled copy of a word cut by the edge."""
+    x0, y0, x1, y1 = tile
+    data = {key: [] for key in DATA_KEYS}
+    for label_idx, words in enumerate(labels):
+        for word_idx, (text, (left, top, right, bottom)) in enumerate(words):
+            if top < y0 or bottom > y1 or right <= x0 or left >= x1:
+                continue
+            if left < x0 or right > x1:
+                text = "?" * len(text)
+                left, right = max(left, x0), min(right, x1)
+            for key, value in (('level', 5), ('page_num', 1), ('block_num', label_idx + 1), ('par_num', 1),
+                               ('line_num', 1), ('word_num', word_idx + 1), ('left', left - x0), ('top', top - y0),
+                               ('width', right - left), ('height', bottom - top), ('conf', 90), ('text', text)):
+                data[key].append(value)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--labels", type=int, nargs="+", default=[100, 500, 1000], help="labels per sheet")
+    parser.add_argument("--width", type=int, default=14000, help="sheet width in pixels")
+    parser.add_argument("--height", type=int, default=10000, help="sheet height in pixels")
+    args = parser.parse_args()
+
+    tiles = compute_tiles(args.height, args.width, TILE_SIZE, OVERLAP)
+    seams = sorted({x for tile in tiles for x in (tile[0], tile[2])} - {0, args.width})
+
+    print(f"{'labels':>7} {'on seams':>9} {'tiles':>6} {'merge':>10}")
+    for count in args.labels:
+        labels = make_labels(count, args.height, args.width)
+        results = [ocr_tile(tile, labels) for tile in tiles]
+
+        start = time.perf_counter()
+        merged = merge_region_data(tiles, results, (args.height, args.width))
+        seconds = time.perf_counter() - start
+
+        lines = sorted(line["text"] for line in _group_words_into_lines(merged, 0, DPI))
+        expected = sorted(" ".join(text for text, _ in words) for words in labels)
+        assert lines == expected, "A label was split, lost or duplicated by the tile merge"
+
+        on_seams = sum(1 for words in labels if any(words[-1][1][0] < seam < words[0][1][2] for seam in seams))
+        print(f"{count:>7} {on_seams:>9} {len(tiles):>6} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# ==============================================================================
+# TRANSLATION THROUGHPUT BENCHMARK
+# ==============================================================================
+'''
+Compares the old one-generate-per-line loop with the batched translation engine.
+
+Usage (from the project root, with the he-en-model folder in place):
+    python benchmarks/bench_translation.py --lines 800
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from model.model import load_model
+from utils import translation
+
+# Typical labels found on engineering drawings
+SAMPLE_LINES = [
+    "מידות",
+    "חומר",
+    "קנה מידה",
+    "שרטט",
+    "בדק",
+    "תאריך",
+    "מספר שרטוט",
+    "גיליון 1 מתוך 3",
+    "כל המידות במילימטרים אלא אם צוין אחרת",
+    "פלדה אל חלד",
+    "ריתוך רציף לאורך כל ההיקף",
+    "חיבור לצינור ניקוז קיים",
+    "פרט חתך א-א",
+    "קיר בטון מזוין בעובי 20 ס\"מ",
+]
+
+
+def legacy_loop(lines):
+    return [translation._translate_line(line) for line in lines]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=400, help="number of OCR lines to translate")
+    parser.add_argument("--batch-size", type=int, default=None, help="max lines per batch")
+    parser.add_argument("--batch-tokens", type=int, default=None, help="max padded tokens per batch")
+    args = parser.parse_args()
+
+    load_model()
+    lines = [f"{SAMPLE_LINES[i % len(SAMPLE_LINES)]} {i}" for i in range(args.lines)]
+
+    # Warm up both paths so one-time allocations are not measured
+    legacy_loop(lines[:4])
+    translation.translate_texts(lines[:4])
+
+    start = time.perf_counter()
+    legacy_loop(lines)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    translation.translate_texts(lines, max_batch_size=args.batch_size, max_batch_tokens=args.batch_tokens)
+    batched_seconds = time.perf_counter() - start
+
+    print(f"lines:        {len(lines)}")
+    print(f"per-line:     {legacy_seconds:8.2f} s  ({len(lines) / legacy_seconds:8.1f} lines/s)")
+    print(f"batched:      {batched_seconds:8.2f} s  ({len(lines) / batched_seconds:8.1f} lines/s)")
+    print(f"speedup:      {legacy_seconds / batched_seconds:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
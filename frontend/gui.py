@@ -4,6 +4,7 @@ import requests
 # import atexit  # No longer needed
 # import sys     # No longer needed
 # import os      # No longer needed
+import json
 import time
 import threading
 
@@ -89,17 +90,31 @@ class App(ctk.CTk):
         threading.Thread(target=self.check_backend_health, daemon=True).start()
 
     def check_backend_health(self):
-        """Polls the /health endpoint until the backend is ready."""
+        """
+        Polls the /health endpoint until the backend is ready. The server answers
+        right away and reports "loading_model" while the translation model loads.
+        """
         print(f"Checking for backend at {BASE_URL}/health")
         retries = 0
         # Increased retries to give the backend thread more time to start
         while retries < 20: # Try for 10 seconds
             try:
                 response = requests.get(f"{BASE_URL}/health", timeout=1)
-                if response.status_code == 200 and response.json().get("status") == "ready":
-                    print("Backend is healthy. Enabling UI.")
-                    self.after(0, self.on_backend_ready)
-                    return
+                if response.status_code == 200:
+                    health = response.json()
+                    status = health.get("status")
+                    if status == "ready":
+                        print("Backend is healthy. Enabling UI.")
+                        self.after(0, self.on_backend_ready)
+                        return
+                    if status == "error":
+                        self.after(0, lambda: self.on_backend_failed(health.get("error")))
+                        return
+                    if status == "loading_model":
+                        # Connected; wait for the model without counting retries
+                        self.after(0, lambda: self.label_status.configure(text="Status: Loading translation model..."))
+                        time.sleep(0.5)
+                        continue
             except requests.exceptions.ConnectionError:
                 print(f"Connection attempt {retries+1} failed...")
             except Exception as e:
@@ -116,8 +131,12 @@ class App(ctk.CTk):
         self.label_status.configure(text="Status: Idle (Connected)")
         self.button_select.configure(state="normal")
 
-    def on_backend_failed(self):
-        """Callback run on the main thread if the backend can't be reached."""
+    def on_backend_failed(self, model_error=None):
+        """Callback run on the main thread if the backend can't be reached or the model failed to load."""
+        if model_error:
+            self.label_status.configure(text="Status: Translation model failed to load.", text_color="red")
+            messagebox.showerror("Model Error", f"The translation model could not be loaded.\n\n{model_error}")
+            return
         self.label_status.configure(text="Status: Backend not found.", text_color="red")
         messagebox.showerror(
             "Connection Error",
@@ -155,7 +174,7 @@ class App(ctk.CTk):
             if response.status_code == 200:
                 self.current_job_id = response.json().get("job_id")
                 self.label_status.configure(text="Status: Processing... (This may take a while)")
-                self.after(2000, self.check_status)
+                self.watch_job(self.current_job_id)
             else:
                 self.reset_ui(error=f"Error starting job (Code: {response.status_code}): {response.text}")
 
@@ -166,8 +185,36 @@ class App(ctk.CTk):
         except Exception as e:
             self.reset_ui(error=f"An unexpected error occurred: {e}")
 
+    def watch_job(self, job_id):
+        """Follows the job's progress stream in a background thread."""
+        threading.Thread(target=self.stream_job_events, args=(job_id,), daemon=True).start()
+
+    def stream_job_events(self, job_id):
+        """
+        Reads the backend's /job-events/ Server-Sent Events stream and hands every
+        update to the UI thread. Falls back to polling /job-status/ if the stream
+        is not available (older backend) or breaks off before the job finishes.
+        """
+        try:
+            with requests.get(f"{BASE_URL}/translate/job-events/{job_id}", stream=True, timeout=(5, 60)) as response:
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+                event = None
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        data = json.loads(line[len("data:"):])
+                        self.after(0, self.on_job_update, job_id, data)
+                        if event == "done":
+                            return
+        except Exception as e:
+            print(f"Progress stream unavailable ({e}); falling back to polling.")
+
+        self.after(0, self.check_status)
+
     def check_status(self):
-        """Polls the backend's /job-status/ endpoint."""
+        """Polls the backend's /job-status/ endpoint (fallback when the progress stream is unavailable)."""
         if not self.current_job_id or not self.is_processing:
             return
 
@@ -176,19 +223,8 @@ class App(ctk.CTk):
             
             if response.status_code == 200:
                 data = response.json()
-                status = data.get("status")
-                
-                if status == "complete":
-                    self.progressbar.stop()
-                    self.progressbar.set(1)
-                    self.label_status.configure(text="Status: Translation Complete!", text_color="green")
-                    self.download_file()
-                
-                elif status == "error":
-                    self.reset_ui(error=f"Translation failed: {data.get('error')}")
-                
-                else:
-                    self.label_status.configure(text=f"Status: {status}...")
+                self.on_job_update(self.current_job_id, data)
+                if data.get("status") not in ("complete", "error"):
                     self.after(2000, self.check_status)
             
             else:
@@ -197,11 +233,62 @@ class App(ctk.CTk):
         except Exception as e:
             self.reset_ui(error=f"Error checking status: {e}")
 
-    def download_file(self):
+    def on_job_update(self, job_id, data):
+        """Shows a job update (from the stream or a poll); runs on the main thread."""
+        if job_id != self.current_job_id or not self.is_processing:
+            return
+
+        status = data.get("status")
+        
+        if status == "complete":
+            self.progressbar.stop()
+            self.progressbar.configure(mode="determinate")
+            self.progressbar.set(1)
+            failed = data.get("files_failed") or 0
+            if failed:
+                self.label_status.configure(text=f"Status: Complete ({failed} file(s) failed)", text_color="orange")
+            else:
+                self.label_status.configure(text="Status: Translation Complete!", text_color="green")
+            self.download_file(data.get("result_name"))
+        
+        elif status == "error":
+            self.reset_ui(error=f"Translation failed: {data.get('error')}")
+        
+        else:
+            self.show_progress(status, data.get("progress") or {})
+
+    def show_progress(self, status, progress):
+        """Status line (stage, pages, lines, ETA) and progress bar of a running job."""
+        details = []
+        if progress.get("pages_total"):
+            details.append(f"page {progress['pages_done']}/{progress['pages_total']}")
+        if progress.get("lines_translated"):
+            details.append(f"{progress['lines_translated']} lines")
+        if progress.get("eta_seconds") is not None:
+            details.append(f"~{int(progress['eta_seconds'])} s left")
+        text = f"Status: {status}..."
+        if details:
+            text += " (" + ", ".join(details) + ")"
+        self.label_status.configure(text=text)
+
+        # Switch from the busy animation to real progress once pages are known
+        if progress.get("pages_total"):
+            if self.progressbar.cget("mode") != "determinate":
+                self.progressbar.stop()
+                self.progressbar.configure(mode="determinate")
+            self.progressbar.set(progress.get("fraction", 0))
+
+    def download_file(self, result_name=None):
         """Prompts to save the file, then downloads from the /download/ endpoint."""
+        # A single-file job returns the translated PDF itself, otherwise a ZIP
+        if result_name and result_name.lower().endswith(".pdf"):
+            extension, filetypes = ".pdf", [("PDF files", "*.pdf")]
+        else:
+            extension, filetypes = ".zip", [("Zip files", "*.zip")]
         save_path = filedialog.asksaveasfilename(
-            defaultextension=".zip",
-            filetypes=[("Zip files", "*.zip")],
+            defaultextension=extension,
+            filetypes=filetypes,
+            initialfile=result_name or "",
         )
         
         if not save_path:
@@ -233,6 +320,7 @@ class App(ctk.CTk):
             self.button_select.configure(state="disabled")
             self.button_translate.configure(state="disabled")
             self.progressbar.pack(pady=10, fill="x", padx=30)
+            self.progressbar.configure(mode="indeterminate")
             self.progressbar.start()
         else:
             self.button_select.configure(state="normal")
@@ -1,4 +1,5 @@
 import threading
+import multiprocessing
 import uvicorn
 import sys
 import os
@@ -20,32 +21,7 @@ sys.path.append(os.path.join(base_path, 'frontend'))
 sys.path.append(os.path.join(base_path, 'backend'))
 
 
-# --- Step 2: Import the App Objects ---
-try:
-
-    from backend.main import logger
-
-    logger.info("Trying to import from backend")
-    # Import the FastAPI 'app' object from your backend
-    # !! IMPORTANT: I am assuming your file is 'backend/main.py' 
-    # !! and your FastAPI object is named 'app'. 
-    # !! If not, change 'main' or 'app' to match your code.
-    from backend.main import app as backend_app
-    
-    # Import your CustomTkinter 'App' class from the frontend
-    from frontend.gui import App as FrontendApp
-
-except ImportError as e:
-    logger.error(f"Error: Failed to import modules. {e}")
-    logger.error("Please ensure:")
-    logger.error("1. This script is in your root project folder.")
-    logger.error("2. You have a 'frontend/main_gui.py' file with your 'App' class.")
-    logger.error("3. You have a 'backend/main.py' file (or similar) with your FastAPI 'app'.")
-    logger.error("Press Enter to exit...")
-    sys.exit(1)
-
-
-# --- Step 3: Define the Backend Server Thread ---
+# --- Step 2: Define the Backend Server Thread ---
 def start_backend():
     """
     Runs the Uvicorn server in a separate thread.
@@ -67,10 +43,39 @@ def start_backend():
         # The GUI's health check will fail, which is what we want.
 
 
-# --- Step 4: Main Execution ---
+# --- Step 3: Main Execution ---
 if __name__ == "__main__":
+
+    # Required for the OCR worker processes when running as a PyInstaller exe
+    multiprocessing.freeze_support()
+
+    # 3a. Import the App Objects.
+    # Only in the main process: the spawned OCR workers re-run this file's top level,
+    # and must not open the job store or load the GUI toolkit
+    try:
+
+        from backend.main import logger
+
+        logger.info("Trying to import from backend")
+        # Import the FastAPI 'app' object from your backend
+        # !! IMPORTANT: I am assuming your file is 'backend/main.py' 
+        # !! and your FastAPI object is named 'app'. 
+        # !! If not, change 'main' or 'app' to match your code.
+        from backend.main import app as backend_app
+
+        # Import your CustomTkinter 'App' class from the frontend
+        from frontend.gui import App as FrontendApp
+
+    except ImportError as e:
+        logger.error(f"Error: Failed to import modules. {e}")
+        logger.error("Please ensure:")
+        logger.error("1. This script is in your root project folder.")
+        logger.error("2. You have a 'frontend/main_gui.py' file with your 'App' class.")
+        logger.error("3. You have a 'backend/main.py' file (or similar) with your FastAPI 'app'.")
+        logger.error("Press Enter to exit...")
+        sys.exit(1)
     
-    # 4a. Start the backend server in a background thread
+    # 3b. Start the backend server in a background thread
     # We use daemon=True so it automatically shuts down
     # when the main GUI app is closed.
 
@@ -79,14 +84,14 @@ if __name__ == "__main__":
     backend_thread = threading.Thread(target=start_backend, daemon=True)
     backend_thread.start()
 
-    # 4b. Start the frontend GUI on the main thread
+    # 3c. Start the frontend GUI on the main thread
     # This is a blocking call. The script will stay here
     # until the user closes the CustomTkinter window.
     logger.info("Starting frontend GUI on main thread...")
     gui = FrontendApp()
     gui.mainloop()
 
-    # 4c. (Implicit)
+    # 3d. (Implicit)
     # When the GUI window is closed, mainloop() exits.
     # The script ends. The daemon backend thread is killed.
     logger.info("Frontend closed. Exiting application.")